@@ -0,0 +1,452 @@
+"""
+Concurrent-session load test for the `/voice_stream` endpoint.
+
+Opens N simulated websocket clients, sends recorded utterances on a schedule and
+consumes the streamed audio, then reports time to first audio, inter-chunk gaps,
+turn latency, throughput and server CPU and memory per session as JSON.
+
+For reproducible results, let the script spawn the server with the in-process fake
+providers (`--spawn`, the default). A PostgreSQL database configured through the
+usual `DB_*` environment variables is still required.
+
+Example:
+    uv run python benchmarks/load_test.py --sessions 50 --turns 5 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import wave
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+from websockets.asyncio.client import ClientConnection, connect
+
+FAKE_PROVIDERS = {
+    "PROVIDER_STT": "fake",
+    "PROVIDER_LLM": "fake",
+    "PROVIDER_TTS": "fake",
+}
+
+# Audio frames start with the turn and sequence numbers
+FRAME_HEADER_BYTES = 8
+
+
+@dataclass
+class TurnResult:
+    """
+    Client-side timings of one turn.
+
+    Attributes:
+        time_to_first_audio: Time from the end of the utterance to the first audio.
+        latency: Time from the end of the utterance to the last audio.
+        gaps: Time between consecutive audio chunks.
+        bytes_received: Audio bytes received.
+    """
+
+    time_to_first_audio: float | None
+    latency: float | None
+    gaps: list[float] = field(default_factory=list)
+    bytes_received: int = 0
+
+
+@dataclass
+class Utterance:
+    """
+    Audio sent for one turn.
+
+    Attributes:
+        blob: Complete recording, for the blob ingestion mode.
+        pcm: 16-bit mono PCM, for the stream ingestion mode.
+        sample_rate: Sample rate of the PCM audio.
+    """
+
+    blob: bytes
+    pcm: bytes
+    sample_rate: int
+
+
+def load_utterance(path: Path | None, sample_rate: int) -> Utterance:
+    """
+    Loads a 16-bit mono WAV recording, or synthesizes a two-second tone.
+
+    Args:
+        path: Path of the recording.
+        sample_rate: Sample rate of the synthesized tone.
+
+    Returns:
+        Utterance to send.
+    """
+    if path is not None:
+        blob = path.read_bytes()
+        with wave.open(BytesIO(blob), "rb") as wav_file:
+            pcm = wav_file.readframes(wav_file.getnframes())
+            sample_rate = wav_file.getframerate()
+        return Utterance(blob=blob, pcm=pcm, sample_rate=sample_rate)
+
+    t = np.arange(2 * sample_rate) / sample_rate
+    samples = (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2")
+    with BytesIO() as buffer:
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(samples.tobytes())
+        blob = buffer.getvalue()
+    return Utterance(blob=blob, pcm=samples.tobytes(), sample_rate=sample_rate)
+
+
+async def send_utterance(
+    ws: ClientConnection, utterance: Utterance, ingest: str
+) -> float:
+    """
+    Sends an utterance. In stream mode, the audio is sent in real time as 20 ms
+    frames.
+
+    Args:
+        ws: Websocket connection.
+        utterance: Utterance to send.
+        ingest: Ingestion mode.
+
+    Returns:
+        Time at which the user stopped speaking.
+    """
+    if ingest == "blob":
+        await ws.send(utterance.blob)
+        return time.perf_counter()
+
+    frame_size = utterance.sample_rate // 50 * 2
+    start = time.perf_counter()
+    for i in range(0, len(utterance.pcm), frame_size):
+        await ws.send(utterance.pcm[i : i + frame_size])
+        await asyncio.sleep(
+            max(0.0, start + (i // frame_size + 1) / 50 - time.perf_counter())
+        )
+    return time.perf_counter()
+
+
+async def send_silence(ws: ClientConnection, sample_rate: int) -> None:
+    """
+    Sends silent 20 ms frames in real time until cancelled, like an open
+    microphone, so the server detects the end of the speech.
+
+    Args:
+        ws: Websocket connection.
+        sample_rate: Sample rate of the PCM audio.
+    """
+    frame = bytes(sample_rate // 50 * 2)
+    start = time.perf_counter()
+    i = 0
+    while True:
+        await ws.send(frame)
+        i += 1
+        await asyncio.sleep(max(0.0, start + i / 50 - time.perf_counter()))
+
+
+async def receive_turn(
+    ws: ClientConnection, speech_end: float, idle_timeout: float
+) -> TurnResult:
+    """
+    Consumes the audio of a turn. The turn ends with an end-of-turn marker or
+    when no audio arrives for `idle_timeout` seconds after the first chunk.
+
+    Args:
+        ws: Websocket connection.
+        speech_end: Time at which the user stopped speaking.
+        idle_timeout: Silence, in seconds, that ends a turn without a marker.
+
+    Returns:
+        Timings of the turn.
+    """
+    result = TurnResult(time_to_first_audio=None, latency=None)
+    last: float | None = None
+    while True:
+        timeout = idle_timeout if last is not None else idle_timeout * 30
+        try:
+            message = await asyncio.wait_for(ws.recv(), timeout=timeout)
+        except TimeoutError:
+            break
+        now = time.perf_counter()
+        if isinstance(message, str):
+            if json.loads(message).get("event") == "end_of_turn":
+                break
+            continue
+        if last is None:
+            result.time_to_first_audio = now - speech_end
+        else:
+            result.gaps.append(now - last)
+        result.bytes_received += len(message) - FRAME_HEADER_BYTES
+        result.latency = now - speech_end
+        last = now
+    return result
+
+
+async def run_session(
+    url: str,
+    utterance: Utterance,
+    ingest: str,
+    turns: int,
+    think_time: float,
+    idle_timeout: float,
+    delay: float,
+) -> list[TurnResult]:
+    """
+    Runs one simulated client.
+
+    Args:
+        url: Websocket URL of the endpoint.
+        utterance: Utterance sent on every turn.
+        ingest: Ingestion mode.
+        turns: Number of turns.
+        think_time: Pause, in seconds, between the end of a turn and the next one.
+        idle_timeout: Silence, in seconds, that ends a turn.
+        delay: Delay, in seconds, before connecting.
+
+    Returns:
+        Timings of every turn.
+    """
+    await asyncio.sleep(delay)
+    results = []
+    async with connect(f"{url}?ingest={ingest}", max_size=None) as ws:
+        for _ in range(turns):
+            speech_end = await send_utterance(ws, utterance, ingest)
+            silence = None
+            if ingest == "stream":
+                silence = asyncio.create_task(
+                    send_silence(ws, utterance.sample_rate)
+                )
+            try:
+                results.append(await receive_turn(ws, speech_end, idle_timeout))
+                await asyncio.sleep(think_time)
+            finally:
+                if silence is not None:
+                    silence.cancel()
+                    await asyncio.gather(silence, return_exceptions=True)
+    return results
+
+
+def read_process_usage(pid: int) -> tuple[float, int]:
+    """
+    Reads the CPU time and resident memory of a process from `/proc` (Linux).
+
+    Args:
+        pid: Process identifier.
+
+    Returns:
+        CPU time, in seconds, and resident memory, in bytes.
+    """
+    stat = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(stat[11]) + int(stat[12])) / ticks
+    rss = int(stat[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    """
+    Summarizes a distribution.
+
+    Args:
+        values: Observed values.
+
+    Returns:
+        Count, mean, p50, p95, p99 and max, in milliseconds.
+    """
+    if not values:
+        return {
+            "count": 0,
+            "mean": None,
+            "p50": None,
+            "p95": None,
+            "p99": None,
+            "max": None,
+        }
+    array = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean": round(float(array.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(array.max()), 3),
+    }
+
+
+async def spawn_server(port: int) -> asyncio.subprocess.Process:
+    """
+    Starts the server with the fake providers and waits until it is healthy.
+
+    Args:
+        port: Port of the server.
+
+    Returns:
+        Server process.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "server:app",
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+        env={**os.environ, **FAKE_PROVIDERS, "LOGURU_LEVEL": "WARNING"},
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/health") as r:
+                    if r.status == 200:
+                        return process
+            except aiohttp.ClientError:
+                pass
+            if process.returncode is not None:
+                break
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("The server did not start")
+
+
+async def main(args: argparse.Namespace) -> dict:
+    """
+    Runs the load test.
+
+    Args:
+        args: Command line arguments.
+
+    Returns:
+        Report of the load test.
+    """
+    utterance = load_utterance(args.audio, sample_rate=16_000)
+    process = await spawn_server(args.port) if args.spawn else None
+    pid = process.pid if process is not None else args.server_pid
+    url = args.url or f"ws://127.0.0.1:{args.port}/voice_stream"
+
+    try:
+        usage_before = read_process_usage(pid) if pid else None
+        peak_rss = usage_before[1] if usage_before else 0
+        start = time.perf_counter()
+        sessions = [
+            asyncio.create_task(
+                run_session(
+                    url=url,
+                    utterance=utterance,
+                    ingest=args.ingest,
+                    turns=args.turns,
+                    think_time=args.think_time,
+                    idle_timeout=args.idle_timeout,
+                    delay=args.ramp * i / max(1, args.sessions),
+                )
+            )
+            for i in range(args.sessions)
+        ]
+        pending = set(sessions)
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=0.5)
+            if pid:
+                peak_rss = max(peak_rss, read_process_usage(pid)[1])
+        elapsed = time.perf_counter() - start
+        usage_after = read_process_usage(pid) if pid else None
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+    results: list[TurnResult] = []
+    failed_sessions = 0
+    for session in sessions:
+        if session.exception() is not None:
+            failed_sessions += 1
+        else:
+            results.extend(session.result())
+
+    answered = [r for r in results if r.time_to_first_audio is not None]
+    report: dict = {
+        "config": {
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "ingest": args.ingest,
+            "think_time": args.think_time,
+            "ramp": args.ramp,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "failed_sessions": failed_sessions,
+        "turns": len(results),
+        "unanswered_turns": len(results) - len(answered),
+        "time_to_first_audio_ms": percentiles(
+            [r.time_to_first_audio for r in answered if r.time_to_first_audio]
+        ),
+        "turn_latency_ms": percentiles(
+            [r.latency for r in answered if r.latency is not None]
+        ),
+        "inter_chunk_gap_ms": percentiles(
+            [g for r in answered for g in r.gaps]
+        ),
+        "throughput": {
+            "turns_per_s": round(len(answered) / elapsed, 3),
+            "audio_bytes_per_s": round(
+                sum(r.bytes_received for r in results) / elapsed, 1
+            ),
+        },
+    }
+    if usage_before and usage_after:
+        cpu = usage_after[0] - usage_before[0]
+        report["server"] = {
+            "cpu_s": round(cpu, 3),
+            "cpu_s_per_session": round(cpu / args.sessions, 4),
+            "peak_rss_bytes": peak_rss,
+            "rss_bytes_per_session": round(
+                (peak_rss - usage_before[1]) / args.sessions
+            ),
+        }
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    Returns:
+        Command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--ingest", choices=["blob", "stream"], default="blob")
+    parser.add_argument(
+        "--audio", type=Path, help="16-bit mono WAV sent on every turn"
+    )
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--ramp", type=float, default=1.0)
+    parser.add_argument("--idle-timeout", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--no-spawn",
+        dest="spawn",
+        action="store_false",
+        help="Target a running server (see --url) instead of spawning one",
+    )
+    parser.add_argument("--url", help="Websocket URL of a running server")
+    parser.add_argument(
+        "--server-pid", type=int, help="PID of a running server, for CPU/RSS"
+    )
+    parser.add_argument("--output", type=Path, help="Write the report here")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output)
+    print(output)
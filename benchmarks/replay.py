@@ -0,0 +1,497 @@
+"""
+Offline replay of a recorded `/voice_stream` session.
+
+Reads a session recording (see `RECORD_DIR`) and runs every completed turn
+through the turn pipeline of the server again, with the upstream providers
+emulated locally from the recording: the transcript after the recorded
+transcription time, the language model deltas at their recorded times, and the
+audio of each text-to-speech request with its recorded chunk timings. Texts
+that were not synthesized in the recording, e.g. after a change of the text
+segmentation, are emulated at the median time to first byte and byte rate of
+the recorded requests. No API is called and no database is needed.
+
+The text segmentation, audio cache and scheduler settings are read from the
+usual `TTS_*` and `SCHEDULER_*` environment variables, so the effect of a change
+is measured by replaying the same recording before and after it. The report
+compares the recorded and replayed time to first audio and turn duration.
+
+Example:
+    uv run python benchmarks/replay.py recordings/<id>.v2vrec --output replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import Any, cast
+from uuid import uuid4
+
+from load_test import percentiles
+from pydantic_ai.messages import ModelMessage, ModelRequest, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from app.config.scheduler import SchedulerConfig
+from app.config.tts import TTSConfig
+from app.database.writer import MessageWriter
+from app.engine.audio_cache import AudioCache
+from app.engine.fakes import fake_opus
+from app.engine.scheduler import (
+    ScheduledModel,
+    ScheduledSynthesizer,
+    ScheduledTranscriber,
+    UpstreamLimiter,
+)
+from app.engine.segmentation import TextSegmenter
+from app.engine.text_to_speech import ResponseFormat, TextToSpeech, Voice
+from app.services.agent import Dependencies, create_agent
+from app.services.conversation import ConversationState
+from app.telemetry.recording import RecordKind, SessionRecording
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from server import respond
+
+
+@dataclass
+class RecordedTurn:
+    """
+    Recorded turn, with the timings of its upstream calls.
+
+    Attributes:
+        audio: Audio of the utterance.
+        start: Time of the start of the turn in the session, in seconds.
+        transcript: Transcript of the utterance.
+        stt_s: Time to the transcript.
+        deltas: Language model deltas, with their time since the request.
+        tts: Text-to-speech requests, as the text and its chunk timings (time
+            since the request and size).
+        first_audio: Time to first audio, if any.
+        duration: Duration of the turn.
+        outcome: Outcome of the turn.
+    """
+
+    audio: bytes
+    start: float
+    transcript: str = ""
+    stt_s: float = 0.0
+    deltas: list[tuple[float, str]] = field(default_factory=list)
+    tts: list[tuple[str, list[tuple[float, int]]]] = field(default_factory=list)
+    first_audio: float | None = None
+    duration: float = 0.0
+    outcome: str = "failed"
+
+
+def load_turns(path: Path) -> tuple[dict[str, Any], list[RecordedTurn]]:
+    """
+    Reads the turns of a session recording.
+
+    Args:
+        path: Path of the recording.
+
+    Returns:
+        Metadata of the session and its turns.
+    """
+    session: dict[str, Any] = {}
+    turns: list[RecordedTurn] = []
+    turn: RecordedTurn | None = None
+    llm_start = 0.0
+    with SessionRecording(path) as recording:
+        for record in recording:
+            if record.kind == RecordKind.SESSION:
+                session = record.json()
+            elif record.kind == RecordKind.TURN:
+                turn = RecordedTurn(
+                    audio=bytes(record.payload), start=record.timestamp
+                )
+                turns.append(turn)
+            elif turn is None:
+                continue
+            elif record.kind == RecordKind.TRANSCRIPT:
+                turn.transcript = record.text()
+                turn.stt_s = record.timestamp - turn.start
+            elif record.kind == RecordKind.LLM_START:
+                llm_start = record.timestamp
+            elif record.kind == RecordKind.LLM_DELTA:
+                turn.deltas.append(
+                    (record.timestamp - llm_start, record.text())
+                )
+            elif record.kind == RecordKind.TTS:
+                request = record.json()
+                turn.tts.append(
+                    (
+                        request["text"],
+                        [(t, size) for t, size in request["chunks"]],
+                    )
+                )
+            elif record.kind == RecordKind.TURN_END:
+                end = record.json()
+                turn.outcome = end["outcome"]
+                turn.first_audio = end["marks"].get("first_audio")
+                turn.duration = record.timestamp - turn.start
+    return session, turns
+
+
+class ReplayTranscriber:
+    """Speech-to-text provider answering with the recorded transcripts."""
+
+    def __init__(self, turns: list[RecordedTurn], time_scale: float) -> None:
+        """
+        Initializes the ReplayTranscriber object.
+
+        Args:
+            turns: Recorded turns.
+            time_scale: Factor applied to the recorded timings.
+        """
+        self.turns = {turn.audio: turn for turn in turns}
+        self.time_scale = time_scale
+
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Emulates the transcription of the audio of a recorded turn.
+
+        Args:
+            audio_data: Audio data to transcribe
+
+        Returns:
+            Transcribed text
+        """
+        turn = self.turns[audio_data]
+        await asyncio.sleep(turn.stt_s * self.time_scale)
+        return turn.transcript
+
+
+def create_replay_model(
+    turns: list[RecordedTurn], time_scale: float
+) -> FunctionModel:
+    """
+    Creates a language model streaming the recorded deltas of the turn of the
+    user's prompt, at their recorded times. The time of tool calls is part of
+    the recorded timings, so tools are not called.
+
+    Args:
+        turns: Recorded turns.
+        time_scale: Factor applied to the recorded timings.
+
+    Returns:
+        Model for PydanticAI.
+    """
+    deltas = {turn.transcript: turn.deltas for turn in turns}
+
+    async def stream(
+        messages: list[ModelMessage], info: AgentInfo
+    ) -> AsyncIterator[str]:
+        prompt = ""
+        request = messages[-1]
+        if isinstance(request, ModelRequest):
+            for part in request.parts:
+                if isinstance(part, UserPromptPart):
+                    prompt = part.content
+        start = perf_counter()
+        for offset, delta in deltas.get(prompt, []):
+            await asyncio.sleep(
+                max(0.0, offset * time_scale - (perf_counter() - start))
+            )
+            yield delta
+
+    return FunctionModel(stream_function=stream)
+
+
+class ReplaySynthesizer:
+    """
+    Text-to-speech provider emulating the recorded requests. Texts that were not
+    recorded are emulated at the median recorded timings.
+    """
+
+    def __init__(self, turns: list[RecordedTurn], time_scale: float) -> None:
+        """
+        Initializes the ReplaySynthesizer object.
+
+        Args:
+            turns: Recorded turns.
+            time_scale: Factor applied to the recorded timings.
+        """
+        self.requests = {
+            text: chunks for turn in turns for text, chunks in turn.tts
+        }
+        self.time_scale = time_scale
+        recorded = [chunks for chunks in self.requests.values() if chunks]
+        self.ttfb = (
+            statistics.median(chunks[0][0] for chunks in recorded)
+            if recorded
+            else 0.2
+        )
+        self.bytes_per_char = (
+            statistics.median(
+                sum(size for _, size in chunks) / max(1, len(text))
+                for text, chunks in self.requests.items()
+                if chunks
+            )
+            if recorded
+            else 400.0
+        )
+        self.bytes_per_s = (
+            statistics.median(
+                sum(size for _, size in chunks)
+                / max(1e-3, chunks[-1][0] - chunks[0][0])
+                for chunks in recorded
+            )
+            if recorded
+            else 64_000.0
+        )
+
+    async def synthesize(
+        self,
+        text: str,
+        model_name: str,
+        voice: Voice,
+        response_format: ResponseFormat,
+        speed: float,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Emulates the conversion of text to speech.
+
+        Args:
+            text: The text to convert to speech.
+            model_name: The name of the model to use for text-to-speech conversion.
+            voice: The voice to use for speech synthesis.
+            response_format: The format of the audio response.
+            speed: The speed multiplier for speech synthesis.
+            chunk_size: The size in bytes of audio chunks to yield.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        chunks = self.requests.get(text)
+        if chunks is None:
+            size = int(len(text) * self.bytes_per_char)
+            chunks = [
+                (
+                    self.ttfb + start / self.bytes_per_s,
+                    min(chunk_size, size - start),
+                )
+                for start in range(0, size, chunk_size)
+            ]
+        total = sum(size for _, size in chunks)
+        audio = fake_opus(total) if response_format == "opus" else bytes(total)
+        start = perf_counter()
+        position = 0
+        for offset, size in chunks:
+            await asyncio.sleep(
+                max(0.0, offset * self.time_scale - (perf_counter() - start))
+            )
+            yield audio[position : position + size]
+            position += size
+        if position < len(audio):
+            yield audio[position:]
+
+
+class ReplayChannel:
+    """Outbound audio channel measuring the audio of each turn."""
+
+    def __init__(self) -> None:
+        """Initializes the ReplayChannel object."""
+        self.reset()
+
+    def reset(self) -> None:
+        """Starts measuring a turn, from its start."""
+        self.start = perf_counter()
+        self.first_audio: float | None = None
+        self.audio_bytes = 0
+
+    def start_turn(self) -> None:
+        """Starts sending the audio of the turn."""
+
+    @property
+    def played_text(self) -> str:
+        """Text of the turn, not tracked."""
+        return ""
+
+    async def drain(self) -> None:
+        """Returns at once, since audio is received when it is sent."""
+
+    def send_audio(self, chunk: bytes, text: str = "") -> None:
+        """
+        Receives an audio chunk.
+
+        Args:
+            chunk: Audio bytes.
+            text: Text whose audio starts with the chunk, if any.
+        """
+        if self.first_audio is None:
+            self.first_audio = perf_counter() - self.start
+        self.audio_bytes += len(chunk)
+
+    def end_turn(self) -> None:
+        """Ends the turn."""
+
+    def interrupt(self) -> None:
+        """Interrupts the turn."""
+
+
+class NullWriter:
+    """Message writer that stores nothing."""
+
+    def enqueue(
+        self, conversation_id: Any, sender: str, content: str, tokens: int
+    ) -> None:
+        """Drops a message."""
+
+
+async def main(args: argparse.Namespace) -> dict:
+    """
+    Replays the recording.
+
+    Args:
+        args: Command line arguments.
+
+    Returns:
+        Report of the replay.
+    """
+    session, recorded = load_turns(args.recording)
+    turns = [turn for turn in recorded if turn.outcome == "completed"]
+    output = session.get("output", {})
+    tts_config = TTSConfig()
+    scheduler = SchedulerConfig()
+
+    transcriber: Any = ReplayTranscriber(turns, time_scale=args.time_scale)
+    synthesizer: Any = ReplaySynthesizer(turns, time_scale=args.time_scale)
+    model: Any = create_replay_model(turns, time_scale=args.time_scale)
+    if scheduler.enabled:
+        transcriber = ScheduledTranscriber(
+            transcriber=transcriber,
+            limiter=UpstreamLimiter(
+                provider="stt", max_concurrency=scheduler.stt_concurrency
+            ),
+        )
+        synthesizer = ScheduledSynthesizer(
+            synthesizer=synthesizer,
+            limiter=UpstreamLimiter(
+                provider="tts", max_concurrency=scheduler.tts_concurrency
+            ),
+        )
+        model = ScheduledModel(
+            model=model,
+            limiter=UpstreamLimiter(
+                provider="llm", max_concurrency=scheduler.llm_concurrency
+            ),
+        )
+    agent = create_agent(model=model, tools=[], system_prompt="")
+    tts_handler = TextToSpeech(
+        synthesizer=synthesizer,
+        model_name=tts_config.model,
+        voice=output.get("voice", tts_config.voice),
+        speed=output.get("speed", tts_config.speed),
+        response_format=output.get("format", tts_config.response_format),
+        segmenter=TextSegmenter(
+            first_chars=tts_config.segment_first_chars,
+            growth=tts_config.segment_growth,
+            max_chars=tts_config.segment_max_chars,
+        ),
+        chunk_size=output.get("chunk_size", tts_config.aac_chunk_size),
+        max_in_flight=tts_config.max_in_flight,
+        cache=AudioCache(max_memory_bytes=tts_config.cache_memory_bytes),
+    )
+    conversation = ConversationState(
+        conversation_id=uuid4(),
+        message_writer=cast(MessageWriter, NullWriter()),
+    )
+    channel = ReplayChannel()
+
+    results = []
+    for turn in turns:
+        start = perf_counter()
+        channel.reset()
+        await respond(
+            channel=cast(Any, channel),
+            audio_bytes=turn.audio,
+            conversation=conversation,
+            transcriber=transcriber,
+            agent=agent,
+            agent_deps=cast(Dependencies, None),
+            tts_handler=tts_handler,
+        )
+        results.append(
+            {
+                "transcript": turn.transcript,
+                "recorded": {
+                    "first_audio_ms": _ms(turn.first_audio),
+                    "duration_ms": _ms(turn.duration),
+                },
+                "replayed": {
+                    "first_audio_ms": _ms(channel.first_audio),
+                    "duration_ms": _ms(perf_counter() - start),
+                },
+            }
+        )
+
+    return {
+        "recording": str(args.recording),
+        "time_scale": args.time_scale,
+        "turns": len(turns),
+        "skipped_turns": len(recorded) - len(turns),
+        "recorded": {
+            "time_to_first_audio_ms": percentiles(
+                [t.first_audio for t in turns if t.first_audio is not None]
+            ),
+            "turn_duration_ms": percentiles([t.duration for t in turns]),
+        },
+        "replayed": {
+            "time_to_first_audio_ms": percentiles(
+                [
+                    r["replayed"]["first_audio_ms"] / 1000
+                    for r in results
+                    if r["replayed"]["first_audio_ms"] is not None
+                ]
+            ),
+            "turn_duration_ms": percentiles(
+                [r["replayed"]["duration_ms"] / 1000 for r in results]
+            ),
+        },
+        "per_turn": results,
+    }
+
+
+def _ms(seconds: float | None) -> float | None:
+    """
+    Converts a duration to milliseconds.
+
+    Args:
+        seconds: Duration, in seconds.
+
+    Returns:
+        Duration, in milliseconds, rounded to a tenth.
+    """
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    Returns:
+        Command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("recording", type=Path, help="Session recording")
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="Factor applied to the recorded upstream timings",
+    )
+    parser.add_argument("--output", type=Path, help="Write the report here")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output)
+    print(output)
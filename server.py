@@ -1,27 +1,51 @@
+import asyncio
 from pathlib import Path
 
-from fastapi import Depends, FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
-from groq import AsyncGroq
+from fastapi import Depends, FastAPI, Query, Request, WebSocket, status
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from loguru import logger
-from psycopg import AsyncConnection
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import UUID4
 from pydantic_ai import Agent
 
 from app.api.dependencies import (
+    admit_session,
     get_agent,
     get_agent_dependencies,
+    get_agent_hedge,
     get_conversation_id,
-    get_db_conn,
-    get_groq_client,
+    get_conversation_state,
+    get_recorder,
+    get_transcriber,
     get_tts_handler,
 )
+from app.api.ingest import IngestMode, iter_utterances
 from app.api.lifespan import app_lifespan as lifespan
-from app.database.actions import get_conversation_history, store_message
-from app.engine.speech_to_text import transcribe_audio_data
+from app.api.outbound import AudioChannel, SlowConsumerError
+from app.config.settings import get_settings
+from app.engine.speech_to_text import Transcriber
 from app.engine.text_to_speech import TextToSpeech
-from app.services.agent import Dependencies
-from app.services.utils import format_messages_for_agent
+from app.services.agent import (
+    AgentHedge,
+    Dependencies,
+    stream_agent_response,
+)
+from app.services.conversation import ConversationState
+from app.telemetry.metrics import (
+    ACTIVE_SESSIONS,
+    HISTORY_TOKENS,
+    SPECULATION_WASTED_TOKENS,
+    SPECULATIONS,
+    UPSTREAM_ERRORS,
+    update_pool_metrics,
+)
+from app.telemetry.recording import (
+    RecordKind,
+    SessionRecorder,
+    current_recorder,
+    record_event,
+)
+from app.telemetry.tracing import TurnTrace, current_stage, current_trace
 
 app = FastAPI(title="Voice to Voice Demo", lifespan=lifespan)
 
@@ -32,10 +56,12 @@ async def get():
     Serves the main HTML page of the application.
 
     Returns:
-        HTMLResponse containing the content of 'ui_draft' file.
+        HTMLResponse containing the content of the 'sample_ui.html' file.
     """
-    with Path("sample_ui.html").open("r") as file:
-        return HTMLResponse(file.read())
+    # Read in a worker thread, not to block the event loop on disk
+    return HTMLResponse(
+        await asyncio.to_thread(Path("sample_ui.html").read_text)
+    )
 
 
 @app.get("/health")
@@ -49,89 +75,371 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready(request: Request) -> JSONResponse:
+    """
+    Readiness check endpoint. It passes only once the startup warmup has
+    completed, so new workers do not serve cold first turns.
+
+    Args:
+        request: HTTP request.
+
+    Returns:
+        A response with status 200 if the application is ready, 503 otherwise.
+    """
+    if not request.state.warmup.ready:
+        return JSONResponse(
+            content={"status": "warming up"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return JSONResponse(content={"status": "ready"})
+
+
+@app.get("/metrics")
+async def metrics(request: Request) -> Response:
+    """
+    Prometheus metrics endpoint.
+
+    Args:
+        request: HTTP request.
+
+    Returns:
+        Response containing the metrics in the Prometheus text format.
+    """
+    update_pool_metrics(pool=request.state.pool)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+async def respond(
+    channel: AudioChannel,
+    audio_bytes: bytes,
+    conversation: ConversationState,
+    transcriber: Transcriber,
+    agent: Agent[Dependencies],
+    agent_deps: Dependencies,
+    tts_handler: TextToSpeech,
+    agent_hedge: AgentHedge | None = None,
+    commit: asyncio.Event | None = None,
+) -> None:
+    """
+    Runs one conversational turn: transcribes the user's audio, generates the
+    agent's response and streams it back to the client as audio, followed by an
+    end-of-turn marker.
+
+    The timings of every stage are recorded in the trace of the turn.
+
+    The turn lasts until its audio has been sent to the client, and can be
+    cancelled at any point. When it is cancelled during the response, the upstream
+    LLM and TTS streams are aborted and only the part of the response whose audio
+    the channel has sent to the client is stored.
+
+    The audio, the transcription and the outcome of the turn are recorded in the
+    session recording, if any.
+
+    A speculative turn, started before the end of the user's utterance, is given a
+    `commit` event. It transcribes the audio and starts generating and
+    synthesizing the response, but nothing is stored or sent to the client until
+    the event is set. Its trace is then restarted, so that the time to first audio
+    is measured from the end of the utterance. A speculative turn that ends
+    without being committed is discarded.
+
+    Args:
+        channel: Outbound audio channel of the connection.
+        audio_bytes: Audio of the user's utterance.
+        conversation: In-memory state of the conversation.
+        transcriber: Speech-to-text provider.
+        agent: Language model agent for generating responses.
+        agent_deps: Dependencies for the agent.
+        tts_handler: Text-to-Speech handler for converting text to audio.
+        agent_hedge: Hedging of the agent's response, if any.
+        commit: Event set when a speculative turn is committed. None for a
+            regular turn.
+    """
+    trace = TurnTrace(conversation_id=conversation.conversation_id)
+    current_trace.set(trace)
+    committed = commit is None
+    outcome = "failed"
+    record_event(RecordKind.TURN, audio_bytes)
+    try:
+        # Step 1: Transcribe the incoming audio
+        logger.info("Starting transcription process")
+        with trace.span("stt"):
+            try:
+                transcription = await transcriber.transcribe(
+                    audio_data=audio_bytes
+                )
+            except Exception:
+                UPSTREAM_ERRORS.labels("stt").inc()
+                raise
+        logger.debug("Transcription: {t}", t=transcription)
+        record_event(RecordKind.TRANSCRIPT, transcription)
+        if not transcription:
+            logger.info("Nothing was said, skipping the turn")
+            outcome = "silent"
+            return
+
+        # Step 2: Take the conversation history, before this message
+        with trace.span("history"):
+            agent_messages = conversation.messages
+        HISTORY_TOKENS.observe(conversation.tokens)
+
+        # Step 3: Generate the agent's response while streaming the audio
+        # back to the client in order
+        logger.info("Stating generation process")
+        async with tts_handler:
+            # Inherited by the generation task
+            current_stage.set("llm")
+            generation_task = asyncio.create_task(
+                stream_agent_response(
+                    agent=agent,
+                    user_prompt=transcription,
+                    message_history=agent_messages,
+                    deps=agent_deps,
+                    tts_handler=tts_handler,
+                    hedge=agent_hedge,
+                )
+            )
+            current_stage.set("tts")
+            try:
+                if commit is not None:
+                    await commit.wait()
+                    committed = True
+                    trace.rebase()
+
+                # Step 4: Queue the user's message for storage
+                channel.start_turn()
+                conversation.add_message(sender="user", content=transcription)
+
+                async for text, audio_chunk in tts_handler.stream():
+                    trace.mark("first_audio")
+                    channel.send_audio(audio_chunk, text=text)
+                generation = await generation_task
+                # The turn can be interrupted until its audio is sent
+                await channel.drain()
+            except asyncio.CancelledError:
+                if not committed:
+                    # At roughly four characters per token
+                    SPECULATION_WASTED_TOKENS.inc(
+                        tts_handler.received_chars / 4
+                    )
+                    raise
+                generation = channel.played_text
+                logger.info("Turn interrupted, delivered: {g}", g=generation)
+                if generation:
+                    conversation.add_message(sender="agent", content=generation)
+                raise
+            finally:
+                if not generation_task.done():
+                    generation_task.cancel()
+
+        # Step 5: Queue the agent's response for storage
+        conversation.add_message(sender="agent", content=generation)
+        outcome = "completed"
+    except asyncio.CancelledError:
+        outcome = "interrupted"
+        raise
+    finally:
+        if not committed:
+            outcome = "discarded"
+        trace.finish(outcome=outcome)
+        record_event(
+            RecordKind.TURN_END,
+            {
+                "outcome": outcome,
+                "speculative": commit is not None,
+                "spans": trace.spans,
+                "marks": trace.marks,
+            },
+        )
+        if outcome not in ("interrupted", "discarded"):
+            channel.end_turn()
+
+
 @app.websocket("/voice_stream")
 async def voice_to_voice(
     websocket: WebSocket,
+    _admitted: None = Depends(admit_session),
     conversation_id: UUID4 = Depends(get_conversation_id),
-    db_conn: AsyncConnection = Depends(get_db_conn),
-    groq_client: AsyncGroq = Depends(get_groq_client),
+    conversation: ConversationState = Depends(get_conversation_state),
+    transcriber: Transcriber = Depends(get_transcriber),
     agent: Agent[Dependencies] = Depends(get_agent),
     agent_deps: Dependencies = Depends(get_agent_dependencies),
+    agent_hedge: AgentHedge = Depends(get_agent_hedge),
     tts_handler: TextToSpeech = Depends(get_tts_handler),
+    recorder: SessionRecorder | None = Depends(get_recorder),
+    ingest: IngestMode = Query(default="blob"),
 ):
     """
     WebSocket endpoint for voice-to-voice communication.
 
-    - Receives audio bytes from the client
+    - Receives audio bytes from the client, either one recording per turn or a
+      continuous PCM stream split into utterances on the server (`?ingest=stream`)
     - Transcribes the audio to text
     - generates a response using the language model agent
     - converts the response text to speech, and streams the audio bytes back to the client.
 
+    A conversation is resumed by passing its ID in the `conversation_id` query
+    parameter; unknown IDs are rejected. The output audio is negotiated with the
+    `format`, `voice`, `speed` and `chunk_size` query parameters. Once connected,
+    the client receives a `{"event": "session", "conversation_id": ...,
+    "resumed": ..., "output": ...}` text message with the ID to resume the
+    conversation later and the negotiated output.
+
+    Audio is sent through a per-connection `AudioChannel`, in frames prefixed with
+    the turn and sequence numbers, and every turn ends with an
+    `{"event": "end_of_turn"}` text message.
+
+    With recording enabled (`RECORD_DIR`), the session is recorded for offline
+    replay.
+
+    Each turn runs as a task, until its audio has been sent. If the user speaks
+    again while a turn is in progress or its audio is still queued (barge-in), the
+    turn is cancelled, its queued audio is dropped and the client receives an
+    `{"event": "interrupt"}` text message telling it to drop any buffered audio.
+
+    With speculation enabled (`INGEST_SPECULATIVE`, stream mode only), a
+    speculative turn starts on the audio so far whenever the user pauses. It is
+    discarded if the user speaks again, and committed, without a new
+    transcription, when the utterance ends with no further speech.
+
     Args:
         websocket: WebSocket connection.
+        _admitted: Rejects the session if the upstream queues are saturated
+            (dependency).
         conversation_id: Unique identifier for the conversation (dependency).
-        db_conn: Asynchronous database connection (dependency).
-        groq_client: Groq API client for transcription (dependency).
+        conversation: In-memory state of the conversation (dependency).
+        transcriber: Speech-to-text provider (dependency).
         agent: Language model agent for generating responses (dependency).
         agent_deps: Dependencies for the agent (dependency).
+        agent_hedge: Hedging of the agent's responses (dependency).
         tts_handler: Text-to-Speech handler for converting text to audio (dependency).
+        recorder: Recorder of the session, if recorded (dependency).
+        ingest: Audio ingestion mode, "blob" or "stream" (query parameter).
     """
     await websocket.accept()
+    current_stage.set("ingest")
     logger.info(f"New websocket connection for conversation {conversation_id}")
-
-    async for incoming_audio_bytes in websocket.iter_bytes():
-        # Step 1: Transcribe the incoming audio
-        logger.info("Starting transcription process")
-        transcription = await transcribe_audio_data(
-            audio_data=incoming_audio_bytes,
-            api_client=groq_client,
-            model_name="whisper-large-v3-turbo",
+    await websocket.send_json(
+        {
+            "event": "session",
+            "conversation_id": str(conversation_id),
+            "resumed": conversation.resumed,
+            "output": tts_handler.output,
+        }
+    )
+    ACTIVE_SESSIONS.inc()
+    if recorder is not None:
+        # Inherited by the channel and the turns
+        current_recorder.set(recorder)
+        record_event(
+            RecordKind.SESSION,
+            {
+                "conversation_id": conversation_id,
+                "ingest": ingest,
+                "output": tts_handler.output,
+            },
         )
-        logger.debug("Transcription: {t}", t=transcription)
+    channel = AudioChannel(
+        websocket=websocket,
+        config=get_settings().outbound,
+        frame_bytes=tts_handler.chunk_size,
+    )
+    channel.start()
 
-        # Step 2: Store the user's message
-        await store_message(
-            conn=db_conn,
-            conversation_id=conversation_id,
-            sender="user",
-            content=transcription,
-        )
+    turn: asyncio.Task[None] | None = None
+    commit: asyncio.Event | None = None
 
-        # Step 3: Retrieve the conversation history
-        conversation_history = await get_conversation_history(
-            conn=db_conn, conversation_id=conversation_id
+    def start_turn(audio_bytes: bytes, speculative: bool = False) -> None:
+        """Starts a turn, speculative or not, as a task."""
+        nonlocal turn, commit
+        commit = asyncio.Event() if speculative else None
+        turn = asyncio.create_task(
+            respond(
+                channel=channel,
+                audio_bytes=audio_bytes,
+                conversation=conversation,
+                transcriber=transcriber,
+                agent=agent,
+                agent_deps=agent_deps,
+                tts_handler=tts_handler,
+                agent_hedge=agent_hedge,
+                commit=commit,
+            )
         )
+        turn.add_done_callback(log_turn_error)
 
-        # Step 4: Prepare the messages for the agent
-        agent_messages = format_messages_for_agent(
-            conversation_history=conversation_history
-        )
+    def is_speculating() -> bool:
+        """Whether a speculative turn is waiting to be committed."""
+        return commit is not None and not commit.is_set()
 
-        # Step 5: Generate the agent's response
-        logger.info("Stating generation process")
-        generation = ""
-        async with tts_handler:
-            async with agent.run_stream(
-                user_prompt=transcription,
-                message_history=agent_messages,
-                deps=agent_deps,
-            ) as result:
-                async for message in result.stream_text(delta=True):
-                    logger.debug("Delta: {m}", m=message)
-                    generation += message
-
-                    # Stream the audio back to the client
-                    async for audio_chunk in tts_handler.feed(text=message):
-                        await websocket.send_bytes(data=audio_chunk)
-
-            # Flush any remaining audio chunks
-            async for audio_chunk in tts_handler.flush():
-                await websocket.send_bytes(data=audio_chunk)
-
-        # Step 6: Store the agent's response
-        await store_message(
-            conn=db_conn,
-            conversation_id=conversation_id,
-            sender="agent",
-            content=generation,
-        )
+    async def discard() -> None:
+        """Cancels the speculative turn waiting to be committed, if any."""
+        nonlocal commit
+        if turn is None or not is_speculating():
+            return
+        logger.info("Discarding the speculative turn")
+        SPECULATIONS.labels("discarded").inc()
+        commit = None
+        turn.cancel()
+        await asyncio.gather(turn, return_exceptions=True)
+
+    async def speculate(audio_bytes: bytes) -> None:
+        """Starts a speculative turn on the audio of the utterance so far."""
+        await discard()
+        logger.info("Pause detected: starting a speculative turn")
+        SPECULATIONS.labels("started").inc()
+        start_turn(audio_bytes=audio_bytes, speculative=True)
+
+    async def interrupt() -> None:
+        """
+        Cancels the turn in progress, if any, and notifies the client if audio of
+        the turn was still queued or being sent.
+        """
+        if turn is None:
+            return
+        if not turn.done():
+            if is_speculating():
+                await discard()
+                return
+            logger.info("Barge-in: interrupting the current turn")
+            turn.cancel()
+            await asyncio.gather(turn, return_exceptions=True)
+        elif not channel.pending:
+            return
+        channel.interrupt()
+
+    def log_turn_error(task: asyncio.Task[None]) -> None:
+        """Logs the error of a failed turn, keeping the connection open."""
+        if task.cancelled() or isinstance(task.exception(), SlowConsumerError):
+            return
+        if (error := task.exception()) is not None:
+            logger.opt(exception=error).error("Turn failed")
+
+    utterances = iter_utterances(
+        websocket=websocket,
+        mode=ingest,
+        config=get_settings().ingest,
+        on_speech_start=interrupt,
+        on_pause=speculate,
+        on_resume=discard,
+    )
+    try:
+        async for incoming_audio_bytes in utterances:
+            if turn is not None and commit is not None and is_speculating():
+                if not turn.done():
+                    logger.info("End of utterance: committing the speculation")
+                    SPECULATIONS.labels("committed").inc()
+                    commit.set()
+                    continue
+                SPECULATIONS.labels("discarded").inc()
+            await interrupt()
+            start_turn(audio_bytes=incoming_audio_bytes)
+    finally:
+        if turn is not None and not turn.done():
+            turn.cancel()
+            await asyncio.gather(turn, return_exceptions=True)
+        await channel.close()
+        await conversation.close()
+        if recorder is not None:
+            await recorder.close()
+        ACTIVE_SESSIONS.dec()
@@ -1,41 +1,162 @@
-from typing import AsyncIterator, cast
+import random
+from typing import cast
 from uuid import uuid4
 
-from fastapi import WebSocket
-from groq import AsyncGroq
-from psycopg import AsyncConnection
+from fastapi import Depends, Query, WebSocket, WebSocketException, status
 from psycopg_pool import AsyncConnectionPool
 from pydantic import UUID4
 from pydantic_ai import Agent
 
 from app.config.settings import get_settings
-from app.engine.text_to_speech import TextToSpeech
-from app.services.agent import Dependencies
+from app.database.writer import MessageWriter
+from app.engine.framing import OutputFormat, align_chunk_size
+from app.engine.segmentation import TextSegmenter
+from app.engine.speech_to_text import Transcriber
+from app.engine.text_to_speech import TextToSpeech, Voice
+from app.services.agent import AgentHedge, Dependencies
+from app.services.conversation import ConversationState
+from app.services.session_store import SessionStore
+from app.services.summarizer import Summarizer
+from app.telemetry.metrics import SESSIONS_REJECTED
+from app.telemetry.recording import SessionRecorder, create_recorder
 
 
-async def get_db_conn(websocket: WebSocket) -> AsyncIterator[AsyncConnection]:
+async def get_db_pool(websocket: WebSocket) -> AsyncConnectionPool:
     """
-    Gets a connection to the database using the connection pool.
+    Gets the connection pool to the database. Connections are checked out only
+    for the duration of each operation, never for the whole session.
 
     Args:
         websocket: WebSocket connection.
 
-    Yields:
-        Connection to the database.
+    Returns:
+        Connection pool to the database.
+    """
+    return cast(AsyncConnectionPool, websocket.state.pool)
+
+
+async def admit_session(websocket: WebSocket) -> None:
+    """
+    Rejects new sessions while the queue of an upstream provider is saturated.
+    The connection is accepted and then closed with code 1013 (try again
+    later), so clients receive the reason rather than a failed handshake.
+
+    Args:
+        websocket: WebSocket connection.
+
+    Raises:
+        WebSocketException: If the upstream queues are saturated.
     """
-    db_pool = cast(AsyncConnectionPool, websocket.state.pool)
-    async with db_pool.connection() as conn:
-        yield conn
+    scheduler = websocket.state.scheduler
+    if scheduler is not None and scheduler.saturated:
+        SESSIONS_REJECTED.inc()
+        await websocket.accept()
+        raise WebSocketException(
+            code=status.WS_1013_TRY_AGAIN_LATER,
+            reason="Server is saturated, try again later",
+        )
 
 
-async def get_conversation_id() -> UUID4:
+async def get_conversation_id(
+    conversation_id: UUID4 | None = Query(default=None),
+) -> UUID4:
     """
-    Creates a new conversation ID.
+    Gets the ID of the conversation to resume, or creates a new one.
+
+    Args:
+        conversation_id: ID of the conversation to resume, from the
+            `conversation_id` query parameter. Must be a UUID4.
 
     Returns:
         Conversation ID.
     """
-    return uuid4()
+    return conversation_id or uuid4()
+
+
+async def get_session_store(websocket: WebSocket) -> SessionStore:
+    """
+    Gets the store of session snapshots.
+
+    Args:
+        websocket: WebSocket connection.
+
+    Returns:
+        Store of session snapshots shared by every session.
+    """
+    return websocket.state.session_store
+
+
+async def get_message_writer(websocket: WebSocket) -> MessageWriter:
+    """
+    Gets the background writer that persists messages.
+
+    Args:
+        websocket: WebSocket connection.
+
+    Returns:
+        Background writer shared by every session.
+    """
+    return websocket.state.message_writer
+
+
+async def get_summarizer(websocket: WebSocket) -> Summarizer | None:
+    """
+    Gets the summarizer of older turns.
+
+    Args:
+        websocket: WebSocket connection.
+
+    Returns:
+        Summarizer shared by every session, or None if summarization is
+        disabled.
+    """
+    return websocket.state.summarizer
+
+
+async def get_conversation_state(
+    conversation_id: UUID4 = Depends(get_conversation_id),
+    requested_id: UUID4 | None = Query(default=None, alias="conversation_id"),
+    pool: AsyncConnectionPool = Depends(get_db_pool),
+    message_writer: MessageWriter = Depends(get_message_writer),
+    session_store: SessionStore = Depends(get_session_store),
+    summarizer: Summarizer | None = Depends(get_summarizer),
+) -> ConversationState:
+    """
+    Gets the in-memory state of the conversation, hydrated from its session
+    snapshot or from the database.
+
+    Args:
+        conversation_id: Unique identifier for the conversation (dependency).
+        requested_id: ID of the conversation to resume, if any.
+        pool: Connection pool to the database (dependency).
+        message_writer: Background writer that persists messages (dependency).
+        session_store: Store of session snapshots (dependency).
+        summarizer: Summarizer of older turns (dependency).
+
+    Returns:
+        Conversation state owned by the websocket session.
+
+    Raises:
+        WebSocketException: If the conversation to resume does not exist.
+    """
+    settings = get_settings()
+    conversation = ConversationState(
+        conversation_id=conversation_id,
+        message_writer=message_writer,
+        max_messages=settings.agent.history_max_messages,
+        max_tokens=settings.agent.history_max_tokens,
+        session_store=session_store,
+        summarizer=summarizer,
+        keep_turns=settings.agent.history_keep_turns,
+        summary_trigger_tokens=settings.agent.summary_trigger_tokens,
+    )
+    await conversation.hydrate(pool=pool)
+    if requested_id is not None and not conversation.resumed:
+        raise WebSocketException(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason=f"Unknown conversation {requested_id}",
+        )
+    return conversation
 
 
 async def get_agent_dependencies(websocket: WebSocket) -> Dependencies:
@@ -54,44 +175,136 @@ async def get_agent_dependencies(websocket: WebSocket) -> Dependencies:
     )
 
 
-async def get_groq_client(websocket: WebSocket) -> AsyncGroq:
+async def get_transcriber(websocket: WebSocket) -> Transcriber:
     """
-    Gets a client for interacting with Groq API.
+    Gets the speech-to-text provider.
 
     Args:
         websocket: WebSocket connection.
 
     Returns:
-        Client for interacting with Groq API
+        Speech-to-text provider.
     """
-    return websocket.state.groq_client
+    return websocket.state.transcriber
 
 
 async def get_agent(websocket: WebSocket) -> Agent:
     """
-    Gets a PydanticAI Agent that uses Groq models.
+    Gets the PydanticAI Agent.
 
     Args:
         websocket: WebSocket connection.
 
     Returns:
-        PydanticAI Agent that uses Groq models.
+        PydanticAI Agent.
     """
-    return websocket.state.groq_agent
+    return websocket.state.agent
 
 
-async def get_tts_handler(websocket: WebSocket) -> TextToSpeech:
+async def get_recorder(
+    conversation_id: UUID4 = Depends(get_conversation_id),
+) -> SessionRecorder | None:
     """
-    Gets a handler for text-to-speech conversion.
+    Gets the recorder of the session, if the session is recorded.
+
+    Args:
+        conversation_id: Unique identifier for the conversation (dependency).
+
+    Returns:
+        Recorder of the session, or None if recording is disabled or the
+        session is not sampled.
+    """
+    config = get_settings().recording
+    if config.dir is None or random.random() >= config.ratio:
+        return None
+    return create_recorder(
+        directory=config.dir,
+        conversation_id=conversation_id,
+        max_bytes=config.max_bytes,
+    )
+
+
+async def get_agent_hedge(websocket: WebSocket) -> AgentHedge:
+    """
+    Gets the hedging of the agent's responses.
+
+    Args:
+        websocket: WebSocket connection.
+
+    Returns:
+        Hedging of the agent's responses.
+    """
+    return websocket.state.agent_hedge
+
+
+async def get_tts_handler(
+    websocket: WebSocket,
+    conversation: ConversationState = Depends(get_conversation_state),
+    output_format: OutputFormat | None = Query(default=None, alias="format"),
+    voice: Voice | None = Query(default=None),
+    speed: float | None = Query(default=None, ge=0.25, le=4.0),
+    chunk_size: int | None = Query(default=None, gt=0),
+) -> TextToSpeech:
+    """
+    Gets a handler for text-to-speech conversion, with the output settings
+    negotiated by the client at connect time. Settings the client does not set
+    are those of the resumed session, or the defaults. The chunk size defaults
+    to the one tuned for the format, is bounded by the configured limits and
+    is aligned on whole frames.
+    The settings are recorded in the session, so a resumed session keeps them.
 
     Args:
         websocket: WebSocket connection.
+        conversation: In-memory state of the conversation (dependency).
+        output_format: Audio format, "pcm", "opus" or "aac" (query parameter).
+        voice: Voice of the speech (query parameter).
+        speed: Speed of the speech, from 0.25 to 4 (query parameter).
+        chunk_size: Size, in bytes, of the audio chunks (query parameter).
 
     Returns:
         Handler for text-to-speech conversion.
     """
+    settings = get_settings()
+    requested = {
+        "voice": voice,
+        "speed": speed,
+        "response_format": output_format,
+        "chunk_size": chunk_size,
+    }
+    tts_settings = {
+        "voice": settings.tts.voice,
+        "speed": settings.tts.speed,
+        "response_format": settings.tts.response_format,
+        **conversation.tts_settings,
+        **{key: value for key, value in requested.items() if value is not None},
+    }
+    if chunk_size is None and (
+        output_format is not None or "chunk_size" not in tts_settings
+    ):
+        tts_settings["chunk_size"] = getattr(
+            settings.tts, f"{tts_settings['response_format']}_chunk_size"
+        )
+    tts_settings["chunk_size"] = align_chunk_size(
+        response_format=tts_settings["response_format"],
+        chunk_size=min(
+            settings.tts.max_chunk_size,
+            max(settings.tts.min_chunk_size, tts_settings["chunk_size"]),
+        ),
+    )
+    conversation.tts_settings = tts_settings
+    conversation.save_snapshot()
     return TextToSpeech(
-        client=websocket.state.openai_client,
-        model_name="tts-1",
-        response_format="aac",
+        synthesizer=websocket.state.synthesizer,
+        model_name=settings.tts.model,
+        voice=tts_settings["voice"],
+        speed=tts_settings["speed"],
+        response_format=tts_settings["response_format"],
+        segmenter=TextSegmenter(
+            first_chars=settings.tts.segment_first_chars,
+            growth=settings.tts.segment_growth,
+            max_chars=settings.tts.segment_max_chars,
+        ),
+        chunk_size=tts_settings["chunk_size"],
+        max_in_flight=settings.tts.max_in_flight,
+        cache=websocket.state.tts_cache,
     )
@@ -0,0 +1,84 @@
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Literal
+
+from fastapi import WebSocket
+from loguru import logger
+
+from app.config.ingest import IngestConfig
+from app.engine.audio import encode_wav
+from app.engine.voice_activity import UtteranceSegmenter
+from app.telemetry.metrics import AUDIO_BYTES_IN
+
+type IngestMode = Literal["blob", "stream"]
+
+
+async def iter_utterances(
+    websocket: WebSocket,
+    mode: IngestMode,
+    config: IngestConfig,
+    on_speech_start: Callable[[], Awaitable[None]] | None = None,
+    on_pause: Callable[[bytes], Awaitable[None]] | None = None,
+    on_resume: Callable[[], Awaitable[None]] | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yields the audio of each user utterance received through the websocket.
+
+    - blob: every message is a complete recording of one utterance.
+    - stream: messages are 16-bit little-endian mono PCM frames, sent continuously.
+      The end of each utterance is detected on the server, and the utterance is
+      yielded as a WAV file as soon as the speech ends.
+
+    Args:
+        websocket: WebSocket connection.
+        mode: Ingestion mode chosen by the client.
+        config: Streaming audio ingestion configuration.
+        on_speech_start: Called as soon as the user starts speaking, before the
+            utterance is complete. Only in stream mode.
+        on_pause: Called with the audio of the utterance so far, as a WAV file,
+            when the user pauses for `speculate_pause_ms`. Only in stream mode
+            with speculation enabled.
+        on_resume: Called when the user speaks again after a pause, within the
+            same utterance. Only in stream mode with speculation enabled.
+
+    Yields:
+        Audio file of each utterance.
+    """
+    if mode == "blob":
+        async for audio_bytes in websocket.iter_bytes():
+            AUDIO_BYTES_IN.inc(len(audio_bytes))
+            yield audio_bytes
+        return
+
+    segmenter = UtteranceSegmenter(
+        sample_rate=config.sample_rate,
+        frame_ms=config.frame_ms,
+        threshold_db=config.vad_threshold_db,
+        speech_start_ms=config.speech_start_ms,
+        end_silence_ms=config.end_silence_ms,
+        preroll_ms=config.preroll_ms,
+        max_utterance_ms=config.max_utterance_ms,
+        pause_ms=config.speculate_pause_ms if config.speculative else None,
+    )
+    async for frame in websocket.iter_bytes():
+        AUDIO_BYTES_IN.inc(len(frame))
+        speech_starts = segmenter.speech_starts
+        pauses, resumes = segmenter.pauses, segmenter.resumes
+        utterances = segmenter.feed(frame)
+        if on_speech_start and segmenter.speech_starts > speech_starts:
+            await on_speech_start()
+        if on_resume and segmenter.resumes > resumes:
+            await on_resume()
+        if (
+            on_pause
+            and segmenter.pauses > pauses
+            and (partial := segmenter.partial()) is not None
+        ):
+            await on_pause(
+                encode_wav(samples=partial, sample_rate=config.sample_rate)
+            )
+        for utterance in utterances:
+            logger.info(
+                "End of utterance detected ({d:.2f}s)",
+                d=len(utterance) / config.sample_rate,
+            )
+            yield encode_wav(samples=utterance, sample_rate=config.sample_rate)
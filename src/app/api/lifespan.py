@@ -1,25 +1,41 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncIterator, TypedDict
 
 import aiohttp
 from fastapi import FastAPI
-from groq import AsyncGroq
 from loguru import logger
-from openai import AsyncOpenAI
 from psycopg_pool import AsyncConnectionPool
 from pydantic_ai import Agent, Tool
 
 from app.config.settings import get_settings
 from app.database.actions import create_main_table
 from app.database.connection import create_db_connection_pool
-from app.services.agent import Dependencies, create_groq_agent
+from app.database.migrations import apply_migrations
+from app.database.writer import MessageWriter
+from app.engine.audio_cache import AudioCache
+from app.engine.scheduler import UpstreamScheduler
+from app.engine.speech_to_text import Transcriber
+from app.engine.text_to_speech import Synthesizer
+from app.services.agent import AgentHedge, Dependencies, create_agent
 from app.services.factories import (
+    create_agent_hedge,
     create_aiohttp_session,
+    create_audio_preprocessor,
     create_groq_client,
-    create_groq_model,
+    create_model,
     create_openai_client,
+    create_scheduler,
+    create_session_store,
+    create_synthesizer,
+    create_transcriber,
 )
+from app.services.session_store import SessionStore
+from app.services.summarizer import Summarizer
+from app.services.tool_cache import ToolCache
 from app.services.tools import get_weather
+from app.services.warmup import Warmup
+from app.telemetry.loop_monitor import LoopMonitor
 
 
 class State(TypedDict):
@@ -28,16 +44,32 @@ class State(TypedDict):
     Attributes:
         pool: Database connection pool for async operations.
         aiohttp_session: Client session for making HTTP requests.
-        groq_client: Client for interacting with Groq API.
-        openai_client: Client for interacting with OpenAI API.
-        groq_agent: PydanticAI Agent that uses Groq models.
+        transcriber: Speech-to-text provider.
+        synthesizer: Text-to-speech provider.
+        agent: PydanticAI Agent.
+        agent_hedge: Hedging of the agent's responses.
+        message_writer: Background writer that persists messages.
+        tts_cache: Cache of synthesized audio.
+        tool_cache: Cache of tool results.
+        session_store: Store of session snapshots.
+        summarizer: Summarizer of older turns, if enabled.
+        warmup: Startup warmup, telling whether the worker is ready.
+        scheduler: Scheduler admitting upstream calls, if enabled.
     """
 
     pool: AsyncConnectionPool
     aiohttp_session: aiohttp.ClientSession
-    groq_client: AsyncGroq
-    openai_client: AsyncOpenAI
-    groq_agent: Agent[Dependencies]
+    transcriber: Transcriber
+    synthesizer: Synthesizer
+    agent: Agent[Dependencies]
+    agent_hedge: AgentHedge
+    message_writer: MessageWriter
+    tts_cache: AudioCache
+    tool_cache: ToolCache
+    session_store: SessionStore
+    summarizer: Summarizer | None
+    warmup: Warmup
+    scheduler: UpstreamScheduler | None
 
 
 @asynccontextmanager
@@ -54,33 +86,106 @@ async def app_lifespan(app: FastAPI) -> AsyncIterator[State]:
         Application state containing shared resources.
     """
     settings = get_settings()
-    aiohttp_session = create_aiohttp_session()
+    loop_monitor = LoopMonitor(config=settings.loop_monitor)
+    loop_monitor.start()
+    aiohttp_session = create_aiohttp_session(settings=settings)
     pool = create_db_connection_pool(settings=settings)
     openai_client = create_openai_client(settings=settings)
     groq_client = create_groq_client(settings=settings)
-    _groq_model = create_groq_model(groq_client=groq_client)
-    groq_agent = create_groq_agent(
-        groq_model=_groq_model,
-        tools=[Tool(function=get_weather, takes_ctx=True)],
+    preprocessor = create_audio_preprocessor(settings=settings)
+    scheduler = create_scheduler(settings=settings)
+    transcriber = create_transcriber(
+        settings=settings,
+        groq_client=groq_client,
+        preprocessor=preprocessor,
+        scheduler=scheduler,
+    )
+    synthesizer = create_synthesizer(
+        settings=settings, openai_client=openai_client, scheduler=scheduler
+    )
+    _model = create_model(
+        settings=settings, groq_client=groq_client, scheduler=scheduler
+    )
+    tool_cache = ToolCache(max_entries=settings.agent.tool_cache_entries)
+    agent = create_agent(
+        model=_model,
+        tools=[
+            Tool(
+                function=tool_cache.wrap(
+                    get_weather, ttl=settings.agent.weather_cache_ttl
+                ),
+                takes_ctx=True,
+            )
+        ],
         system_prompt=(
             "You are a helpful assistant. "
             "You interact with the user in a natural way. "
             "You should use `get_weather` ONLY to provide weather information."
         ),
     )
+    agent_hedge = create_agent_hedge(
+        settings=settings, groq_client=groq_client, scheduler=scheduler
+    )
+    summarizer = (
+        Summarizer(model=_model, max_words=settings.agent.summary_max_words)
+        if settings.agent.summarize
+        else None
+    )
+
+    tts_cache = AudioCache(
+        max_memory_bytes=settings.tts.cache_memory_bytes,
+        directory=settings.tts.cache_dir,
+        max_disk_bytes=settings.tts.cache_disk_bytes,
+    )
 
     logger.info("Opening database connection pool")
     await pool.open()
     await create_main_table(pool)
+    await apply_migrations(pool)
+
+    logger.info("Starting message writer")
+    message_writer = MessageWriter(
+        pool=pool,
+        batch_size=settings.database.write_batch_size,
+        flush_interval=settings.database.write_flush_interval,
+        max_retries=settings.database.write_max_retries,
+        max_queued=settings.database.write_max_queued,
+    )
+    message_writer.start()
+
+    session_store = create_session_store(settings=settings, pool=pool)
+
+    logger.info("Warming up")
+    warmup = Warmup(
+        settings=settings,
+        pool=pool,
+        aiohttp_session=aiohttp_session,
+        groq_client=groq_client,
+        openai_client=openai_client,
+    )
+    warmup.start()
 
     yield {
         "pool": pool,
         "aiohttp_session": aiohttp_session,
-        "openai_client": openai_client,
-        "groq_client": groq_client,
-        "groq_agent": groq_agent,
+        "transcriber": transcriber,
+        "synthesizer": synthesizer,
+        "agent": agent,
+        "agent_hedge": agent_hedge,
+        "message_writer": message_writer,
+        "tts_cache": tts_cache,
+        "tool_cache": tool_cache,
+        "session_store": session_store,
+        "summarizer": summarizer,
+        "warmup": warmup,
+        "scheduler": scheduler,
     }
 
+    await warmup.close()
+
+    logger.info("Draining message writer")
+    await message_writer.close()
+
     logger.info("Closing aiohttp session")
     await aiohttp_session.close()
 
@@ -92,3 +197,12 @@ async def app_lifespan(app: FastAPI) -> AsyncIterator[State]:
 
     logger.info("Closing Groq client")
     await groq_client.close()
+
+    if preprocessor is not None and preprocessor.executor is not None:
+        logger.info("Shutting down audio workers")
+        # Joining the worker processes blocks
+        await asyncio.to_thread(
+            preprocessor.executor.shutdown, cancel_futures=True
+        )
+
+    await loop_monitor.close()
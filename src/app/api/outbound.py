@@ -0,0 +1,334 @@
+import asyncio
+import struct
+from collections import deque
+from time import perf_counter
+from typing import Any
+
+from fastapi import WebSocket
+from loguru import logger
+
+from app.config.outbound import OutboundConfig
+from app.telemetry.metrics import (
+    AUDIO_BYTES_OUT,
+    OUTBOUND_FRAMES,
+    SLOW_CONSUMERS,
+)
+from app.telemetry.recording import AUDIO_OUT, RecordKind, record_event
+from app.telemetry.tracing import current_stage, record_stage
+
+# Header of every audio frame: turn number and sequence number, little-endian
+FRAME_HEADER = struct.Struct("<II")
+
+# Close code sent to clients that cannot keep up ("Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class SlowConsumerError(Exception):
+    """Raised when audio is sent to a client that was disconnected for being too
+    slow."""
+
+
+class AudioChannel:
+    """
+    Per-connection outbound channel that decouples the production of audio from
+    the speed of the client.
+
+    Producers enqueue audio and control events without waiting. A background
+    task coalesces consecutive audio chunks into frames of up to `frame_bytes`,
+    the chunk size negotiated by the client, waiting at most `max_wait_ms` for a
+    frame to fill, and sends everything in order. Chunks are only coalesced
+    whole, and only while they fit, so frames never exceed the negotiated size.
+
+    Framing:
+
+    - Audio: binary messages made of an 8-byte header, with the turn number and
+      the sequence number of the frame within the connection (two little-endian
+      unsigned 32-bit integers), followed by the audio bytes.
+    - End of turn: `{"event": "end_of_turn", "turn": ..., "last_seq": ...}`.
+    - Interrupt: `{"event": "interrupt", "turn": ...}`, after the audio of the
+      interrupted turn still queued has been dropped.
+
+    A client is too slow, and is disconnected with code 1013, when more than
+    `max_buffer_bytes` of audio are queued for it or a frame takes longer than
+    `send_timeout_s` to send.
+
+    The channel knows which turn owns the audio still queued or being sent, so
+    a turn can be interrupted until its audio has reached the client, and which
+    text of the current turn has actually been sent.
+    """
+
+    def __init__(
+        self, websocket: WebSocket, config: OutboundConfig, frame_bytes: int
+    ) -> None:
+        """
+        Initializes the AudioChannel object.
+
+        Args:
+            websocket: WebSocket connection.
+            config: Outbound audio channel configuration.
+            frame_bytes: Maximum size of an audio frame, the chunk size
+                negotiated by the client.
+        """
+        self.websocket = websocket
+        self.config = config
+        self.frame_bytes = frame_bytes
+        self.turn = 0
+        self._seq = 0
+        self._items: deque[tuple[int, bytes, str] | dict[str, Any]] = deque()
+        self._buffered = 0
+        self._ready = asyncio.Event()
+        self._sent = asyncio.Event()
+        self._sending: int | None = None
+        self._played: list[str] = []
+        self._sender: asyncio.Task[None] | None = None
+        self._closing: asyncio.Task[None] | None = None
+        self.shed = False
+
+    def start(self) -> None:
+        """Starts the background task sending the queued messages."""
+        self._sender = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stops the background task, dropping any queued message."""
+        for task in (self._sender, self._closing):
+            if task is not None and not task.done():
+                task.cancel()
+        tasks = [t for t in (self._sender, self._closing) if t is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sent.set()
+
+    def start_turn(self) -> None:
+        """Starts a new turn. Frames sent from now on carry its number."""
+        self.turn += 1
+        self._played = []
+
+    @property
+    def played_text(self) -> str:
+        """Text of the current turn whose audio has been sent to the client."""
+        return "".join(self._played)
+
+    @property
+    def pending(self) -> bool:
+        """Whether audio of the current turn is still queued or being sent."""
+        if self._sending == self.turn:
+            return True
+        # Turn numbers only grow along the queue
+        for item in reversed(self._items):
+            if not isinstance(item, dict):
+                return item[0] == self.turn
+        return False
+
+    async def drain(self) -> None:
+        """
+        Waits until the audio of the current turn has been sent to the client.
+
+        Raises:
+            SlowConsumerError: If the client is disconnected for being too slow.
+        """
+        while self.pending:
+            self._sent.clear()
+            await self._sent.wait()
+        if self.shed:
+            raise SlowConsumerError("client disconnected for being too slow")
+
+    def send_audio(self, chunk: bytes, text: str = "") -> None:
+        """
+        Queues audio for the client.
+
+        Args:
+            chunk: Audio bytes.
+            text: Text whose audio starts with the chunk, if any. It counts as
+                played once the chunk is sent.
+
+        Raises:
+            SlowConsumerError: If the client is disconnected for being too slow.
+        """
+        if self.shed:
+            raise SlowConsumerError("client disconnected for being too slow")
+        self._buffered += len(chunk)
+        if self._buffered > self.config.max_buffer_bytes:
+            self._shed(reason=f"{self._buffered} bytes queued")
+            raise SlowConsumerError("client disconnected for being too slow")
+        self._items.append((self.turn, chunk, text))
+        self._ready.set()
+
+    def end_turn(self) -> None:
+        """Queues the end-of-turn marker of the current turn."""
+        self._send_event({"event": "end_of_turn", "turn": self.turn})
+
+    def interrupt(self) -> None:
+        """
+        Drops the audio still queued for the current turn and queues an
+        interrupt event, telling the client to drop the audio it has buffered.
+        """
+        kept = [item for item in self._items if isinstance(item, dict)]
+        self._items = deque(kept)
+        self._buffered = 0
+        self._sent.set()
+        self._send_event({"event": "interrupt", "turn": self.turn})
+
+    def _send_event(self, event: dict[str, Any]) -> None:
+        """
+        Queues a control event, sent after every audio frame queued before it.
+
+        Args:
+            event: Event sent as JSON.
+        """
+        if self.shed:
+            return
+        self._items.append(event)
+        self._ready.set()
+
+    async def _run(self) -> None:
+        """Sends the queued messages, coalescing consecutive audio chunks."""
+        current_stage.set("send")
+        max_wait = self.config.max_wait_ms / 1000
+        try:
+            while True:
+                if not self._items:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                item = self._items[0]
+                if isinstance(item, dict):
+                    self._items.popleft()
+                    if item["event"] == "end_of_turn":
+                        item["last_seq"] = self._seq - 1
+                    await self._send(self.websocket.send_json(item))
+                    continue
+
+                # Wait for the frame to fill, up to the maximum wait
+                deadline = perf_counter() + max_wait
+                while (
+                    self._items
+                    and self._audio_bytes() < self.frame_bytes
+                    and not isinstance(self._items[-1], dict)
+                    and (remaining := deadline - perf_counter()) > 0
+                ):
+                    self._ready.clear()
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), remaining)
+                    except TimeoutError:
+                        break
+                if self._items and not isinstance(self._items[0], dict):
+                    await self._send_frame(*self._pop_frame())
+        except SlowConsumerError:
+            return
+        except Exception as e:  # noqa: BLE001 - any socket failure
+            logger.debug("Outbound channel stopped: {e}", e=e)
+
+    def _audio_bytes(self) -> int:
+        """
+        Size of the audio chunks at the head of the queue.
+
+        Returns:
+            Number of bytes available for the next frame.
+        """
+        size = 0
+        for item in self._items:
+            if isinstance(item, dict) or size >= self.frame_bytes:
+                break
+            size += len(item[1])
+        return size
+
+    def _pop_frame(self) -> tuple[int, bytes, list[str]]:
+        """
+        Removes the audio chunks at the head of the queue, up to the frame size,
+        and at least one. Chunks of different turns are never coalesced, since
+        the end-of-turn marker sits between them.
+
+        Returns:
+            Turn number, audio bytes and texts starting in the frame.
+        """
+        chunks: list[bytes] = []
+        texts = []
+        size = 0
+        turn = 0
+        while (
+            self._items
+            and not isinstance(head := self._items[0], dict)
+            and (not chunks or size + len(head[1]) <= self.frame_bytes)
+        ):
+            item = self._items.popleft()
+            assert not isinstance(item, dict)
+            turn, chunk, text = item
+            chunks.append(chunk)
+            if text:
+                texts.append(text)
+            size += len(chunk)
+        self._buffered -= size
+        return turn, b"".join(chunks), texts
+
+    async def _send_frame(
+        self, turn: int, audio: bytes, texts: list[str]
+    ) -> None:
+        """
+        Sends an audio frame with its header, and marks its texts as played.
+
+        Args:
+            turn: Turn number of the frame.
+            audio: Audio bytes of the frame.
+            texts: Texts whose audio starts in the frame.
+        """
+        seq = self._seq
+        header = FRAME_HEADER.pack(turn, seq)
+        self._seq += 1
+        self._sending = turn
+        try:
+            await self._send(self.websocket.send_bytes(header + audio))
+        finally:
+            self._sending = None
+            self._sent.set()
+        if turn == self.turn:
+            self._played.extend(texts)
+        OUTBOUND_FRAMES.inc()
+        AUDIO_BYTES_OUT.inc(len(audio))
+        record_event(
+            RecordKind.AUDIO_OUT, AUDIO_OUT.pack(turn, seq, len(audio))
+        )
+
+    async def _send(self, message: Any) -> None:
+        """
+        Sends a message, disconnecting the client if it takes too long.
+
+        Args:
+            message: Coroutine sending the message.
+
+        Raises:
+            SlowConsumerError: If the message was not sent in time.
+        """
+        start = perf_counter()
+        try:
+            await asyncio.wait_for(message, self.config.send_timeout_s)
+        except TimeoutError as e:
+            self._shed(reason="send timed out")
+            raise SlowConsumerError(
+                "client disconnected for being too slow"
+            ) from e
+        record_stage(stage="ws_send", duration=perf_counter() - start)
+
+    def _shed(self, reason: str) -> None:
+        """
+        Disconnects a client that cannot keep up and drops its queued audio.
+
+        Args:
+            reason: Why the client is too slow.
+        """
+        if self.shed:
+            return
+        self.shed = True
+        self._items.clear()
+        self._buffered = 0
+        self._sent.set()
+        SLOW_CONSUMERS.inc()
+        logger.warning("Disconnecting slow client: {r}", r=reason)
+        self._closing = asyncio.create_task(self._disconnect())
+
+    async def _disconnect(self) -> None:
+        """Stops sending and closes the connection."""
+        if self._sender is not None:
+            self._sender.cancel()
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as e:  # noqa: BLE001 - may already be closed
+            logger.debug("Failed to close the connection: {e}", e=e)
@@ -0,0 +1,31 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class AgentConfig(BaseSettings):
+    """
+    Language model agent configuration.
+
+    Attributes:
+        history_max_messages: Maximum number of previous messages sent to the agent.
+        history_max_tokens: Maximum number of estimated tokens of previous messages
+            sent to the agent.
+        summarize: Whether to fold older turns into a rolling summary.
+        history_keep_turns: Number of recent turns (a user message and the
+            answer) kept verbatim when summarizing.
+        summary_trigger_tokens: Estimated tokens of older turns that trigger a
+            background summarization.
+        summary_max_words: Maximum length of the summary, in words.
+        tool_cache_entries: Maximum number of cached tool results.
+        weather_cache_ttl: Time, in seconds, a weather report stays cached.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="AGENT_")
+
+    history_max_messages: int = 50
+    history_max_tokens: int = 8000
+    summarize: bool = True
+    history_keep_turns: int = 6
+    summary_trigger_tokens: int = 800
+    summary_max_words: int = 200
+    tool_cache_entries: int = 1024
+    weather_cache_ttl: float = 300.0
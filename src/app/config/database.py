@@ -1,6 +1,4 @@
-import os
-
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class DatabaseConfig(BaseSettings):
@@ -12,13 +10,41 @@ class DatabaseConfig(BaseSettings):
         password: Database password.
         host: Database host.
         port: Database port.
+        write_batch_size: Maximum number of messages written in one batch.
+        write_flush_interval: Maximum time, in seconds, a message waits before
+            its batch is written.
+        write_max_retries: Maximum number of retries of a batch failing with a
+            connection error.
+        write_max_queued: Maximum number of messages waiting to be written.
+            Further messages are dropped.
+        pool_min_size: Number of connections kept open by the pool.
+        pool_max_size: Maximum number of connections opened by the pool.
+        pool_timeout: Maximum time, in seconds, to wait for a connection.
+        pool_max_waiting: Maximum number of requests waiting for a connection,
+            unbounded if 0.
+        pool_max_idle: Time, in seconds, after which an idle connection above
+            the minimum size is closed.
+        pool_max_lifetime: Time, in seconds, after which a connection is
+            replaced.
     """
 
-    name: str = os.environ["DB_NAME"]
-    user: str = os.environ["DB_USER"]
-    password: str = os.environ["DB_PASSWORD"]
-    host: str = os.environ["DB_HOST"]
-    port: str = os.environ["DB_PORT"]
+    model_config = SettingsConfigDict(env_prefix="DB_")
+
+    name: str
+    user: str
+    password: str
+    host: str
+    port: str
+    write_batch_size: int = 500
+    write_flush_interval: float = 0.05
+    write_max_retries: int = 5
+    write_max_queued: int = 100_000
+    pool_min_size: int = 2
+    pool_max_size: int = 10
+    pool_timeout: float = 10.0
+    pool_max_waiting: int = 0
+    pool_max_idle: float = 300.0
+    pool_max_lifetime: float = 3600.0
 
     @property
     def conninfo(self) -> str:
@@ -1,5 +1,3 @@
-import os
-
 from pydantic_settings import BaseSettings
 
 
@@ -13,6 +11,6 @@ class EngineConfig(BaseSettings):
         weatherstack_api_key: Weather Stack API authentication key.
     """
 
-    groq_api_key: str = os.environ["GROQ_API_KEY"]
-    openai_api_key: str = os.environ["OPENAI_API_KEY"]
-    weatherstack_api_key: str = os.environ["WEATHERSTACK_API_KEY"]
+    groq_api_key: str
+    openai_api_key: str
+    weatherstack_api_key: str
@@ -0,0 +1,59 @@
+from pydantic_ai.models.groq import GroqModelName
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class HedgingConfig(BaseSettings):
+    """
+    Deadlines, hedging and retries of the calls to the upstream providers.
+
+    A call whose first byte (a transcript, a token or a chunk of audio) is not
+    received within the deadline of its stage is hedged: a duplicate is
+    started, on the secondary model if any, and the first to respond is used.
+    Calls failing with a transient error before their first byte, or whose
+    first byte is not received within the timeout of their stage, are retried
+    with a jittered exponential backoff.
+
+    Attributes:
+        enabled: Whether slow calls are hedged. Retries apply regardless.
+        max_ratio: Maximum fraction of the calls of a stage that are hedged.
+        burst: Maximum number of hedges of a stage in a burst.
+        stt_deadline_s: Time, in seconds, to the transcript after which a
+            speech-to-text call is hedged.
+        llm_deadline_s: Time, in seconds, to the first token after which a
+            language model call is hedged.
+        tts_deadline_s: Time, in seconds, to the first byte after which a
+            text-to-speech call is hedged.
+        stt_timeout_s: Time, in seconds, to the transcript after which a
+            speech-to-text call is abandoned and retried.
+        llm_timeout_s: Time, in seconds, to the first token after which a
+            language model call is abandoned and retried.
+        tts_timeout_s: Time, in seconds, to the first byte after which a
+            text-to-speech call is abandoned and retried.
+        stt_model: Groq speech-to-text model of the hedges, the primary one if
+            None.
+        llm_model: Groq language model of the hedges, the primary one if None.
+        tts_model: OpenAI text-to-speech model of the hedges, the primary one if
+            None.
+        retries: Maximum number of retries of a failed call.
+        backoff_base_s: Backoff, in seconds, of the first retry, doubled at
+            every retry.
+        backoff_max_s: Maximum backoff, in seconds.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="HEDGE_")
+
+    enabled: bool = True
+    max_ratio: float = 0.05
+    burst: float = 5.0
+    stt_deadline_s: float = 2.0
+    llm_deadline_s: float = 1.5
+    tts_deadline_s: float = 1.0
+    stt_timeout_s: float = 10.0
+    llm_timeout_s: float = 10.0
+    tts_timeout_s: float = 5.0
+    stt_model: str | None = None
+    llm_model: GroqModelName | None = None
+    tts_model: str | None = None
+    retries: int = 2
+    backoff_base_s: float = 0.1
+    backoff_max_s: float = 1.0
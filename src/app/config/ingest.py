@@ -0,0 +1,36 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class IngestConfig(BaseSettings):
+    """
+    Streaming audio ingestion configuration.
+
+    In streaming mode the client sends 16-bit little-endian mono PCM frames and the
+    server detects the end of each utterance.
+
+    Attributes:
+        sample_rate: Sample rate of the incoming audio.
+        frame_ms: Duration of the voice activity analysis frames.
+        vad_threshold_db: Frame energy, in dBFS, above which a frame is voiced.
+        speech_start_ms: Duration of voiced audio that starts an utterance.
+        end_silence_ms: Duration of silence that ends an utterance.
+        preroll_ms: Duration of audio kept before the start of an utterance.
+        max_utterance_ms: Duration after which an utterance is ended anyway.
+        speculative: Whether the response is started speculatively when the
+            user pauses, before the end of the utterance is detected.
+        speculate_pause_ms: Duration of silence that starts a speculative
+            response. Shorter pauses start more speculations, wasting more
+            tokens when the user goes on speaking.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="INGEST_")
+
+    sample_rate: int = 16_000
+    frame_ms: int = 20
+    vad_threshold_db: float = -45.0
+    speech_start_ms: int = 60
+    end_silence_ms: int = 600
+    preroll_ms: int = 300
+    max_utterance_ms: int = 30_000
+    speculative: bool = False
+    speculate_pause_ms: int = 250
@@ -0,0 +1,26 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class LoopMonitorConfig(BaseSettings):
+    """
+    Event loop monitor configuration.
+
+    Attributes:
+        enabled: Whether the event loop is monitored.
+        interval_s: Interval, in seconds, between two samples of the scheduling
+            lag.
+        slow_callback_s: Time, in seconds, the loop can be blocked before the
+            callback blocking it is flagged, with its stack.
+        stack_limit: Maximum number of frames of the stacks logged.
+        debug: Whether stalls are attributed to the pipeline stage that caused
+            them, and asyncio's debug mode reports every slow callback. Slows
+            down the loop.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="LOOP_MONITOR_")
+
+    enabled: bool = True
+    interval_s: float = 0.05
+    slow_callback_s: float = 0.05
+    stack_limit: int = 20
+    debug: bool = False
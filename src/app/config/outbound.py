@@ -0,0 +1,25 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class OutboundConfig(BaseSettings):
+    """
+    Outbound audio channel configuration.
+
+    Audio is queued per connection and sent by a background task, so upstream
+    streaming never waits for the client's network. Small chunks are coalesced
+    into frames of up to the chunk size negotiated by the client, and a partial
+    frame is sent after `max_wait_ms`.
+
+    Attributes:
+        max_buffer_bytes: Maximum audio bytes queued for a client. A client that
+            falls further behind is disconnected.
+        max_wait_ms: Maximum time audio waits to be coalesced into a frame.
+        send_timeout_s: Maximum time to send one frame. A client that takes
+            longer is disconnected.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="OUTBOUND_")
+
+    max_buffer_bytes: int = 1024 * 1024
+    max_wait_ms: float = 20.0
+    send_timeout_s: float = 5.0
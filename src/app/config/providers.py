@@ -0,0 +1,47 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class ProviderConfig(BaseSettings):
+    """
+    Upstream provider selection.
+
+    The "fake" providers run in-process, without network access, and emulate the
+    latency and throughput of the real ones. Their latencies follow a log-normal
+    distribution with the given median and shape (`*_jitter`), sampled from a
+    generator seeded with `fake_seed` and the request, so runs are reproducible.
+
+    Attributes:
+        stt: Speech-to-text provider.
+        llm: Language model provider.
+        tts: Text-to-speech provider.
+        fake_seed: Seed of the fake providers.
+        fake_stt_latency_ms: Median latency of a fake transcription.
+        fake_stt_ms_per_kb: Additional fake transcription latency per KB of audio.
+        fake_stt_jitter: Shape of the fake transcription latency distribution.
+        fake_llm_ttft_ms: Median time to first token of the fake language model.
+        fake_llm_jitter: Shape of the fake time to first token distribution.
+        fake_llm_tokens_per_s: Token rate of the fake language model.
+        fake_tts_ttfb_ms: Median time to first byte of the fake speech synthesis.
+        fake_tts_jitter: Shape of the fake time to first byte distribution.
+        fake_tts_bytes_per_s: Audio byte rate of the fake speech synthesis.
+        fake_tts_bytes_per_char: Audio bytes produced per character of text.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="PROVIDER_")
+
+    stt: Literal["groq", "fake"] = "groq"
+    llm: Literal["groq", "fake"] = "groq"
+    tts: Literal["openai", "fake"] = "openai"
+    fake_seed: int = 0
+    fake_stt_latency_ms: float = 300.0
+    fake_stt_ms_per_kb: float = 0.5
+    fake_stt_jitter: float = 0.25
+    fake_llm_ttft_ms: float = 250.0
+    fake_llm_jitter: float = 0.25
+    fake_llm_tokens_per_s: float = 250.0
+    fake_tts_ttfb_ms: float = 200.0
+    fake_tts_jitter: float = 0.25
+    fake_tts_bytes_per_s: float = 64_000.0
+    fake_tts_bytes_per_char: int = 400
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class RecordingConfig(BaseSettings):
+    """
+    Session recording configuration.
+
+    Recorded sessions capture the audio of every turn, the transcription, the
+    language model deltas and tool calls, the timings of the text-to-speech
+    requests and of the audio sent to the client, for offline replay with
+    `benchmarks/replay.py`.
+
+    Attributes:
+        dir: Directory of the recordings. Sessions are not recorded if None.
+        ratio: Fraction of the sessions recorded.
+        max_bytes: Maximum size of the recording of a session.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="RECORD_")
+
+    dir: Path | None = None
+    ratio: float = 1.0
+    max_bytes: int = 256 * 1024 * 1024
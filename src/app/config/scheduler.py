@@ -0,0 +1,44 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class SchedulerConfig(BaseSettings):
+    """
+    Admission control of the calls to the upstream providers.
+
+    Each provider admits a limited number of concurrent calls, within optional
+    per-minute budgets matching the provider's rate limits. Calls beyond them
+    are queued by priority: the first audio segment of a response ahead of live
+    turns, and live turns ahead of background summarization. New sessions are
+    rejected while a queue holds `max_queue` calls or more.
+
+    Attributes:
+        enabled: Whether upstream calls go through the scheduler.
+        max_queue: Queue depth, per provider, at which new sessions are
+            rejected.
+        stt_concurrency: Maximum concurrent speech-to-text calls.
+        stt_requests_per_minute: Budget of speech-to-text requests per minute,
+            unbounded if None.
+        llm_concurrency: Maximum concurrent language model calls.
+        llm_requests_per_minute: Budget of language model requests per minute,
+            unbounded if None.
+        llm_tokens_per_minute: Budget of estimated prompt tokens per minute,
+            unbounded if None.
+        tts_concurrency: Maximum concurrent text-to-speech calls.
+        tts_requests_per_minute: Budget of text-to-speech requests per minute,
+            unbounded if None.
+        tts_chars_per_minute: Budget of synthesized characters per minute,
+            unbounded if None.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="SCHEDULER_")
+
+    enabled: bool = True
+    max_queue: int = 64
+    stt_concurrency: int = 16
+    stt_requests_per_minute: float | None = None
+    llm_concurrency: int = 32
+    llm_requests_per_minute: float | None = None
+    llm_tokens_per_minute: float | None = None
+    tts_concurrency: int = 32
+    tts_requests_per_minute: float | None = None
+    tts_chars_per_minute: float | None = None
@@ -0,0 +1,20 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class SessionConfig(BaseSettings):
+    """
+    Session snapshot configuration.
+
+    Attributes:
+        store: Store of session snapshots. "postgres" is shared by every worker;
+            "memory" is a local stand-in for a single worker.
+        memory_max_entries: Maximum number of snapshots kept by the "memory"
+            store.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="SESSION_")
+
+    store: Literal["postgres", "memory"] = "postgres"
+    memory_max_entries: int = 10_000
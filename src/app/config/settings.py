@@ -1,22 +1,61 @@
 from functools import lru_cache
 
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
+from app.config.agent import AgentConfig
 from app.config.database import DatabaseConfig
 from app.config.engine import EngineConfig
+from app.config.hedging import HedgingConfig
+from app.config.ingest import IngestConfig
+from app.config.loop_monitor import LoopMonitorConfig
+from app.config.outbound import OutboundConfig
+from app.config.providers import ProviderConfig
+from app.config.recording import RecordingConfig
+from app.config.scheduler import SchedulerConfig
+from app.config.session import SessionConfig
+from app.config.stt import STTConfig
+from app.config.tts import TTSConfig
+from app.config.upstream import UpstreamConfig
 
 
 class Settings(BaseSettings):
     """
-    Application settings.
+    Application settings. Each configuration reads the environment when the
+    settings are created, not when the module is imported.
 
     Attributes:
         database: Configuration for the database.
         engine: API keys.
+        tts: Configuration for text-to-speech.
+        agent: Configuration for the language model agent.
+        ingest: Configuration for streaming audio ingestion.
+        providers: Selection of the upstream providers.
+        stt: Configuration for speech-to-text.
+        outbound: Configuration for the outbound audio channel.
+        session: Configuration for session snapshots.
+        upstream: Configuration of the connections to the upstream APIs.
+        scheduler: Configuration of the admission of upstream calls.
+        hedging: Configuration of the deadlines, hedging and retries of upstream
+            calls.
+        recording: Configuration of session recordings.
+        loop_monitor: Configuration of the event loop monitor.
     """
 
-    database: DatabaseConfig = DatabaseConfig()
-    engine: EngineConfig = EngineConfig()
+    database: DatabaseConfig = Field(default_factory=DatabaseConfig)
+    engine: EngineConfig = Field(default_factory=EngineConfig)
+    tts: TTSConfig = Field(default_factory=TTSConfig)
+    agent: AgentConfig = Field(default_factory=AgentConfig)
+    ingest: IngestConfig = Field(default_factory=IngestConfig)
+    providers: ProviderConfig = Field(default_factory=ProviderConfig)
+    stt: STTConfig = Field(default_factory=STTConfig)
+    outbound: OutboundConfig = Field(default_factory=OutboundConfig)
+    session: SessionConfig = Field(default_factory=SessionConfig)
+    upstream: UpstreamConfig = Field(default_factory=UpstreamConfig)
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
+    hedging: HedgingConfig = Field(default_factory=HedgingConfig)
+    recording: RecordingConfig = Field(default_factory=RecordingConfig)
+    loop_monitor: LoopMonitorConfig = Field(default_factory=LoopMonitorConfig)
 
 
 @lru_cache
@@ -0,0 +1,38 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class STTConfig(BaseSettings):
+    """
+    Speech-to-text configuration.
+
+    Before upload, WAV audio is downmixed to mono, resampled to `sample_rate`
+    and trimmed of leading and trailing silence, in a pool of worker processes.
+    WAV audio longer than `segment_min_s` is also split at silences into
+    overlapping segments, transcribed concurrently and stitched back together.
+
+    Attributes:
+        preprocess: Whether audio is compacted before upload.
+        preprocess_workers: Number of worker processes compacting audio, only
+            spawned if audio is compacted for a real provider.
+        sample_rate: Sample rate of the uploaded audio.
+        trim_threshold_db: Frame energy, in dBFS, above which a frame is voiced.
+        trim_padding_ms: Duration of silence kept around the speech.
+        segment_min_s: Minimum duration, in seconds, of the audio to split it.
+            Audio is never split if None.
+        segment_s: Target duration, in seconds, of a segment.
+        segment_overlap_ms: Duration of audio shared by consecutive segments.
+        segment_fanout: Maximum number of segments of an utterance transcribed
+            concurrently.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="STT_")
+
+    preprocess: bool = True
+    preprocess_workers: int = 2
+    sample_rate: int = 16_000
+    trim_threshold_db: float = -45.0
+    trim_padding_ms: int = 200
+    segment_min_s: float | None = 20.0
+    segment_s: float = 10.0
+    segment_overlap_ms: int = 500
+    segment_fanout: int = 4
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from app.engine.framing import OutputFormat
+from app.engine.text_to_speech import Voice
+
+
+class TTSConfig(BaseSettings):
+    """
+    Text-to-speech configuration.
+
+    Attributes:
+        model: OpenAI text-to-speech model.
+        voice: Voice of sessions that do not choose one.
+        speed: Speed of sessions that do not choose one.
+        response_format: Audio format of sessions that do not choose one.
+        pcm_chunk_size: Default size, in bytes, of raw PCM chunks. 40 ms of audio
+            by default, for low-latency clients.
+        opus_chunk_size: Default size, in bytes, of chunks of Opus packets.
+            About 200 ms of audio by default, for low-bandwidth clients.
+        aac_chunk_size: Default size, in bytes, of AAC chunks.
+        min_chunk_size: Minimum chunk size a client can choose.
+        max_chunk_size: Maximum chunk size a client can choose.
+        max_in_flight: Maximum number of text segments being synthesized
+            concurrently. Audio is still delivered in segment order.
+        cache_memory_bytes: Size of the in-memory audio cache.
+        cache_dir: Directory of the on-disk audio cache, disabled if None.
+        cache_disk_bytes: Size of the on-disk audio cache, per worker.
+        segment_first_chars: Target size, in characters, of the first text segment
+            of a response. Smaller values reduce the time to first audio.
+        segment_growth: Growth factor of the target size of later segments.
+        segment_max_chars: Maximum size, in characters, of a text segment.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="TTS_")
+
+    model: str = "tts-1"
+    voice: Voice = "echo"
+    speed: float = 1.0
+    response_format: OutputFormat = "aac"
+    pcm_chunk_size: int = 1920
+    opus_chunk_size: int = 1024
+    aac_chunk_size: int = 5 * 1024
+    min_chunk_size: int = 256
+    max_chunk_size: int = 64 * 1024
+    max_in_flight: int = 3
+    cache_memory_bytes: int = 32 * 1024 * 1024
+    cache_dir: Path | None = None
+    cache_disk_bytes: int = 512 * 1024 * 1024
+    segment_first_chars: int = 20
+    segment_growth: float = 2.0
+    segment_max_chars: int = 250
@@ -0,0 +1,30 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class UpstreamConfig(BaseSettings):
+    """
+    Configuration of the connections to the upstream APIs (Groq, OpenAI and
+    Weatherstack).
+
+    Attributes:
+        http2: Whether to use HTTP/2 with the Groq and OpenAI APIs. It requires
+            the `h2` package, and is ignored without it.
+        max_connections: Maximum number of connections per client.
+        max_keepalive_connections: Maximum number of idle connections kept
+            alive per client.
+        keepalive_expiry_s: Time, in seconds, an idle connection is kept alive.
+        warmup: Whether to open the connections to the upstream APIs and fill
+            the database pool at startup, before reporting ready.
+        warmup_connections: Number of connections opened to each upstream API.
+        warmup_timeout_s: Maximum time, in seconds, to warm up each resource.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="UPSTREAM_")
+
+    http2: bool = True
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry_s: float = 60.0
+    warmup: bool = True
+    warmup_connections: int = 2
+    warmup_timeout_s: float = 10.0
@@ -1,8 +1,13 @@
+from collections.abc import Callable
+from typing import Any
+
 from loguru import logger
 from psycopg import AsyncConnection
 from psycopg_pool import AsyncConnectionPool
 from pydantic import UUID4
 
+type MessageRow = tuple[UUID4, str, str, int]
+
 
 async def create_main_table(pool: AsyncConnectionPool) -> None:
     """
@@ -49,6 +54,29 @@ async def store_message(
         await conn.commit()
 
 
+async def store_messages(
+    conn: AsyncConnection, messages: list[MessageRow]
+) -> None:
+    """
+    Store a batch of messages in the database, in a single transaction.
+
+    Rows are copied in order, so their ids follow the order of the batch.
+
+    Args:
+        conn: Asynchronous database connection.
+        messages: Rows of (conversation_id, sender, content, tokens).
+    """
+    query = (
+        "COPY messages (conversation_id, sender, content, tokens) FROM STDIN;"
+    )
+
+    async with conn.cursor() as cur:
+        async with cur.copy(query) as copy:
+            for message in messages:
+                await copy.write_row(message)
+        await conn.commit()
+
+
 async def get_conversation_history(
     conn: AsyncConnection, conversation_id: UUID4
 ) -> list[dict[str, str]]:
@@ -66,7 +94,7 @@ async def get_conversation_history(
         "SELECT sender, content "
         "FROM messages "
         "WHERE conversation_id = %s "
-        "ORDER BY timestamp ASC;"
+        "ORDER BY id ASC;"
     )
     params = (conversation_id,)
 
@@ -77,3 +105,235 @@ async def get_conversation_history(
             {"sender": row[0], "content": row[1]} for row in rows
         ]
     return conversation_history
+
+
+async def get_conversation_window(
+    conn: AsyncConnection,
+    conversation_id: UUID4,
+    max_messages: int,
+    estimate_tokens: Callable[[str], int],
+    max_tokens: int | None = None,
+    page_size: int = 20,
+    after_id: int = 0,
+) -> list[dict[str, Any]]:
+    """
+    Retrieve the most recent messages of a conversation, bounded by a number of
+    messages and, optionally, by an estimated number of tokens. Only the
+    messages after `after_id`, e.g. not yet summarized, are retrieved.
+
+    Messages are read newest first, one page at a time, using keyset pagination on
+    the `(conversation_id, id)` index, so the cost depends only on the size of the
+    window and not on the size of the table or of the conversation. The stored
+    token counts are used, and estimated only for messages stored without one.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+        max_messages: Maximum number of messages to retrieve.
+        estimate_tokens: Estimates the tokens of a message stored without a
+            token count.
+        max_tokens: Maximum number of estimated tokens to retrieve.
+        page_size: Number of messages read per query.
+        after_id: Id of the message after which messages are retrieved.
+
+    Returns:
+        List of dictionaries containing the id, sender, content and estimated
+        tokens of each message, in chronological order.
+    """
+    query = (
+        "SELECT id, sender, content, tokens "
+        "FROM messages "
+        "WHERE conversation_id = %s AND id < %s AND id > %s "
+        "ORDER BY id DESC "
+        "LIMIT %s;"
+    )
+    window: list[dict[str, Any]] = []
+    tokens = 0
+    last_id = 2**31 - 1
+
+    async with conn.cursor() as cur:
+        while len(window) < max_messages:
+            limit = min(page_size, max_messages - len(window))
+            await cur.execute(
+                query=query,
+                params=(conversation_id, last_id, after_id, limit),
+            )
+            rows = await cur.fetchall()
+            for row in rows:
+                message_tokens = (
+                    row[3] if row[3] is not None else estimate_tokens(row[2])
+                )
+                tokens += message_tokens
+                if max_tokens is not None and tokens > max_tokens:
+                    return window[::-1]
+                window.append(
+                    {
+                        "id": row[0],
+                        "sender": row[1],
+                        "content": row[2],
+                        "tokens": message_tokens,
+                    }
+                )
+            if len(rows) < limit:
+                break
+            last_id = rows[-1][0]
+    return window[::-1]
+
+
+async def get_session_snapshot(
+    conn: AsyncConnection, conversation_id: UUID4
+) -> bytes | None:
+    """
+    Retrieve the serialized session snapshot of a conversation.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+
+    Returns:
+        Serialized snapshot, or None if the conversation has none.
+    """
+    query = "SELECT snapshot FROM session_snapshots WHERE conversation_id = %s;"
+    params = (conversation_id,)
+
+    async with conn.cursor() as cur:
+        await cur.execute(query=query, params=params)
+        row = await cur.fetchone()
+    return bytes(row[0]) if row is not None else None
+
+
+async def store_session_snapshot(
+    conn: AsyncConnection, conversation_id: UUID4, snapshot: bytes
+) -> None:
+    """
+    Store the serialized session snapshot of a conversation, replacing the
+    previous one.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+        snapshot: Serialized snapshot.
+    """
+    query = (
+        "INSERT INTO session_snapshots (conversation_id, snapshot) "
+        "VALUES (%s, %s) "
+        "ON CONFLICT (conversation_id) DO UPDATE "
+        "SET snapshot = EXCLUDED.snapshot, updated_at = CURRENT_TIMESTAMP;"
+    )
+    params = (conversation_id, snapshot)
+
+    async with conn.cursor() as cur:
+        await cur.execute(query=query, params=params)
+        await conn.commit()
+
+
+async def get_message_id(
+    conn: AsyncConnection, conversation_id: UUID4, position: int
+) -> int | None:
+    """
+    Retrieve the id of a message of a conversation from its position.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+        position: Position of the message in the conversation, from 0.
+
+    Returns:
+        Id of the message, or None if the conversation has fewer messages.
+    """
+    query = (
+        "SELECT id FROM messages WHERE conversation_id = %s "
+        "ORDER BY id LIMIT 1 OFFSET %s;"
+    )
+    params = (conversation_id, position)
+
+    async with conn.cursor() as cur:
+        await cur.execute(query=query, params=params)
+        row = await cur.fetchone()
+    return row[0] if row is not None else None
+
+
+async def count_messages_before(
+    conn: AsyncConnection, conversation_id: UUID4, message_id: int
+) -> int:
+    """
+    Count the messages of a conversation older than a message, i.e. the position
+    of the message in the conversation.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+        message_id: Id of the message.
+
+    Returns:
+        Number of older messages.
+    """
+    query = (
+        "SELECT count(*) FROM messages WHERE conversation_id = %s AND id < %s;"
+    )
+    params = (conversation_id, message_id)
+
+    async with conn.cursor() as cur:
+        await cur.execute(query=query, params=params)
+        row = await cur.fetchone()
+    return row[0] if row is not None else 0
+
+
+async def get_conversation_summary(
+    conn: AsyncConnection, conversation_id: UUID4
+) -> tuple[str, int, int] | None:
+    """
+    Retrieve the rolling summary of the older messages of a conversation.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+
+    Returns:
+        The summary, its estimated tokens and the number of messages, from the
+        start of the conversation, that it covers. None if the conversation has
+        none.
+    """
+    query = (
+        "SELECT summary, tokens, messages FROM conversation_summaries "
+        "WHERE conversation_id = %s;"
+    )
+    params = (conversation_id,)
+
+    async with conn.cursor() as cur:
+        await cur.execute(query=query, params=params)
+        row = await cur.fetchone()
+    return (row[0], row[1], row[2]) if row is not None else None
+
+
+async def store_conversation_summary(
+    conn: AsyncConnection,
+    conversation_id: UUID4,
+    summary: str,
+    tokens: int,
+    messages: int,
+) -> None:
+    """
+    Store the rolling summary of a conversation, replacing the previous one.
+
+    Args:
+        conn: Asynchronous database connection.
+        conversation_id: Unique identifier for the conversation.
+        summary: Summary of the older messages.
+        tokens: Estimated tokens of the summary.
+        messages: Number of messages, from the start of the conversation, that
+            the summary covers.
+    """
+    query = (
+        "INSERT INTO conversation_summaries "
+        "(conversation_id, summary, tokens, messages) "
+        "VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT (conversation_id) DO UPDATE "
+        "SET summary = EXCLUDED.summary, tokens = EXCLUDED.tokens, "
+        "messages = EXCLUDED.messages, updated_at = CURRENT_TIMESTAMP;"
+    )
+    params = (conversation_id, summary, tokens, messages)
+
+    async with conn.cursor() as cur:
+        await cur.execute(query=query, params=params)
+        await conn.commit()
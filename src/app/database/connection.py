@@ -7,7 +7,8 @@ def create_db_connection_pool(
     settings: Settings,
 ) -> AsyncConnectionPool:
     """
-    Create a connection pool to the database. It is closed by default.
+    Create a connection pool to the database, sized and timed out as configured
+    in the settings. It is closed by default.
 
     Args:
         settings: Application settings
@@ -15,4 +16,15 @@ def create_db_connection_pool(
     Returns:
         Connection pool to the database.
     """
-    return AsyncConnectionPool(conninfo=settings.database.conninfo, open=False)
+    database = settings.database
+    return AsyncConnectionPool(
+        conninfo=database.conninfo,
+        open=False,
+        name="v2v",
+        min_size=database.pool_min_size,
+        max_size=database.pool_max_size,
+        timeout=database.pool_timeout,
+        max_waiting=database.pool_max_waiting,
+        max_idle=database.pool_max_idle,
+        max_lifetime=database.pool_max_lifetime,
+    )
@@ -0,0 +1,162 @@
+from typing import NamedTuple
+
+from loguru import logger
+from psycopg import AsyncConnection, sql
+from psycopg_pool import AsyncConnectionPool
+
+
+class Migration(NamedTuple):
+    """
+    Schema change applied once, in version order.
+
+    Attributes:
+        version: Version of the schema after the migration.
+        name: Short description of the migration.
+        query: Query to execute. It runs outside a transaction, so indexes can be
+            built concurrently.
+        index_name: Name of the index built concurrently by the query, if any. A
+            failed build leaves an invalid index behind, that is dropped and
+            built again, even if the migration was recorded as applied.
+    """
+
+    version: int
+    name: str
+    query: str
+    index_name: str | None = None
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        version=1,
+        name="Index messages by conversation and id",
+        query=(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+            "messages_conversation_id_id_idx "
+            "ON messages (conversation_id, id);"
+        ),
+        index_name="messages_conversation_id_id_idx",
+    ),
+    Migration(
+        version=2,
+        name="Create session snapshots",
+        query=(
+            "CREATE TABLE IF NOT EXISTS session_snapshots ("
+            "conversation_id UUID PRIMARY KEY,"
+            "snapshot BYTEA NOT NULL,"
+            "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+            ");"
+        ),
+    ),
+    Migration(
+        version=3,
+        name="Store the token count of messages",
+        query="ALTER TABLE messages ADD COLUMN IF NOT EXISTS tokens INTEGER;",
+    ),
+    Migration(
+        version=4,
+        name="Create conversation summaries",
+        query=(
+            "CREATE TABLE IF NOT EXISTS conversation_summaries ("
+            "conversation_id UUID PRIMARY KEY,"
+            "summary TEXT NOT NULL,"
+            "tokens INTEGER NOT NULL,"
+            "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+            ");"
+        ),
+    ),
+    Migration(
+        version=5,
+        name="Store the number of messages covered by summaries",
+        query=(
+            "ALTER TABLE conversation_summaries "
+            "ADD COLUMN IF NOT EXISTS messages INTEGER NOT NULL DEFAULT 0;"
+        ),
+    ),
+)
+
+# Arbitrary key of the advisory lock that serializes migrations across workers.
+MIGRATIONS_LOCK_ID = 7_212_001
+
+
+async def drop_invalid_index(conn: AsyncConnection, index: str) -> bool:
+    """
+    Drop an index left invalid by a failed concurrent build, which
+    `CREATE INDEX CONCURRENTLY IF NOT EXISTS` would otherwise skip.
+
+    Args:
+        conn: Asynchronous database connection, in autocommit mode.
+        index: Name of the index.
+
+    Returns:
+        Whether the index was invalid and dropped.
+    """
+    cur = await conn.execute(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);",
+        (index,),
+    )
+    row = await cur.fetchone()
+    if row is None or row[0]:
+        return False
+    logger.warning("Dropping invalid index {i}", i=index)
+    await conn.execute(
+        sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(
+            sql.Identifier(index)
+        )
+    )
+    return True
+
+
+async def apply_migrations(pool: AsyncConnectionPool) -> None:
+    """
+    Apply the pending schema migrations.
+
+    Applied versions are recorded in `schema_migrations`, and an advisory lock
+    ensures a single worker migrates at a time. Indexes left invalid by a failed
+    build are rebuilt.
+
+    Args:
+        pool: Connection pool to the database.
+    """
+    async with pool.connection() as conn:
+        await conn.set_autocommit(True)
+        try:
+            await conn.execute(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY,"
+                "name TEXT NOT NULL,"
+                "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+                ");"
+            )
+            await conn.execute(
+                "SELECT pg_advisory_lock(%s);", (MIGRATIONS_LOCK_ID,)
+            )
+            try:
+                cur = await conn.execute(
+                    "SELECT version FROM schema_migrations;"
+                )
+                applied = {row[0] for row in await cur.fetchall()}
+                for migration in MIGRATIONS:
+                    rebuild = migration.index_name is not None and (
+                        await drop_invalid_index(conn, migration.index_name)
+                    )
+                    if migration.version in applied and not rebuild:
+                        continue
+                    logger.info(
+                        "Applying migration {v}: {n}",
+                        v=migration.version,
+                        n=migration.name,
+                    )
+                    await conn.execute(migration.query)
+                    if migration.version in applied:
+                        continue
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name) "
+                        "VALUES (%s, %s);",
+                        (migration.version, migration.name),
+                    )
+            finally:
+                await conn.execute(
+                    "SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_ID,)
+                )
+        finally:
+            await conn.set_autocommit(False)
@@ -0,0 +1,188 @@
+import asyncio
+
+import psycopg
+from loguru import logger
+from psycopg_pool import AsyncConnectionPool
+from pydantic import UUID4
+
+from app.database.actions import MessageRow, store_messages
+from app.telemetry.metrics import MESSAGES_DROPPED
+
+
+class MessageWriter:
+    """
+    Background writer that persists messages off the latency path.
+
+    Messages from every session are queued and written in batches, one transaction
+    per batch, whenever `batch_size` messages are waiting or `flush_interval`
+    seconds have passed since the first one. A single task writes the batches in
+    queue order, which preserves the order of the messages of each conversation.
+
+    A batch failing with a connection error is retried, with an exponential
+    backoff, up to `max_retries` times and then dropped. A batch rejected by the
+    database, e.g. for invalid content, is split in halves written separately,
+    so that only the rejected messages are logged and dropped. Messages queued
+    beyond `max_queued` are dropped, so an unavailable database does not grow
+    the queue without bound.
+    """
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        retry_delay: float = 1.0,
+        max_retries: int = 5,
+        max_queued: int = 100_000,
+        drain_timeout: float = 10.0,
+    ) -> None:
+        """
+        Initializes the MessageWriter object.
+
+        Args:
+            pool: Connection pool to the database.
+            batch_size: Maximum number of messages written in one batch.
+            flush_interval: Maximum time, in seconds, a message waits before its
+                batch is written.
+            retry_delay: Time, in seconds, to wait before the first retry of a
+                failed batch, doubled at every retry.
+            max_retries: Maximum number of retries of a failed batch.
+            max_queued: Maximum number of messages waiting to be written.
+            drain_timeout: Maximum time, in seconds, to wait for queued messages
+                to be written when closing.
+        """
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.drain_timeout = drain_timeout
+        self._queue: asyncio.Queue[MessageRow] = asyncio.Queue(
+            maxsize=max_queued
+        )
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        """Starts the background writer task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Writes every queued message and stops the background writer task."""
+        if self._task is None:
+            return
+        logger.info("Draining {n} queued messages", n=self._queue.qsize())
+        try:
+            await asyncio.wait_for(
+                self._queue.join(), timeout=self.drain_timeout
+            )
+        except TimeoutError:
+            logger.error(
+                "Dropping {n} messages that could not be stored",
+                n=self._queue.qsize(),
+            )
+            MESSAGES_DROPPED.labels("shutdown").inc(self._queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def enqueue(
+        self, conversation_id: UUID4, sender: str, content: str, tokens: int
+    ) -> None:
+        """
+        Queues a message to be stored in the database. The message is dropped
+        if the queue is full.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+            sender: Sender of the message. (e.g., "user" or "agent")
+            content: Content of the message.
+            tokens: Estimated number of tokens of the message.
+        """
+        try:
+            self._queue.put_nowait((conversation_id, sender, content, tokens))
+        except asyncio.QueueFull:
+            logger.error(
+                "Message queue full, dropping a message of {c}",
+                c=conversation_id,
+            )
+            MESSAGES_DROPPED.labels("queue_full").inc()
+
+    async def _next_batch(self) -> list[MessageRow]:
+        """
+        Waits for a message, then collects more until the batch is full or the
+        flush interval has passed.
+
+        Returns:
+            Batch of messages, in queue order.
+        """
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                )
+            except TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        """Writes batches until cancelled."""
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list[MessageRow]) -> None:
+        """
+        Writes a batch, retrying it after connection errors and splitting it
+        when the database rejects it. Messages that cannot be written are
+        logged and dropped.
+
+        Args:
+            batch: Batch of messages, in queue order.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.pool.connection() as conn:
+                    await store_messages(conn=conn, messages=batch)
+                return
+            except psycopg.OperationalError as e:
+                # Connection errors and pool timeouts are worth retrying
+                logger.error(
+                    "Failed to store {n} messages: {e}", n=len(batch), e=e
+                )
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_delay * 2**attempt)
+            except psycopg.Error as e:
+                if len(batch) > 1:
+                    # Write the halves separately, to isolate the bad messages
+                    middle = len(batch) // 2
+                    await self._write(batch[:middle])
+                    await self._write(batch[middle:])
+                    return
+                conversation_id, sender, content, _ = batch[0]
+                logger.error(
+                    "Dropping a message of {c} rejected by the database: {e} "
+                    "({s}: {m!r})",
+                    c=conversation_id,
+                    e=e,
+                    s=sender,
+                    m=content[:200],
+                )
+                MESSAGES_DROPPED.labels("rejected").inc()
+                return
+        logger.error(
+            "Dropping {n} messages after {r} retries",
+            n=len(batch),
+            r=self.max_retries,
+        )
+        MESSAGES_DROPPED.labels("retries").inc(len(batch))
@@ -0,0 +1,280 @@
+import wave
+from io import BytesIO
+
+import numpy as np
+import numpy.typing as npt
+
+# Magic bytes of the containers accepted by the speech-to-text providers
+AUDIO_SIGNATURES = (
+    (b"RIFF", "wav"),
+    (b"\x1a\x45\xdf\xa3", "webm"),
+    (b"OggS", "ogg"),
+    (b"fLaC", "flac"),
+    (b"ID3", "mp3"),
+    (b"\xff\xfb", "mp3"),
+    (b"\xff\xf3", "mp3"),
+)
+
+
+def encode_wav(samples: npt.NDArray[np.int16], sample_rate: int) -> bytes:
+    """
+    Encode 16-bit mono PCM samples as a WAV file.
+
+    Args:
+        samples: Samples to encode.
+        sample_rate: Sample rate of the samples.
+
+    Returns:
+        WAV file contents.
+    """
+    with BytesIO() as buffer:
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(samples.astype("<i2").tobytes())
+        return buffer.getvalue()
+
+
+def detect_audio_format(audio_data: bytes) -> str:
+    """
+    Detect the container format of an audio file from its first bytes.
+
+    Args:
+        audio_data: Audio file contents.
+
+    Returns:
+        File extension of the format, "wav" if it is not recognized.
+    """
+    if audio_data[4:8] == b"ftyp":
+        return "m4a"
+    for signature, extension in AUDIO_SIGNATURES:
+        if audio_data.startswith(signature):
+            return extension
+    return "wav"
+
+
+def decode_wav(audio_data: bytes) -> tuple[npt.NDArray[np.float32], int]:
+    """
+    Decode a PCM WAV file, downmixing it to mono.
+
+    Args:
+        audio_data: WAV file contents.
+
+    Returns:
+        Samples in the range [-1, 1] and their sample rate.
+
+    Raises:
+        wave.Error: If the file is not a PCM WAV file.
+    """
+    with wave.open(BytesIO(audio_data), "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+
+    if width == 1:
+        unsigned = np.frombuffer(frames, dtype=np.uint8).astype(np.float32)
+        samples = (unsigned - 128.0) / 128.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        packed = (
+            raw[:, 0].astype(np.int32)
+            | raw[:, 1].astype(np.int32) << 8
+            | raw[:, 2].astype(np.int8).astype(np.int32) << 16
+        )
+        samples = packed.astype(np.float32) / 2.0**23
+    elif width in (2, 4):
+        pcm = np.frombuffer(frames, dtype=f"<i{width}")
+        samples = pcm.astype(np.float32) / 2.0 ** (8 * width - 1)
+    else:
+        raise wave.Error(f"unsupported sample width: {width}")
+
+    samples = samples[: len(samples) - len(samples) % channels]
+    return samples.reshape(-1, channels).mean(axis=1), sample_rate
+
+
+def resample(
+    samples: npt.NDArray[np.float32], source_rate: int, target_rate: int
+) -> npt.NDArray[np.float32]:
+    """
+    Resample audio by linear interpolation. Downsampling first averages blocks
+    of samples, which acts as a simple anti-aliasing filter.
+
+    Args:
+        samples: Samples to resample.
+        source_rate: Sample rate of the samples.
+        target_rate: Sample rate of the result.
+
+    Returns:
+        Resampled samples.
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    if (factor := source_rate // target_rate) > 1:
+        usable = len(samples) - len(samples) % factor
+        samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+        source_rate //= factor
+    duration = len(samples) / source_rate
+    positions = np.arange(int(duration * target_rate)) * (
+        source_rate / target_rate
+    )
+    return np.interp(positions, np.arange(len(samples)), samples).astype(
+        np.float32
+    )
+
+
+def trim_silence(
+    samples: npt.NDArray[np.float32],
+    sample_rate: int,
+    threshold_db: float = -45.0,
+    frame_ms: int = 20,
+    padding_ms: int = 200,
+) -> npt.NDArray[np.float32]:
+    """
+    Trim the leading and trailing silence of audio. Frames whose energy is above
+    the threshold are voiced, and `padding_ms` of audio is kept around the first
+    and last voiced frames.
+
+    Args:
+        samples: Samples in the range [-1, 1].
+        sample_rate: Sample rate of the samples.
+        threshold_db: Frame energy, in dBFS, above which a frame is voiced.
+        frame_ms: Duration of the analysis frames.
+        padding_ms: Duration of silence kept around the speech.
+
+    Returns:
+        Trimmed samples, empty if no frame is voiced.
+    """
+    frame_size = max(1, sample_rate * frame_ms // 1000)
+    usable = len(samples) - len(samples) % frame_size
+    if not usable:
+        return samples
+    frames = samples[:usable].reshape(-1, frame_size)
+    power = np.mean(np.square(frames, dtype=np.float64), axis=1)
+    voiced = np.flatnonzero(10 * np.log10(power + 1e-12) > threshold_db)
+    if len(voiced) == 0:
+        return samples[:0]
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, voiced[0] * frame_size - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_size + padding)
+    return samples[start:end]
+
+
+def split_at_silences(
+    samples: npt.NDArray[np.float32],
+    sample_rate: int,
+    segment_s: float,
+    overlap_ms: int = 500,
+    frame_ms: int = 20,
+) -> list[tuple[int, int]]:
+    """
+    Split audio into segments of about `segment_s` seconds, cut at silences.
+    Each cut is placed at the quietest frame within a third of `segment_s` of
+    the target length, the nearest to it among equally quiet frames, and every
+    segment but the first starts `overlap_ms` before the cut, so a word cut in
+    a short pause is still heard whole.
+
+    Args:
+        samples: Samples in the range [-1, 1].
+        sample_rate: Sample rate of the samples.
+        segment_s: Target duration of a segment.
+        overlap_ms: Duration of audio shared by consecutive segments.
+        frame_ms: Duration of the analysis frames.
+
+    Returns:
+        (start, end) sample indices of the segments, in order.
+    """
+    frame_size = max(1, sample_rate * frame_ms // 1000)
+    target = max(frame_size, int(segment_s * sample_rate))
+    search = target // 3
+    overlap = sample_rate * overlap_ms // 1000
+    usable = len(samples) - len(samples) % frame_size
+    power = np.mean(
+        np.square(samples[:usable].reshape(-1, frame_size), dtype=np.float64),
+        axis=1,
+    )
+    segments: list[tuple[int, int]] = []
+    start = 0
+    while len(samples) - start > target + search:
+        first = (start + target - search) // frame_size
+        last = (start + target + search) // frame_size
+        # Frames nearest to the target come first, to break ties between
+        # equally quiet frames
+        frames = np.arange(first, last)
+        frames = frames[
+            np.argsort(np.abs(frames - (start + target) // frame_size))
+        ]
+        quietest = int(frames[np.argmin(power[frames])])
+        cut = quietest * frame_size + frame_size // 2
+        segments.append((max(0, start - overlap) if segments else 0, cut))
+        start = cut
+    segments.append((max(0, start - overlap) if segments else 0, len(samples)))
+    return segments
+
+
+def compact_audio(
+    audio_data: bytes,
+    sample_rate: int = 16_000,
+    threshold_db: float = -45.0,
+    padding_ms: int = 200,
+    split_min_s: float | None = None,
+    segment_s: float = 10.0,
+    overlap_ms: int = 500,
+) -> tuple[list[bytes], str]:
+    """
+    Reduce the size of an audio file before transcription. WAV files are
+    downmixed to mono, resampled, trimmed of leading and trailing silence and
+    re-encoded as 16-bit PCM. Other formats are already compressed and are
+    returned unchanged.
+
+    WAV files longer than `split_min_s` are also split at silences into
+    overlapping segments (see `split_at_silences`), to be transcribed
+    concurrently.
+
+    This function is CPU-bound and meant to run in a worker process.
+
+    Args:
+        audio_data: Audio file contents.
+        sample_rate: Sample rate of the result.
+        threshold_db: Frame energy, in dBFS, above which a frame is voiced.
+        padding_ms: Duration of silence kept around the speech.
+        split_min_s: Minimum duration of the audio to split it. It is never
+            split if None.
+        segment_s: Target duration of a segment.
+        overlap_ms: Duration of audio shared by consecutive segments.
+
+    Returns:
+        Audio file contents, as one file or as segments, empty if the audio is
+        silent, and the extension of their format.
+    """
+    extension = detect_audio_format(audio_data)
+    if extension != "wav":
+        return [audio_data], extension
+    try:
+        samples, source_rate = decode_wav(audio_data)
+    except (wave.Error, EOFError, ValueError):
+        return [audio_data], extension
+    samples = resample(
+        samples, source_rate=source_rate, target_rate=sample_rate
+    )
+    samples = trim_silence(
+        samples,
+        sample_rate=sample_rate,
+        threshold_db=threshold_db,
+        padding_ms=padding_ms,
+    )
+    if len(samples) == 0:
+        return [], extension
+    pcm = np.clip(np.round(samples * 32767.0), -32768, 32767).astype(np.int16)
+    if split_min_s is None or len(pcm) < split_min_s * sample_rate:
+        return [encode_wav(samples=pcm, sample_rate=sample_rate)], extension
+    return [
+        encode_wav(samples=pcm[start:end], sample_rate=sample_rate)
+        for start, end in split_at_silences(
+            samples,
+            sample_rate=sample_rate,
+            segment_s=segment_s,
+            overlap_ms=overlap_ms,
+        )
+    ], extension
@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from loguru import logger
+
+from app.telemetry.metrics import TTS_CACHE_REQUESTS
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio with two tiers.
+
+    - Memory: LRU of audio bytes bounded by `max_memory_bytes`.
+    - Disk (optional): one file per entry under `directory`, bounded by
+      `max_disk_bytes`. It survives restarts, and entries written by other
+      workers using the same directory are found on a miss. The index and the
+      bound are per process though, so N workers may store up to N times
+      `max_disk_bytes`.
+
+    Entries found on disk are promoted to the memory tier.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        directory: Path | None = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        """
+        Initializes the AudioCache object.
+
+        Args:
+            max_memory_bytes: Maximum size of the memory tier.
+            directory: Directory of the disk tier. The disk tier is disabled if None.
+            max_disk_bytes: Maximum size of the disk tier.
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._writing: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            self._load_disk_index(directory)
+
+    @staticmethod
+    def key(
+        model: str,
+        voice: str,
+        response_format: str,
+        speed: float,
+        text: str,
+    ) -> str:
+        """
+        Builds the key of a synthesis request. The text is normalized so that
+        differences in whitespace do not produce different entries.
+
+        Args:
+            model: Text-to-speech model.
+            voice: Voice used for speech synthesis.
+            response_format: Format of the audio.
+            speed: Speed multiplier of speech synthesis.
+            text: Synthesized text.
+
+        Returns:
+            Hexadecimal digest identifying the audio.
+        """
+        normalized = " ".join(text.split())
+        payload = (
+            f"{model}\0{voice}\0{response_format}\0{speed:.2f}\0{normalized}"
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> bytes | None:
+        """
+        Looks up the audio of a key, in memory first and then on disk.
+
+        Args:
+            key: Key of the audio.
+
+        Returns:
+            The audio, or None on a miss.
+        """
+        if (audio := self._memory.get(key)) is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            TTS_CACHE_REQUESTS.labels("memory_hit").inc()
+            return audio
+        if self.directory is not None:
+            # Files missing from the index may have been written by another worker
+            audio = await asyncio.to_thread(self._read_file, key)
+            if audio is not None:
+                self._index_file(key, len(audio))
+                self._put_memory(key, audio)
+                await self._evict_files()
+                self.hits += 1
+                TTS_CACHE_REQUESTS.labels("disk_hit").inc()
+                return audio
+            self._forget_file(key)
+        self.misses += 1
+        TTS_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    async def put(self, key: str, audio: bytes) -> None:
+        """
+        Stores the audio of a key in both tiers.
+
+        Args:
+            key: Key of the audio.
+            audio: Audio bytes.
+        """
+        self._put_memory(key, audio)
+        if self.directory is None or key in self._disk or key in self._writing:
+            return
+        if len(audio) > self.max_disk_bytes:
+            return
+        self._writing.add(key)
+        try:
+            await asyncio.to_thread(self._write_file, key, audio)
+        except OSError as e:
+            logger.warning("Failed to write cached audio: {e}", e=e)
+            return
+        finally:
+            self._writing.discard(key)
+        self._index_file(key, len(audio))
+        await self._evict_files()
+
+    def _index_file(self, key: str, size: int) -> None:
+        """
+        Adds a key to the index of the disk tier, or marks it as most recently
+        used if it is already indexed, as after a concurrent lookup.
+
+        Args:
+            key: Key of the audio.
+            size: Size of the file.
+        """
+        if key in self._disk:
+            self._disk.move_to_end(key)
+            return
+        self._disk[key] = size
+        self._disk_bytes += size
+
+    async def _evict_files(self) -> None:
+        """
+        Removes the least recently used files of the disk tier that no longer fit.
+        """
+        while self._disk_bytes > self.max_disk_bytes:
+            oldest = next(iter(self._disk))
+            await asyncio.to_thread(self._remove_file, oldest)
+            self._forget_file(oldest)
+
+    def _put_memory(self, key: str, audio: bytes) -> None:
+        """
+        Stores the audio of a key in the memory tier, evicting the least recently
+        used entries that no longer fit.
+
+        Args:
+            key: Key of the audio.
+            audio: Audio bytes.
+        """
+        if len(audio) > self.max_memory_bytes or key in self._memory:
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path(self, key: str) -> Path:
+        """
+        Path of the file of a key in the disk tier.
+
+        Args:
+            key: Key of the audio.
+
+        Returns:
+            Path of the file.
+        """
+        assert self.directory is not None
+        return self.directory / key[:2] / f"{key}.audio"
+
+    def _load_disk_index(self, directory: Path) -> None:
+        """
+        Indexes the files of the disk tier, least recently modified first.
+
+        Args:
+            directory: Directory of the disk tier.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (path.stat().st_mtime, path.stem, path.stat().st_size)
+            for path in directory.glob("*/*.audio")
+        )
+        for _, key, size in files:
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.info(
+            "Indexed {n} cached audio files ({b} bytes)",
+            n=len(self._disk),
+            b=self._disk_bytes,
+        )
+
+    def _read_file(self, key: str) -> bytes | None:
+        """
+        Reads the file of a key.
+
+        Args:
+            key: Key of the audio.
+
+        Returns:
+            The audio, or None if the file is missing or empty.
+        """
+        try:
+            audio = self._path(key).read_bytes()
+        except OSError:
+            return None
+        return audio or None
+
+    def _write_file(self, key: str, audio: bytes) -> None:
+        """
+        Writes the file of a key atomically.
+
+        Args:
+            key: Key of the audio.
+            audio: Audio bytes.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(audio)
+        os.replace(tmp_path, path)
+
+    def _remove_file(self, key: str) -> None:
+        """
+        Removes the file of a key.
+
+        Args:
+            key: Key of the audio.
+        """
+        self._path(key).unlink(missing_ok=True)
+
+    def _forget_file(self, key: str) -> None:
+        """
+        Removes a key from the index of the disk tier.
+
+        Args:
+            key: Key of the audio.
+        """
+        self._disk_bytes -= self._disk.pop(key, 0)
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import random
+import struct
+from collections.abc import AsyncIterator
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCalls, FunctionModel
+
+from app.config.providers import ProviderConfig
+from app.engine.text_to_speech import ResponseFormat, Voice
+
+FAKE_TRANSCRIPTS = (
+    "Hello, how are you today?",
+    "What is the weather like in London?",
+    "Can you tell me something interesting about Madrid?",
+    "Thank you, that is all I needed.",
+)
+
+FAKE_RESPONSES = (
+    "I am doing great, thank you for asking. How can I help you today?",
+    "Right now it is mild and partly cloudy. You might want a light jacket.",
+    (
+        "Madrid is the capital of Spain. It has one of the largest city parks "
+        "in Europe, and its royal palace has more than three thousand rooms."
+    ),
+    "You are welcome. Have a wonderful day!",
+)
+
+
+def _rng(seed: int, data: bytes) -> random.Random:
+    """
+    Creates a random generator that depends only on the seed and the request.
+
+    Args:
+        seed: Seed of the fake providers.
+        data: Content of the request.
+
+    Returns:
+        Random generator.
+    """
+    digest = hashlib.sha256(seed.to_bytes(8, "little", signed=True) + data)
+    return random.Random(digest.digest())
+
+
+def _latency(rng: random.Random, median_ms: float, jitter: float) -> float:
+    """
+    Samples a log-normal latency.
+
+    Args:
+        rng: Random generator.
+        median_ms: Median of the distribution, in milliseconds.
+        jitter: Shape of the distribution (standard deviation of its logarithm).
+
+    Returns:
+        Latency, in seconds.
+    """
+    return median_ms * rng.lognormvariate(0.0, jitter) / 1000
+
+
+def _ogg_page(packets: list[bytes], sequence: int, first: bool) -> bytes:
+    """
+    Builds an Ogg page holding whole packets, with no checksum.
+
+    Args:
+        packets: Packets of the page, each shorter than 255 bytes.
+        sequence: Sequence number of the page.
+        first: Whether it is the first page of the stream.
+
+    Returns:
+        The page.
+    """
+    header = struct.pack(
+        "<4sBBqIIIB",
+        b"OggS",
+        0,
+        0x02 if first else 0x00,
+        0,
+        1,
+        sequence,
+        0,
+        len(packets),
+    )
+    return header + bytes(len(packet) for packet in packets) + b"".join(packets)
+
+
+def fake_opus(size: int) -> bytes:
+    """
+    Builds an Ogg Opus stream of silent packets, of roughly the given size.
+
+    Args:
+        size: Size of the audio, in bytes.
+
+    Returns:
+        The Ogg stream.
+    """
+    pages = [
+        _ogg_page([b"OpusHead" + bytes(11)], sequence=0, first=True),
+        _ogg_page([b"OpusTags" + bytes(8)], sequence=1, first=False),
+    ]
+    # Pages of fifty 20 ms packets, as one second of audio
+    packets = [bytes(80)] * max(1, size // 80)
+    for start in range(0, len(packets), 50):
+        pages.append(
+            _ogg_page(
+                packets[start : start + 50],
+                sequence=len(pages),
+                first=False,
+            )
+        )
+    return b"".join(pages)
+
+
+class FakeTranscriber:
+    """
+    In-process speech-to-text provider. It returns one of a few canned transcripts,
+    chosen from the audio, after an emulated latency.
+    """
+
+    def __init__(self, config: ProviderConfig) -> None:
+        """
+        Initializes the FakeTranscriber object.
+
+        Args:
+            config: Upstream provider configuration.
+        """
+        self.config = config
+
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Emulates the transcription of audio to text.
+
+        Args:
+            audio_data: Audio data to transcribe
+
+        Returns:
+            Transcribed text
+        """
+        rng = _rng(self.config.fake_seed, audio_data)
+        latency = _latency(
+            rng, self.config.fake_stt_latency_ms, self.config.fake_stt_jitter
+        )
+        latency += (
+            self.config.fake_stt_ms_per_kb * len(audio_data) / 1024 / 1000
+        )
+        await asyncio.sleep(latency)
+        return rng.choice(FAKE_TRANSCRIPTS)
+
+
+class FakeSynthesizer:
+    """
+    In-process text-to-speech provider. It streams silent audio, sized after the
+    text, at an emulated byte rate after an emulated time to first byte. Opus
+    audio is an Ogg stream of silent packets.
+    """
+
+    def __init__(self, config: ProviderConfig) -> None:
+        """
+        Initializes the FakeSynthesizer object.
+
+        Args:
+            config: Upstream provider configuration.
+        """
+        self.config = config
+
+    async def synthesize(
+        self,
+        text: str,
+        model_name: str,
+        voice: Voice,
+        response_format: ResponseFormat,
+        speed: float,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Emulates the conversion of text to speech.
+
+        Args:
+            text: The text to convert to speech.
+            model_name: The name of the model to use for text-to-speech conversion.
+            voice: The voice to use for speech synthesis.
+            response_format: The format of the audio response.
+            speed: The speed multiplier for speech synthesis.
+            chunk_size: The size in bytes of audio chunks to yield.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        rng = _rng(self.config.fake_seed, text.encode())
+        await asyncio.sleep(
+            _latency(
+                rng, self.config.fake_tts_ttfb_ms, self.config.fake_tts_jitter
+            )
+        )
+        size = int(len(text) * self.config.fake_tts_bytes_per_char / speed)
+        audio = fake_opus(size) if response_format == "opus" else bytes(size)
+        for start in range(0, len(audio), chunk_size):
+            chunk = audio[start : start + chunk_size]
+            if start + chunk_size < len(audio):
+                await asyncio.sleep(
+                    len(chunk) / self.config.fake_tts_bytes_per_s
+                )
+            yield chunk
+
+
+def create_fake_model(config: ProviderConfig) -> FunctionModel:
+    """
+    Creates an in-process language model. It streams one of a few canned
+    responses, chosen from the last user prompt, word by word at an emulated token
+    rate after an emulated time to first token. It never calls tools.
+
+    Args:
+        config: Upstream provider configuration.
+
+    Returns:
+        Fake model for PydanticAI.
+    """
+
+    async def stream_function(
+        messages: list[ModelMessage], info: AgentInfo
+    ) -> AsyncIterator[str | DeltaToolCalls]:
+        prompt = ""
+        for message in messages:
+            if isinstance(message, ModelRequest):
+                for part in message.parts:
+                    if isinstance(part, UserPromptPart):
+                        prompt = part.content
+        rng = _rng(config.fake_seed, prompt.encode())
+        await asyncio.sleep(
+            _latency(rng, config.fake_llm_ttft_ms, config.fake_llm_jitter)
+        )
+        words = rng.choice(FAKE_RESPONSES).split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / config.fake_llm_tokens_per_s)
+            yield word if i == 0 else f" {word}"
+
+    return FunctionModel(stream_function=stream_function)
@@ -0,0 +1,257 @@
+import struct
+from typing import Any, Literal, Protocol
+
+type OutputFormat = Literal["pcm", "opus", "aac"]
+
+# Raw PCM of the text-to-speech API: 24 kHz, 16-bit little-endian, mono
+PCM_SAMPLE_RATE = 24_000
+PCM_SAMPLE_BYTES = 2
+# PCM chunks are whole frames of 10 ms
+PCM_FRAME_BYTES = PCM_SAMPLE_RATE // 100 * PCM_SAMPLE_BYTES
+# Opus always decodes at 48 kHz
+OPUS_SAMPLE_RATE = 48_000
+
+OGG_CAPTURE = b"OggS"
+OGG_HEADER_BYTES = 27
+# Length prefixing each Opus packet of a chunk
+OPUS_LENGTH = struct.Struct("<H")
+
+
+class AudioFramer(Protocol):
+    """
+    Splits a stream of audio bytes, cut anywhere, into chunks that can be
+    played on their own.
+    """
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """
+        Adds audio bytes to the stream.
+
+        Args:
+            data: Audio bytes.
+
+        Returns:
+            The chunks completed by the bytes, possibly none.
+        """
+        ...
+
+    def flush(self) -> bytes:
+        """
+        Ends the stream.
+
+        Returns:
+            The last, shorter, chunk. Empty if there is none.
+        """
+        ...
+
+
+class PCMFramer:
+    """
+    Splits raw PCM into chunks of whole 10 ms frames, so that every chunk can
+    be scheduled for playback as soon as it arrives.
+    """
+
+    def __init__(self, chunk_size: int) -> None:
+        """
+        Initializes the PCMFramer object.
+
+        Args:
+            chunk_size: Target size, in bytes, of a chunk. Rounded down to whole
+                frames, and to at least one frame.
+        """
+        self.chunk_size = align_chunk_size(
+            response_format="pcm", chunk_size=chunk_size
+        )
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """
+        Adds PCM bytes to the stream.
+
+        Args:
+            data: PCM bytes.
+
+        Returns:
+            The chunks completed by the bytes, possibly none.
+        """
+        self._buffer += data
+        end = len(self._buffer) - len(self._buffer) % self.chunk_size
+        chunks = [
+            bytes(self._buffer[start : start + self.chunk_size])
+            for start in range(0, end, self.chunk_size)
+        ]
+        del self._buffer[:end]
+        return chunks
+
+    def flush(self) -> bytes:
+        """
+        Ends the stream.
+
+        Returns:
+            The remaining whole samples. A trailing partial sample is dropped.
+        """
+        end = len(self._buffer) - len(self._buffer) % PCM_SAMPLE_BYTES
+        chunk = bytes(self._buffer[:end])
+        self._buffer.clear()
+        return chunk
+
+
+class OpusFramer:
+    """
+    Extracts the Opus packets of an Ogg stream and groups them into chunks of
+    whole packets, each prefixed with its length as an unsigned 16-bit
+    little-endian integer. Every packet holds a frame of up to 20 ms that a
+    decoder (e.g. WebCodecs' `AudioDecoder`) plays on its own, without waiting
+    for the Ogg pages, which can hold a second of audio.
+
+    The `OpusHead` and `OpusTags` header packets are dropped, so concatenated
+    Ogg streams yield a single stream of packets.
+    """
+
+    def __init__(self, chunk_size: int) -> None:
+        """
+        Initializes the OpusFramer object.
+
+        Args:
+            chunk_size: Target size, in bytes, of a chunk. A chunk holds whole
+                packets up to that size, and at least one packet.
+        """
+        self.chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._packet = bytearray()
+        self._chunk = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """
+        Adds bytes of the Ogg stream.
+
+        Args:
+            data: Bytes of the Ogg stream.
+
+        Returns:
+            The chunks completed by the bytes, possibly none.
+        """
+        self._buffer += data
+        chunks = []
+        for packet in self._read_packets():
+            if packet.startswith((b"OpusHead", b"OpusTags")):
+                continue
+            if self._chunk and (
+                len(self._chunk) + OPUS_LENGTH.size + len(packet)
+                > self.chunk_size
+            ):
+                chunks.append(bytes(self._chunk))
+                self._chunk.clear()
+            self._chunk += OPUS_LENGTH.pack(len(packet))
+            self._chunk += packet
+            if len(self._chunk) >= self.chunk_size:
+                chunks.append(bytes(self._chunk))
+                self._chunk.clear()
+        return chunks
+
+    def flush(self) -> bytes:
+        """
+        Ends the stream.
+
+        Returns:
+            The remaining whole packets. An incomplete page is dropped.
+        """
+        chunk = bytes(self._chunk)
+        self._buffer.clear()
+        self._packet.clear()
+        self._chunk.clear()
+        return chunk
+
+    def _read_packets(self) -> list[bytes]:
+        """
+        Consumes the complete Ogg pages of the buffer.
+
+        Returns:
+            The packets completed by the pages.
+        """
+        packets: list[bytes] = []
+        while True:
+            start = self._buffer.find(OGG_CAPTURE)
+            if start < 0:
+                # Keep a possible partial capture pattern
+                del self._buffer[: max(0, len(self._buffer) - 3)]
+                return packets
+            del self._buffer[:start]
+            if len(self._buffer) < OGG_HEADER_BYTES:
+                return packets
+            segments = self._buffer[OGG_HEADER_BYTES - 1]
+            body = OGG_HEADER_BYTES + segments
+            if len(self._buffer) < body:
+                return packets
+            lacing = self._buffer[OGG_HEADER_BYTES:body]
+            if len(self._buffer) < body + sum(lacing):
+                return packets
+            position = body
+            for size in lacing:
+                self._packet += self._buffer[position : position + size]
+                position += size
+                # A lacing value below 255 ends the packet
+                if size < 255:
+                    packets.append(bytes(self._packet))
+                    self._packet.clear()
+            del self._buffer[:position]
+
+
+def align_chunk_size(response_format: str, chunk_size: int) -> int:
+    """
+    Aligns a chunk size on the frames of an audio format.
+
+    Args:
+        response_format: Format of the audio.
+        chunk_size: Target size, in bytes, of a chunk.
+
+    Returns:
+        The chunk size, rounded down to whole frames, and to at least one frame,
+        for raw PCM. Unchanged for other formats.
+    """
+    if response_format != "pcm":
+        return chunk_size
+    return max(PCM_FRAME_BYTES, chunk_size - chunk_size % PCM_FRAME_BYTES)
+
+
+def create_framer(response_format: str, chunk_size: int) -> AudioFramer | None:
+    """
+    Creates the framer of an audio format.
+
+    Args:
+        response_format: Format of the audio.
+        chunk_size: Target size, in bytes, of a chunk.
+
+    Returns:
+        Framer of the format, or None if the audio is sent as received.
+    """
+    if response_format == "pcm":
+        return PCMFramer(chunk_size=chunk_size)
+    if response_format == "opus":
+        return OpusFramer(chunk_size=chunk_size)
+    return None
+
+
+def describe_output(response_format: str) -> dict[str, Any]:
+    """
+    Describes how to decode the audio of a format, for the client.
+
+    Args:
+        response_format: Format of the audio.
+
+    Returns:
+        Sample rate, channels and framing of the audio chunks.
+    """
+    if response_format == "pcm":
+        return {
+            "sample_rate": PCM_SAMPLE_RATE,
+            "channels": 1,
+            "framing": "s16le",
+        }
+    if response_format == "opus":
+        return {
+            "sample_rate": OPUS_SAMPLE_RATE,
+            "channels": 1,
+            "framing": "u16le-length-prefixed-packets",
+        }
+    return {"framing": "adts"}
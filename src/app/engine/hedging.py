@@ -0,0 +1,425 @@
+import asyncio
+import random
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+)
+from contextlib import aclosing
+from time import monotonic
+from typing import TypeVar, cast
+
+import groq
+import httpx
+import openai
+
+from app.engine.priority import Admission, upstream_admission
+from app.engine.speech_to_text import Transcriber
+from app.engine.text_to_speech import (
+    ResponseFormat,
+    Synthesizer,
+    Voice,
+    synthesis_origin,
+)
+from app.telemetry.metrics import UPSTREAM_HEDGES, UPSTREAM_RETRIES
+
+T = TypeVar("T")
+
+# HTTP statuses of transient upstream failures, worth retrying
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Tells whether an upstream error is transient, so that the call can be
+    retried: timeouts, connection errors and transient HTTP statuses.
+
+    Args:
+        error: Error raised by the call.
+
+    Returns:
+        Whether the call can be retried.
+    """
+    if isinstance(
+        error,
+        (
+            TimeoutError,
+            ConnectionError,
+            httpx.TransportError,
+            openai.APIConnectionError,
+            groq.APIConnectionError,
+        ),
+    ):
+        return True
+    return getattr(error, "status_code", None) in RETRY_STATUSES
+
+
+class _Done:
+    """End of the stream of an attempt."""
+
+
+_DONE = _Done()
+
+
+class _Admission:
+    """First attempt queued, or admitted after being queued."""
+
+
+_ADMISSION = _Admission()
+
+
+class HedgePolicy:
+    """
+    Deadlines, hedging and retries of the calls of one upstream stage.
+
+    A call streams its response. If its first item has not arrived within
+    `deadline_s` of its admission by the upstream limiters, not counting the
+    time it is queued, a hedged duplicate is started, possibly on a secondary model
+    or provider, and the response of whichever attempt yields first is used;
+    the other one is cancelled. Hedges are capped at `max_ratio` of the calls,
+    with bursts of up to `burst` hedges, so that a slow provider is not hit
+    with twice its load.
+
+    A call whose first item has not arrived within `timeout_s` of its
+    admission is abandoned, every attempt cancelled, and fails with a
+    `TimeoutError`. A call failing with a transient error, timeouts included,
+    before its first item is retried after a jittered exponential backoff, up
+    to `retries` times. Calls are
+    never retried or hedged once their response has started, so they only
+    need to be idempotent until then.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        deadline_s: float | None,
+        timeout_s: float | None = None,
+        max_ratio: float = 0.05,
+        burst: float = 5.0,
+        retries: int = 2,
+        backoff_base_s: float = 0.1,
+        backoff_max_s: float = 1.0,
+    ) -> None:
+        """
+        Initializes the HedgePolicy object.
+
+        Args:
+            stage: Name of the stage, used in metrics.
+            deadline_s: Time, in seconds, to the first item after which the
+                call is hedged. Calls are never hedged if None.
+            timeout_s: Time, in seconds, to the first item after which the
+                call is abandoned. Calls wait indefinitely if None.
+            max_ratio: Maximum fraction of the calls that are hedged.
+            burst: Maximum number of hedges in a burst.
+            retries: Maximum number of retries of a failed call.
+            backoff_base_s: Backoff, in seconds, of the first retry, doubled at
+                every retry.
+            backoff_max_s: Maximum backoff, in seconds.
+        """
+        self.stage = stage
+        self.deadline_s = deadline_s
+        self.timeout_s = timeout_s
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.retries = retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._credit = burst
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Computes the backoff before a retry, with full jitter.
+
+        Args:
+            attempt: Number of the retry, starting at 1.
+
+        Returns:
+            Time to wait, in seconds.
+        """
+        ceiling = min(
+            self.backoff_max_s, self.backoff_base_s * 2 ** (attempt - 1)
+        )
+        return random.uniform(0, ceiling)
+
+    async def call(self, start: Callable[[bool], Awaitable[T]]) -> T:
+        """
+        Makes a call with a single response, hedged and retried.
+
+        Args:
+            start: Starts an attempt of the call, given whether it is a hedge.
+
+        Returns:
+            The response of the winning attempt.
+        """
+
+        async def stream(hedge: bool) -> AsyncIterator[T]:
+            yield await start(hedge)
+
+        async with aclosing(self.stream(stream)) as responses:
+            async for response in responses:
+                return response
+        raise AssertionError("The call ended without a response")
+
+    async def stream(
+        self, start: Callable[[bool], AsyncIterator[T]]
+    ) -> AsyncGenerator[T, None]:
+        """
+        Makes a streamed call, hedged and retried.
+
+        Args:
+            start: Starts an attempt of the call, given whether it is a hedge.
+
+        Yields:
+            The items of the winning attempt.
+        """
+        # Every call earns a fraction of a hedge
+        self._credit = min(self.burst, self._credit + self.max_ratio)
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async for item in self._race(start):
+                    started = True
+                    yield item
+                return
+            except Exception as e:
+                if started or attempt >= self.retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                UPSTREAM_RETRIES.labels(self.stage).inc()
+                await asyncio.sleep(self.backoff(attempt))
+
+    def _take_hedge(self) -> bool:
+        """
+        Takes a hedge from the budget.
+
+        Returns:
+            Whether a hedge can be started.
+        """
+        if self._credit < 1:
+            UPSTREAM_HEDGES.labels(self.stage, "capped").inc()
+            return False
+        self._credit -= 1
+        UPSTREAM_HEDGES.labels(self.stage, "started").inc()
+        return True
+
+    async def _race(
+        self, start: Callable[[bool], AsyncIterator[T]]
+    ) -> AsyncGenerator[T, None]:
+        """
+        Runs an attempt of the call, hedged past the deadline, and yields the
+        items of the first attempt to yield one. The deadline and the timeout
+        are extended by the time the attempt spends queued by the upstream
+        limiters.
+
+        Args:
+            start: Starts an attempt of the call, given whether it is a hedge.
+
+        Yields:
+            The items of the winning attempt.
+
+        Raises:
+            TimeoutError: If no attempt yields an item within the timeout.
+        """
+        items: asyncio.Queue[tuple[int, object]] = asyncio.Queue()
+        # Wakes the race up when the first attempt enters or leaves the queue
+        admission = Admission(
+            on_change=lambda: items.put_nowait((0, _ADMISSION))
+        )
+
+        async def pump(index: int) -> None:
+            upstream_admission.set(admission if index == 0 else None)
+            try:
+                async for item in start(index > 0):
+                    items.put_nowait((index, item))
+                items.put_nowait((index, _DONE))
+            except Exception as e:  # noqa: BLE001 - re-raised by the race
+                items.put_nowait((index, e))
+
+        attempts = [asyncio.create_task(pump(0))]
+        failed: set[int] = set()
+        started_at = monotonic()
+        deadline_s = self.deadline_s
+        try:
+            while True:
+                limits = [t for t in (deadline_s, self.timeout_s) if t]
+                timeout = None
+                if limits and not admission.queued:
+                    timeout = max(
+                        0.0,
+                        started_at
+                        + admission.waited
+                        + min(limits)
+                        - monotonic(),
+                    )
+                try:
+                    async with asyncio.timeout(timeout):
+                        index, item = await items.get()
+                except TimeoutError:
+                    if admission.queued:
+                        continue
+                    elapsed = monotonic() - started_at - admission.waited
+                    if self.timeout_s and elapsed >= self.timeout_s:
+                        raise TimeoutError(
+                            f"No response from the {self.stage} provider "
+                            f"within {self.timeout_s}s"
+                        ) from None
+                    deadline_s = None
+                    if self._take_hedge():
+                        attempts.append(asyncio.create_task(pump(1)))
+                    continue
+                if item is _ADMISSION:
+                    continue
+                # A failed attempt loses if the other one is still running
+                if isinstance(item, Exception):
+                    failed.add(index)
+                    if len(failed) < len(attempts):
+                        continue
+                break
+            winner = index
+            for i, task in enumerate(attempts):
+                if i != winner:
+                    task.cancel()
+            if len(attempts) > 1:
+                UPSTREAM_HEDGES.labels(
+                    self.stage, "won" if winner > 0 else "lost"
+                ).inc()
+            while True:
+                if isinstance(item, Exception):
+                    raise item
+                if item is _DONE:
+                    return
+                yield cast(T, item)
+                while True:
+                    index, item = await items.get()
+                    if index == winner and item is not _ADMISSION:
+                        break
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+
+class HedgedTranscriber:
+    """
+    Speech-to-text provider whose calls are hedged and retried. Hedges go to
+    the secondary provider, if any.
+    """
+
+    def __init__(
+        self,
+        transcriber: Transcriber,
+        policy: HedgePolicy,
+        secondary: Transcriber | None = None,
+    ) -> None:
+        """
+        Initializes the HedgedTranscriber object.
+
+        Args:
+            transcriber: Speech-to-text provider.
+            policy: Deadline, hedging and retries of the calls.
+            secondary: Speech-to-text provider of the hedges. Hedges go to
+                `transcriber` if None.
+        """
+        self.transcriber = transcriber
+        self.policy = policy
+        self.secondary = secondary
+
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Transcribe audio to text, hedged past the deadline.
+
+        Args:
+            audio_data: Audio data to transcribe
+
+        Returns:
+            Transcribed text
+        """
+
+        def start(hedge: bool) -> Awaitable[str]:
+            transcriber = (
+                self.secondary
+                if hedge and self.secondary is not None
+                else self.transcriber
+            )
+            return transcriber.transcribe(audio_data)
+
+        return await self.policy.call(start)
+
+
+class HedgedSynthesizer:
+    """
+    Text-to-speech provider whose calls are hedged on their first byte and
+    retried. Hedges use the secondary model, if any, and the model of the
+    winning attempt is reported to the `synthesis_origin` of the call.
+    """
+
+    def __init__(
+        self,
+        synthesizer: Synthesizer,
+        policy: HedgePolicy,
+        secondary_model: str | None = None,
+    ) -> None:
+        """
+        Initializes the HedgedSynthesizer object.
+
+        Args:
+            synthesizer: Text-to-speech provider.
+            policy: Deadline, hedging and retries of the calls.
+            secondary_model: Model of the hedges. Hedges use the requested
+                model if None.
+        """
+        self.synthesizer = synthesizer
+        self.policy = policy
+        self.secondary_model = secondary_model
+
+    async def synthesize(
+        self,
+        text: str,
+        model_name: str,
+        voice: Voice,
+        response_format: ResponseFormat,
+        speed: float,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Converts text to speech, hedged if the first byte is late.
+
+        Args:
+            text: The text to convert to speech.
+            model_name: The name of the model to use for text-to-speech conversion.
+            voice: The voice to use for speech synthesis.
+            response_format: The format of the audio response.
+            speed: The speed multiplier for speech synthesis.
+            chunk_size: The size in bytes of audio chunks to yield.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+
+        origin = synthesis_origin.get()
+
+        async def attempt(model: str) -> AsyncIterator[bytes]:
+            async for chunk in self.synthesizer.synthesize(
+                text=text,
+                model_name=model,
+                voice=voice,
+                response_format=response_format,
+                speed=speed,
+                chunk_size=chunk_size,
+            ):
+                # The first attempt to yield is the one the race keeps
+                if origin is not None and origin.model is None:
+                    origin.model = model
+                yield chunk
+
+        def start(hedge: bool) -> AsyncIterator[bytes]:
+            return attempt(
+                self.secondary_model
+                if hedge and self.secondary_model
+                else model_name
+            )
+
+        async for chunk in self.policy.stream(start):
+            yield chunk
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from time import perf_counter
+
+from app.engine.audio import compact_audio
+from app.telemetry.metrics import STT_UPLOAD_BYTES
+from app.telemetry.tracing import record_stage
+
+
+class AudioPreprocessor:
+    """
+    Reduces the size of audio before it is uploaded for transcription.
+
+    The work is CPU-bound, so it runs in `executor` (a process pool in
+    production) and never blocks the event loop. The duration is recorded as the
+    `stt_preprocess` stage of the turn. Long audio is also split into
+    overlapping segments, cut at silences.
+    """
+
+    def __init__(
+        self,
+        executor: Executor | None = None,
+        sample_rate: int = 16_000,
+        threshold_db: float = -45.0,
+        padding_ms: int = 200,
+        split_min_s: float | None = None,
+        segment_s: float = 10.0,
+        overlap_ms: int = 500,
+    ) -> None:
+        """
+        Initializes the AudioPreprocessor object.
+
+        Args:
+            executor: Executor running the preprocessing. The default executor
+                of the event loop is used if None.
+            sample_rate: Sample rate of the uploaded audio.
+            threshold_db: Frame energy, in dBFS, above which a frame is voiced.
+            padding_ms: Duration of silence kept around the speech.
+            split_min_s: Minimum duration of the audio to split it. It is never
+                split if None.
+            segment_s: Target duration of a segment.
+            overlap_ms: Duration of audio shared by consecutive segments.
+        """
+        self.executor = executor
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+        self.padding_ms = padding_ms
+        self.split_min_s = split_min_s
+        self.segment_s = segment_s
+        self.overlap_ms = overlap_ms
+
+    async def process(self, audio_data: bytes) -> tuple[list[bytes], str]:
+        """
+        Compacts an audio file, splitting it if it is long.
+
+        Args:
+            audio_data: Audio file contents.
+
+        Returns:
+            Compacted audio file contents, as one file or as segments, empty if
+            the audio is silent, and the extension of their format.
+        """
+        start = perf_counter()
+        loop = asyncio.get_running_loop()
+        compacted, extension = await loop.run_in_executor(
+            self.executor,
+            partial(
+                compact_audio,
+                audio_data,
+                sample_rate=self.sample_rate,
+                threshold_db=self.threshold_db,
+                padding_ms=self.padding_ms,
+                split_min_s=self.split_min_s,
+                segment_s=self.segment_s,
+                overlap_ms=self.overlap_ms,
+            ),
+        )
+        record_stage(stage="stt_preprocess", duration=perf_counter() - start)
+        STT_UPLOAD_BYTES.labels("received").inc(len(audio_data))
+        STT_UPLOAD_BYTES.labels("uploaded").inc(sum(map(len, compacted)))
+        return compacted, extension
@@ -0,0 +1,62 @@
+from collections.abc import Callable
+from contextvars import ContextVar
+from enum import IntEnum
+from time import monotonic
+
+
+class Priority(IntEnum):
+    """Priority of an upstream call, lower values first."""
+
+    FIRST_AUDIO = 0
+    LIVE = 1
+    BACKGROUND = 2
+
+
+class Admission:
+    """
+    Time an upstream call spends queued by limiters, so that its deadlines
+    only count from its admission.
+    """
+
+    def __init__(self, on_change: Callable[[], None] | None = None) -> None:
+        """
+        Initializes the Admission object.
+
+        Args:
+            on_change: Called when the call is queued, and when it is admitted
+                after being queued.
+        """
+        self.on_change = on_change
+        self.waited = 0.0
+        self._queued_at: float | None = None
+
+    @property
+    def queued(self) -> bool:
+        """Whether the call is waiting to be admitted."""
+        return self._queued_at is not None
+
+    def queue(self) -> None:
+        """Marks the call as queued."""
+        self._queued_at = monotonic()
+        if self.on_change is not None:
+            self.on_change()
+
+    def admit(self) -> None:
+        """Marks the call as admitted, adding the time it was queued."""
+        if self._queued_at is None:
+            return
+        self.waited += monotonic() - self._queued_at
+        self._queued_at = None
+        if self.on_change is not None:
+            self.on_change()
+
+
+# Priority of the upstream calls made in the current context
+upstream_priority: ContextVar[Priority] = ContextVar(
+    "upstream_priority", default=Priority.LIVE
+)
+
+# Admission of the upstream call made in the current context, if tracked
+upstream_admission: ContextVar[Admission | None] = ContextVar(
+    "upstream_admission", default=None
+)
@@ -0,0 +1,484 @@
+import asyncio
+import heapq
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from time import monotonic, perf_counter
+
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import AgentModel, Model, StreamedResponse
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.tools import ToolDefinition
+from pydantic_ai.usage import Usage
+
+from app.engine.priority import upstream_admission, upstream_priority
+from app.engine.speech_to_text import Transcriber
+from app.engine.text_to_speech import ResponseFormat, Synthesizer, Voice
+from app.telemetry.metrics import (
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_QUEUE_DEPTH,
+    UPSTREAM_QUEUE_WAIT,
+)
+
+
+class RateBudget:
+    """
+    Budget of requests or tokens per minute, as a token bucket holding up to one
+    minute of budget and refilled continuously.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        """
+        Initializes the RateBudget object.
+
+        Args:
+            per_minute: Budget per minute.
+        """
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self._level = per_minute
+        self._updated = monotonic()
+
+    def delay(self, cost: float) -> float:
+        """
+        Computes the time until a cost fits in the budget.
+
+        Args:
+            cost: Cost of the call, capped at the capacity.
+
+        Returns:
+            Time to wait, in seconds, 0 if the cost fits now.
+        """
+        self._refill()
+        missing = min(cost, self.capacity) - self._level
+        return max(0.0, missing / self.rate)
+
+    def take(self, cost: float) -> None:
+        """
+        Takes a cost from the budget.
+
+        Args:
+            cost: Cost of the call, capped at the capacity.
+        """
+        self._refill()
+        self._level -= min(cost, self.capacity)
+
+    def _refill(self) -> None:
+        """Refills the budget for the time elapsed since the last refill."""
+        now = monotonic()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+class UpstreamLimiter:
+    """
+    Admission of the calls to an upstream provider.
+
+    At most `max_concurrency` calls run at a time, within optional budgets of
+    requests and tokens per minute. Calls that cannot start are queued and
+    started by priority (see `upstream_priority`), then in arrival order. The
+    time a call spends queued is reported to its `upstream_admission`, if any,
+    so that its deadlines start once it is admitted. The queue depth, the calls in flight and the time spent queued are exported as
+    metrics, labeled with the provider.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_concurrency: int,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_queue: int = 64,
+    ) -> None:
+        """
+        Initializes the UpstreamLimiter object.
+
+        Args:
+            provider: Name of the provider, used as metric label.
+            max_concurrency: Maximum number of calls in flight.
+            requests_per_minute: Budget of requests per minute, unbounded if
+                None.
+            tokens_per_minute: Budget of tokens per minute, unbounded if None.
+            max_queue: Number of queued calls at which the limiter is
+                saturated.
+        """
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.requests = (
+            RateBudget(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = (
+            RateBudget(tokens_per_minute) if tokens_per_minute else None
+        )
+        self.in_flight = 0
+        self.waiting = 0
+        self._queue: list[tuple[int, int, float, asyncio.Future[None]]] = []
+        self._sequence = 0
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def saturated(self) -> bool:
+        """Whether the queue has reached its maximum depth."""
+        return self.waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def slot(self, cost: float = 0) -> AsyncIterator[None]:
+        """
+        Waits for the call to be admitted, and holds its slot until the end of
+        the context.
+
+        Args:
+            cost: Estimated tokens of the call.
+        """
+        priority = upstream_priority.get()
+        start = perf_counter()
+        if self._queue or not self._admit(cost):
+            future = asyncio.get_running_loop().create_future()
+            self._sequence += 1
+            heapq.heappush(
+                self._queue, (priority, self._sequence, cost, future)
+            )
+            self.waiting += 1
+            self._update_metrics()
+            admission = upstream_admission.get()
+            if admission is not None:
+                admission.queue()
+            try:
+                self._dispatch()
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release()
+                else:
+                    future.cancel()
+                    self.waiting -= 1
+                    self._update_metrics()
+                raise
+            if admission is not None:
+                admission.admit()
+        UPSTREAM_QUEUE_WAIT.labels(
+            self.provider, priority.name.lower()
+        ).observe(perf_counter() - start)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _admit(self, cost: float) -> bool:
+        """
+        Admits a call if a slot is free and it fits in the budgets.
+
+        Args:
+            cost: Estimated tokens of the call.
+
+        Returns:
+            Whether the call was admitted.
+        """
+        if self.in_flight >= self.max_concurrency or self._delay(cost) > 0:
+            return False
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(cost)
+        self.in_flight += 1
+        self._update_metrics()
+        return True
+
+    def _delay(self, cost: float) -> float:
+        """
+        Computes the time until a call fits in the budgets.
+
+        Args:
+            cost: Estimated tokens of the call.
+
+        Returns:
+            Time to wait, in seconds, 0 if the call fits now.
+        """
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.delay(cost))
+        return max(delays)
+
+    def _dispatch(self) -> None:
+        """
+        Admits the queued calls in priority order, until one does not fit. If it
+        waits for the budgets, the dispatch is retried once they refill.
+        """
+        while self._queue:
+            _, _, cost, future = self._queue[0]
+            if future.cancelled():
+                heapq.heappop(self._queue)
+                continue
+            if self.in_flight >= self.max_concurrency:
+                break
+            if (delay := self._delay(cost)) > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(
+                        delay, self._on_timer
+                    )
+                break
+            heapq.heappop(self._queue)
+            self.waiting -= 1
+            self._admit(cost)
+            future.set_result(None)
+        self._update_metrics()
+
+    def _on_timer(self) -> None:
+        """Retries the dispatch once the budgets have refilled."""
+        self._timer = None
+        self._dispatch()
+
+    def _release(self) -> None:
+        """Frees the slot of a completed call and admits the next ones."""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _update_metrics(self) -> None:
+        """Updates the queue depth and in-flight gauges."""
+        UPSTREAM_QUEUE_DEPTH.labels(self.provider).set(self.waiting)
+        UPSTREAM_IN_FLIGHT.labels(self.provider).set(self.in_flight)
+
+
+class UpstreamScheduler:
+    """
+    Limiters of the speech-to-text, language model and text-to-speech
+    providers. New sessions should be rejected while any of them is saturated.
+    """
+
+    def __init__(
+        self,
+        stt: UpstreamLimiter,
+        llm: UpstreamLimiter,
+        tts: UpstreamLimiter,
+    ) -> None:
+        """
+        Initializes the UpstreamScheduler object.
+
+        Args:
+            stt: Limiter of the speech-to-text provider.
+            llm: Limiter of the language model provider.
+            tts: Limiter of the text-to-speech provider.
+        """
+        self.stt = stt
+        self.llm = llm
+        self.tts = tts
+
+    @property
+    def saturated(self) -> bool:
+        """Whether the queue of any provider has reached its maximum depth."""
+        return any(
+            limiter.saturated for limiter in (self.stt, self.llm, self.tts)
+        )
+
+
+class ScheduledTranscriber:
+    """Speech-to-text provider whose calls are admitted by a limiter."""
+
+    def __init__(
+        self, transcriber: Transcriber, limiter: UpstreamLimiter
+    ) -> None:
+        """
+        Initializes the ScheduledTranscriber object.
+
+        Args:
+            transcriber: Speech-to-text provider.
+            limiter: Limiter of the provider.
+        """
+        self.transcriber = transcriber
+        self.limiter = limiter
+
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Transcribe audio to text once the call is admitted.
+
+        Args:
+            audio_data: Audio data to transcribe
+
+        Returns:
+            Transcribed text
+        """
+        async with self.limiter.slot():
+            return await self.transcriber.transcribe(audio_data)
+
+
+class ScheduledSynthesizer:
+    """
+    Text-to-speech provider whose calls are admitted by a limiter. The cost of a
+    call is the number of characters of its text.
+    """
+
+    def __init__(
+        self, synthesizer: Synthesizer, limiter: UpstreamLimiter
+    ) -> None:
+        """
+        Initializes the ScheduledSynthesizer object.
+
+        Args:
+            synthesizer: Text-to-speech provider.
+            limiter: Limiter of the provider.
+        """
+        self.synthesizer = synthesizer
+        self.limiter = limiter
+
+    async def synthesize(
+        self,
+        text: str,
+        model_name: str,
+        voice: Voice,
+        response_format: ResponseFormat,
+        speed: float,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Converts text to speech once the call is admitted, holding its slot
+        until the audio is fully streamed.
+
+        Args:
+            text: The text to convert to speech.
+            model_name: The name of the model to use for text-to-speech conversion.
+            voice: The voice to use for speech synthesis.
+            response_format: The format of the audio response.
+            speed: The speed multiplier for speech synthesis.
+            chunk_size: The size in bytes of audio chunks to yield.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        async with self.limiter.slot(cost=len(text)):
+            async for chunk in self.synthesizer.synthesize(
+                text=text,
+                model_name=model_name,
+                voice=voice,
+                response_format=response_format,
+                speed=speed,
+                chunk_size=chunk_size,
+            ):
+                yield chunk
+
+
+def _estimate_request_tokens(messages: list[ModelMessage]) -> int:
+    """
+    Estimate the prompt tokens of a model request, at roughly four characters
+    per token.
+
+    Args:
+        messages: Messages of the request.
+
+    Returns:
+        Estimated number of tokens.
+    """
+    chars = 0
+    for message in messages:
+        for part in message.parts:
+            if isinstance(content := getattr(part, "content", None), str):
+                chars += len(content)
+    return chars // 4 + 1
+
+
+class ScheduledModel(Model):
+    """
+    Model for PydanticAI whose requests are admitted by a limiter. The cost of
+    a request is the estimated number of tokens of its prompt.
+    """
+
+    def __init__(self, model: Model, limiter: UpstreamLimiter) -> None:
+        """
+        Initializes the ScheduledModel object.
+
+        Args:
+            model: Model for PydanticAI.
+            limiter: Limiter of the provider.
+        """
+        self.model = model
+        self.limiter = limiter
+
+    async def agent_model(
+        self,
+        *,
+        function_tools: list[ToolDefinition],
+        allow_text_result: bool,
+        result_tools: list[ToolDefinition],
+    ) -> AgentModel:
+        """
+        Creates an agent model whose requests are admitted by the limiter.
+
+        Args:
+            function_tools: The tools available to the agent.
+            allow_text_result: Whether a plain text final result is permitted.
+            result_tools: Tool definitions for the final result tool(s), if any.
+
+        Returns:
+            An agent model.
+        """
+        agent_model = await self.model.agent_model(
+            function_tools=function_tools,
+            allow_text_result=allow_text_result,
+            result_tools=result_tools,
+        )
+        return ScheduledAgentModel(
+            agent_model=agent_model, limiter=self.limiter
+        )
+
+    def name(self) -> str:
+        """Name of the wrapped model."""
+        return self.model.name()
+
+
+class ScheduledAgentModel(AgentModel):
+    """Agent model whose requests are admitted by a limiter."""
+
+    def __init__(
+        self, agent_model: AgentModel, limiter: UpstreamLimiter
+    ) -> None:
+        """
+        Initializes the ScheduledAgentModel object.
+
+        Args:
+            agent_model: Agent model.
+            limiter: Limiter of the provider.
+        """
+        self.agent_model = agent_model
+        self.limiter = limiter
+
+    async def request(
+        self, messages: list[ModelMessage], model_settings: ModelSettings | None
+    ) -> tuple[ModelResponse, Usage]:
+        """
+        Makes a request to the model once it is admitted.
+
+        Args:
+            messages: Messages of the request.
+            model_settings: Settings of the model.
+
+        Returns:
+            The response and its usage.
+        """
+        async with self.limiter.slot(cost=_estimate_request_tokens(messages)):
+            return await self.agent_model.request(messages, model_settings)
+
+    @asynccontextmanager
+    async def request_stream(
+        self, messages: list[ModelMessage], model_settings: ModelSettings | None
+    ) -> AsyncIterator[StreamedResponse]:
+        """
+        Makes a streamed request to the model once it is admitted, holding its
+        slot until the response is consumed.
+
+        Args:
+            messages: Messages of the request.
+            model_settings: Settings of the model.
+
+        Yields:
+            The streamed response.
+        """
+        async with (
+            self.limiter.slot(cost=_estimate_request_tokens(messages)),
+            self.agent_model.request_stream(
+                messages, model_settings
+            ) as response,
+        ):
+            yield response
@@ -0,0 +1,231 @@
+ABBREVIATIONS = frozenset(
+    {
+        "mr",
+        "mrs",
+        "ms",
+        "dr",
+        "prof",
+        "sr",
+        "jr",
+        "st",
+        "mt",
+        "vs",
+        "etc",
+        "e.g",
+        "i.e",
+        "inc",
+        "ltd",
+        "co",
+        "corp",
+        "no",
+        "approx",
+        "dept",
+        "est",
+        "fig",
+        "jan",
+        "feb",
+        "mar",
+        "apr",
+        "jun",
+        "jul",
+        "aug",
+        "sep",
+        "sept",
+        "oct",
+        "nov",
+        "dec",
+        "a.m",
+        "p.m",
+        "u.s",
+        "u.k",
+    }
+)
+
+SENTENCE_TERMINALS = frozenset(".!?")
+CLAUSE_TERMINALS = frozenset(",;:")
+CLOSERS = frozenset("\"')]}’”")
+
+
+class TextSegmenter:
+    """
+    Incremental segmenter that splits streamed text into segments for speech
+    synthesis.
+
+    Boundaries:
+
+    - Sentence: `.`, `!` or `?` (with any closing quotes or brackets) followed by
+      whitespace. A period is not a boundary after a known abbreviation ("Dr."), an
+      initial ("J.") or inside a number ("3.5").
+    - Clause: `,`, `;` or `:` followed by whitespace.
+    - Paragraph: a newline, always a boundary.
+
+    Segment sizes are adaptive. The first segment is emitted at the first sentence
+    or clause boundary after `first_chars` characters, to minimize the time to first
+    audio. The target size then grows by `growth` with each segment, up to half of
+    `max_chars`, so later segments are larger and fewer: a sentence boundary is
+    used once the segment reaches the target size, and a clause boundary once it
+    reaches twice the target. A segment never exceeds `max_chars`; without any
+    boundary it is cut at the last whitespace, never inside a word.
+
+    Every character is examined once, so feeding text costs O(len(text)) amortized.
+    """
+
+    def __init__(
+        self,
+        first_chars: int = 20,
+        growth: float = 2.0,
+        max_chars: int = 250,
+    ) -> None:
+        """
+        Initializes the TextSegmenter object.
+
+        Args:
+            first_chars: Target size of the first segment.
+            growth: Growth factor of the target size, per segment.
+            max_chars: Maximum size of a segment.
+        """
+        self.first_chars = first_chars
+        self.growth = growth
+        self.max_chars = max_chars
+        self.reset()
+
+    def reset(self) -> None:
+        """Discards any buffered text and restarts the size schedule."""
+        self._chars: list[str] = []
+        self._word: list[str] = []
+        self._last_space = -1
+        self._terminal: str | None = None
+        self._target = float(self.first_chars)
+
+    def feed(self, text: str) -> list[str]:
+        """
+        Feeds text and returns the segments it completes.
+
+        Args:
+            text: Text to add.
+
+        Returns:
+            Completed segments, in order.
+        """
+        segments: list[str] = []
+        for char in text:
+            if self._terminal is not None:
+                if char in CLOSERS or char in SENTENCE_TERMINALS:
+                    self._append(char)
+                    continue
+                terminal, self._terminal = self._terminal, None
+                if (
+                    char.isspace()
+                    and char != "\n"
+                    and self._is_boundary(terminal)
+                ):
+                    self._emit_if(
+                        segments,
+                        self._target
+                        if terminal in SENTENCE_TERMINALS
+                        else 2 * self._target,
+                    )
+            if char == "\n":
+                self._append(char)
+                self._emit_if(segments, 1)
+                continue
+            if char in SENTENCE_TERMINALS or char in CLAUSE_TERMINALS:
+                self._terminal = char
+            self._append(char)
+            if len(self._chars) >= self.max_chars:
+                self._cut(segments)
+        return segments
+
+    def flush(self) -> str:
+        """
+        Returns the buffered text as the last segment.
+
+        Returns:
+            The remaining text, possibly empty.
+        """
+        segment = "".join(self._chars)
+        self._chars = []
+        self._word = []
+        self._last_space = -1
+        self._terminal = None
+        return segment
+
+    def _append(self, char: str) -> None:
+        """
+        Appends a character, tracking the current word and the last whitespace.
+
+        Args:
+            char: Character to append.
+        """
+        if char.isspace():
+            self._word = []
+            self._last_space = len(self._chars)
+        else:
+            self._word.append(char)
+        self._chars.append(char)
+
+    def _is_boundary(self, terminal: str) -> bool:
+        """
+        Checks whether the terminal character ending the current word, followed by
+        whitespace, ends a sentence or a clause.
+
+        Args:
+            terminal: First terminal character of the word's ending.
+
+        Returns:
+            True if the current word ends a sentence or a clause.
+        """
+        if terminal != ".":
+            return True
+        word = "".join(self._word).rstrip("".join(CLOSERS)).rstrip(".")
+        stem = word.lstrip("\"'([{‘“")
+        if len(stem) == 1 and stem.isalpha():
+            return False
+        return stem.lower() not in ABBREVIATIONS
+
+    def _emit_if(self, segments: list[str], min_size: float) -> None:
+        """
+        Emits the buffered text as a segment if it is at least `min_size` long.
+
+        Args:
+            segments: Completed segments.
+            min_size: Minimum size of the segment.
+        """
+        if len(self._chars) >= min_size:
+            self._emit(segments, len(self._chars))
+
+    def _cut(self, segments: list[str]) -> None:
+        """
+        Emits the buffered text up to its last whitespace, or all of it if it is a
+        single word.
+
+        Args:
+            segments: Completed segments.
+        """
+        self._emit(segments, self._last_space + 1 or len(self._chars))
+
+    def _emit(self, segments: list[str], size: int) -> None:
+        """
+        Emits the first `size` buffered characters as a segment and advances the
+        size schedule. Whitespace alone, e.g. a blank line, is not a segment: it
+        is kept and merged into the next one.
+
+        Args:
+            segments: Completed segments.
+            size: Number of characters to emit.
+        """
+        segment = "".join(self._chars[:size])
+        if not segment.strip():
+            return
+        segments.append(segment)
+        # The remainder is at most the current word, so rescanning it is cheap
+        del self._chars[:size]
+        self._last_space = -1
+        self._word = []
+        for i, char in enumerate(self._chars):
+            if char.isspace():
+                self._last_space = i
+                self._word = []
+            else:
+                self._word.append(char)
+        self._target = min(self._target * self.growth, self.max_chars / 2)
@@ -1,7 +1,35 @@
+import asyncio
+from collections.abc import Awaitable
+from contextlib import nullcontext
 from io import BytesIO
+from typing import TYPE_CHECKING, Protocol
 
 from groq import AsyncGroq
 
+from app.engine.audio import detect_audio_format
+from app.engine.preprocessing import AudioPreprocessor
+from app.telemetry.metrics import STT_SEGMENTS
+
+if TYPE_CHECKING:
+    from app.engine.hedging import HedgePolicy
+    from app.engine.scheduler import UpstreamLimiter
+
+
+class Transcriber(Protocol):
+    """Speech-to-text provider."""
+
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Transcribe audio to text.
+
+        Args:
+            audio_data: Audio data to transcribe
+
+        Returns:
+            Transcribed text
+        """
+        ...
+
 
 async def transcribe_audio_data(
     audio_data: bytes,
@@ -9,6 +37,7 @@ async def transcribe_audio_data(
     model_name: str,
     temperature: float = 0.0,
     language: str = "en",
+    filename: str = "audio.wav",
 ) -> str:
     """
     Transcribe audio to text using the Groq model
@@ -19,12 +48,13 @@ async def transcribe_audio_data(
         model_name: Name of the Groq model to use
         temperature: Temperature for sampling
         language: Language of the audio
+        filename: Name of the uploaded file, whose extension gives its format
 
     Returns:
         Transcribed text
     """
     with BytesIO(initial_bytes=audio_data) as audio_stream:
-        audio_stream.name = "audio.wav"
+        audio_stream.name = filename
         response = await api_client.audio.transcriptions.create(
             model=model_name,
             file=audio_stream,
@@ -33,3 +63,158 @@ async def transcribe_audio_data(
         )
         text = response.text.strip()
         return text
+
+
+def _normalize(word: str) -> str:
+    """Lowercase a word and strip its punctuation, to compare transcripts."""
+    return "".join(char for char in word.lower() if char.isalnum())
+
+
+def stitch_transcripts(texts: list[str], max_overlap_words: int = 10) -> str:
+    """
+    Join the transcripts of overlapping segments. The words transcribed twice
+    from the overlap, the longest run of words ending one transcript and
+    starting the next (ignoring case and punctuation), are kept only once.
+
+    Args:
+        texts: Transcripts of consecutive segments.
+        max_overlap_words: Maximum number of words de-duplicated between two
+            segments.
+
+    Returns:
+        The stitched transcript.
+    """
+    words: list[str] = []
+    for text in texts:
+        following = text.split()
+        tail = [_normalize(word) for word in words[-max_overlap_words:]]
+        head = [_normalize(word) for word in following[:max_overlap_words]]
+        for size in range(min(len(tail), len(head)), 0, -1):
+            if tail[-size:] == head[:size]:
+                following = following[size:]
+                break
+        words.extend(following)
+    return " ".join(words)
+
+
+class GroqTranscriber:
+    """
+    Speech-to-text provider that uses the Groq API. Each request to the API,
+    one per segment, is admitted by the limiter, if any, so that the
+    preprocessing does not hold a slot and concurrent segments are counted.
+    Once admitted, the request is hedged and retried on its own, so the
+    deadline neither counts the queue wait nor grows with the utterance, and a
+    failed segment does not re-run the others.
+    """
+
+    def __init__(
+        self,
+        api_client: AsyncGroq,
+        model_name: str = "whisper-large-v3-turbo",
+        language: str = "en",
+        preprocessor: AudioPreprocessor | None = None,
+        fanout: int = 4,
+        limiter: "UpstreamLimiter | None" = None,
+        policy: "HedgePolicy | None" = None,
+        secondary_model: str | None = None,
+    ) -> None:
+        """
+        Initializes the GroqTranscriber object.
+
+        Args:
+            api_client: Groq API client
+            model_name: Name of the Groq model to use
+            language: Language of the audio
+            preprocessor: Reduces the size of the audio before upload, and
+                splits long audio into segments. Audio is uploaded as received
+                if None.
+            fanout: Maximum number of segments of an utterance transcribed
+                concurrently.
+            limiter: Limiter admitting the requests to the API, if any.
+            policy: Deadline, hedging and retries of the requests, if any.
+            secondary_model: Name of the Groq model of the hedges. Hedges use
+                `model_name` if None.
+        """
+        self.api_client = api_client
+        self.model_name = model_name
+        self.language = language
+        self.preprocessor = preprocessor
+        self.fanout = fanout
+        self.limiter = limiter
+        self.policy = policy
+        self.secondary_model = secondary_model
+
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Transcribe audio to text using the Groq model. Segments of long audio
+        are transcribed concurrently, up to `fanout` at a time, and their
+        transcripts stitched back together. If a segment fails, the requests
+        of the others are cancelled and its error is raised.
+
+        Args:
+            audio_data: Audio data to transcribe
+
+        Returns:
+            Transcribed text, empty if the audio is silent
+        """
+        if self.preprocessor is not None:
+            segments, extension = await self.preprocessor.process(audio_data)
+        else:
+            segments, extension = [audio_data], detect_audio_format(audio_data)
+        segments = [segment for segment in segments if segment]
+        if not segments:
+            return ""
+        STT_SEGMENTS.inc(len(segments))
+        semaphore = asyncio.Semaphore(self.fanout)
+
+        async def transcribe_segment(segment: bytes) -> str:
+            async with (
+                semaphore,
+                self.limiter.slot() if self.limiter else nullcontext(),
+            ):
+                return await self._request(
+                    audio_data=segment, filename=f"audio.{extension}"
+                )
+
+        tasks = [
+            asyncio.create_task(transcribe_segment(segment))
+            for segment in segments
+        ]
+        try:
+            texts = await asyncio.gather(*tasks)
+        finally:
+            # Frees the slots of the other segments once one has failed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return stitch_transcripts(list(texts))
+
+    async def _request(self, audio_data: bytes, filename: str) -> str:
+        """
+        Transcribes a segment in one request to the API, hedged past the
+        deadline and retried, if a policy is set.
+
+        Args:
+            audio_data: Audio data of the segment.
+            filename: Name of the uploaded file.
+
+        Returns:
+            Transcribed text
+        """
+
+        def start(hedge: bool) -> Awaitable[str]:
+            return transcribe_audio_data(
+                audio_data=audio_data,
+                api_client=self.api_client,
+                model_name=(
+                    self.secondary_model
+                    if hedge and self.secondary_model
+                    else self.model_name
+                ),
+                language=self.language,
+                filename=filename,
+            )
+
+        if self.policy is None:
+            return await start(False)
+        return await self.policy.call(start)
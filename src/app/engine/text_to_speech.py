@@ -1,60 +1,191 @@
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
 from types import TracebackType
-from typing import AsyncIterator, Literal
+from typing import Any, AsyncIterator, Literal, Protocol
 
 from openai import AsyncOpenAI
 
+from app.engine.audio_cache import AudioCache
+from app.engine.framing import create_framer, describe_output
+from app.engine.priority import Priority, upstream_priority
+from app.engine.segmentation import TextSegmenter
+from app.telemetry.metrics import UPSTREAM_ERRORS
+from app.telemetry.recording import RecordKind, record_event
+from app.telemetry.tracing import current_stage, record_mark, record_stage
+
 type Voice = Literal["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
 type ResponseFormat = Literal["mp3", "opus", "aac", "flac", "wav", "pcm"]
+type Segment = asyncio.Queue[bytes | BaseException | None]
+
+
+@dataclass
+class SynthesisOrigin:
+    """
+    Model that synthesized the audio of a call, reported by providers that may
+    use another model than the requested one, such as hedged providers.
+
+    Attributes:
+        model: Model of the audio, the requested one if None.
+    """
+
+    model: str | None = None
+
+
+# Origin of the audio of the text-to-speech call made in the current context
+synthesis_origin: ContextVar[SynthesisOrigin | None] = ContextVar(
+    "synthesis_origin", default=None
+)
+
+
+class Synthesizer(Protocol):
+    """Text-to-speech provider."""
+
+    def synthesize(
+        self,
+        text: str,
+        model_name: str,
+        voice: Voice,
+        response_format: ResponseFormat,
+        speed: float,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Converts text to speech.
+
+        Args:
+            text: The text to convert to speech.
+            model_name: The name of the model to use for text-to-speech conversion.
+            voice: The voice to use for speech synthesis.
+            response_format: The format of the audio response.
+            speed: The speed multiplier for speech synthesis.
+            chunk_size: The size in bytes of audio chunks to yield.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        ...
+
+
+class OpenAISynthesizer:
+    """Text-to-speech provider that uses OpenAI's API."""
+
+    def __init__(self, client: AsyncOpenAI) -> None:
+        """
+        Initializes the OpenAISynthesizer object.
+
+        Args:
+            client: The OpenAI client to use for API calls.
+        """
+        self.client = client
+
+    async def synthesize(
+        self,
+        text: str,
+        model_name: str,
+        voice: Voice,
+        response_format: ResponseFormat,
+        speed: float,
+        chunk_size: int,
+    ) -> AsyncIterator[bytes]:
+        """
+        Sends text to the TTS API and yields audio chunks.
+
+        Args:
+            text: The text to convert to speech.
+            model_name: The name of the model to use for text-to-speech conversion.
+            voice: The voice to use for speech synthesis.
+            response_format: The format of the audio response.
+            speed: The speed multiplier for speech synthesis.
+            chunk_size: The size in bytes of audio chunks to yield.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        async with self.client.audio.speech.with_streaming_response.create(
+            model=model_name,
+            input=text,
+            voice=voice,
+            response_format=response_format,
+            speed=speed,
+        ) as audio_stream:
+            async for audio_chunk in audio_stream.iter_bytes(
+                chunk_size=chunk_size
+            ):
+                yield audio_chunk
 
 
 class TextToSpeech:
     """
-    Asynchronous context manager for streaming text-to-speech conversion using OpenAI's API.
+    Asynchronous context manager for streaming text-to-speech conversion using a
+    text-to-speech provider (OpenAI's API in production).
+
+    Incoming text is split into segments by a `TextSegmenter`, and each segment is sent
+    to the API. The first segment is short to minimize the time to first audio, and
+    later segments grow larger. Yields audio bytes in an asynchronous iterator.
+
+    Raw PCM and Opus audio is yielded in frame-aligned chunks, which the client
+    can play as soon as they arrive (see `create_framer`); other formats are
+    yielded as received.
 
-    Buffers incoming text and sends it to the API when the buffer reaches a certain size or
-    a sentence-ending character is encountered. Yields audio bytes in an asynchronous iterator.
+    Two modes are available:
+
+    - Serial: `feed` and `flush` synthesize each segment inline, so the caller waits for
+      the audio of a segment before it can feed more text.
+    - Pipelined: `push` and `end` only schedule segments, which are synthesized
+      concurrently (up to `max_in_flight` at a time) while `stream` yields their audio
+      strictly in segment order.
+
+    Attributes:
+        received_chars: Number of characters pushed since the context was entered.
     """
 
     def __init__(
         self,
-        client: AsyncOpenAI,
+        synthesizer: Synthesizer,
         model_name: str,
         voice: Voice = "echo",
         response_format: ResponseFormat = "aac",
         speed: float = 1.00,
-        buffer_size: int = 64,
-        sentence_endings: tuple[str, ...] = (
-            ".",
-            "?",
-            "!",
-            ";",
-            ":",
-            "\n",
-        ),
+        segmenter: TextSegmenter | None = None,
         chunk_size: int = 1024 * 5,
+        max_in_flight: int = 1,
+        cache: AudioCache | None = None,
     ) -> None:
         """
         Initializes the TextToSpeech object.
 
         Args:
-            client: The OpenAI client to use for API calls.
+            synthesizer: The text-to-speech provider to use.
             model_name: The name of the model to use for text-to-speech conversion.
             voice: The voice to use for speech synthesis.
             response_format: The format of the audio response.
             speed: The speed multiplier for speech synthesis.
-            buffer_size: The size of the text buffer before sending to the API.
-            sentence_endings: Characters that mark the end of a sentence.
-            chunk_size: The size in bytes of audio chunks to yield.
+            segmenter: Segmenter splitting the text into segments. A segmenter with
+                the default size schedule is used if None.
+            chunk_size: The size in bytes of audio chunks to yield. Rounded to whole
+                frames for framed formats.
+            max_in_flight: Maximum number of segments synthesized concurrently in
+                pipelined mode.
+            cache: Cache of synthesized audio. Audio is always synthesized if None.
         """
-        self.client = client
+        self.synthesizer = synthesizer
         self.model_name = model_name
         self.voice: Voice = voice
         self.response_format: ResponseFormat = response_format
         self.speed = speed
-        self.buffer_size = buffer_size
-        self.sentence_endings = sentence_endings
+        self.segmenter = segmenter or TextSegmenter()
         self.chunk_size = chunk_size
-        self._buffer = ""
+        self.max_in_flight = max_in_flight
+        self.cache = cache
+        self._segments: asyncio.Queue[tuple[str, Segment] | None] = (
+            asyncio.Queue()
+        )
+        self.received_chars = 0
+        self._scheduled = 0
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
 
     async def __aenter__(self) -> "TextToSpeech":
         """
@@ -63,24 +194,37 @@ class TextToSpeech:
         Returns:
             The TextToSpeech instance.
         """
+        self.segmenter.reset()
+        self._segments = asyncio.Queue()
+        self.received_chars = 0
+        self._scheduled = 0
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
         return self
 
+    @property
+    def output(self) -> dict[str, Any]:
+        """Settings of the audio output, and how the client decodes it."""
+        return {
+            "format": self.response_format,
+            "voice": self.voice,
+            "speed": self.speed,
+            "chunk_size": self.chunk_size,
+            **describe_output(self.response_format),
+        }
+
     async def feed(self, text: str) -> AsyncIterator[bytes]:
         """
-        Feeds text into the buffer and yields audio bytes if the buffer reaches the buffer size
-        or ends with a sentence-ending character.
+        Feeds text into the segmenter and yields the audio bytes of every segment it
+        completes.
 
         Args:
-            text: The text to add to the buffer.
+            text: The text to add to the segmenter.
 
         Yields:
-            Audio bytes generated from the buffered text.
+            Audio bytes generated from the completed segments.
         """
-        self._buffer += text
-        if len(self._buffer) >= self.buffer_size or any(
-            self._buffer.endswith(se) for se in self.sentence_endings
-        ):
-            async for chunk in self.flush():
+        for segment in self.segmenter.feed(text):
+            async for chunk in self._send_audio(segment):
                 yield chunk
 
     async def flush(self) -> AsyncIterator[bytes]:
@@ -90,14 +234,104 @@ class TextToSpeech:
         Yields:
             Audio bytes generated from the buffered text.
         """
-        if self._buffer:
-            async for chunk in self._send_audio(self._buffer):
+        segment = self.segmenter.flush()
+        if segment.strip():
+            async for chunk in self._send_audio(segment):
                 yield chunk
-            self._buffer = ""
+
+    def push(self, text: str) -> None:
+        """
+        Feeds text into the segmenter and schedules the synthesis of every segment it
+        completes, without waiting for the audio. Pipelined mode only.
+
+        Args:
+            text: The text to add to the segmenter.
+        """
+        self.received_chars += len(text)
+        for segment in self.segmenter.feed(text):
+            self._schedule(segment)
+
+    def end(self) -> None:
+        """
+        Schedules any remaining buffered text and marks the end of the text stream,
+        so that `stream` stops once every scheduled segment has been delivered.
+        Pipelined mode only.
+        """
+        segment = self.segmenter.flush()
+        if segment.strip():
+            self._schedule(segment)
+        self._segments.put_nowait(None)
+
+    async def stream(self) -> AsyncIterator[tuple[str, bytes]]:
+        """
+        Yields the audio of every scheduled segment, in the order the segments were
+        scheduled, until `end` is called. Pipelined mode only.
+
+        Yields:
+            Text of the segment with its first audio chunk, and an empty string
+            with the others, and the audio bytes generated from the scheduled
+            segments.
+
+        Raises:
+            Exception: Any error raised while synthesizing a segment.
+        """
+        while (scheduled := await self._segments.get()) is not None:
+            text, segment = scheduled
+            while (item := await segment.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield text, item
+                text = ""
+
+    def _schedule(self, text: str) -> None:
+        """
+        Starts the synthesis of a segment in the background.
+
+        Args:
+            text: The text to convert to speech.
+        """
+        segment: Segment = asyncio.Queue()
+        self._segments.put_nowait((text, segment))
+        task = asyncio.create_task(
+            self._synthesize(
+                text=text, segment=segment, first=self._scheduled == 0
+            )
+        )
+        self._scheduled += 1
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _synthesize(
+        self, text: str, segment: Segment, first: bool = False
+    ) -> None:
+        """
+        Synthesizes a segment once a concurrency slot is available, forwarding its
+        audio chunks to the segment queue. The first segment of a response is
+        requested with the highest upstream priority.
+
+        Args:
+            text: The text to convert to speech.
+            segment: Queue receiving the audio chunks, followed by `None`.
+            first: Whether it is the first segment of the response.
+        """
+        current_stage.set("tts")
+        if first:
+            # Set in the task's own context, so it only applies to this segment
+            upstream_priority.set(Priority.FIRST_AUDIO)
+        try:
+            async with self._semaphore:
+                async for chunk in self._send_audio(text):
+                    segment.put_nowait(chunk)
+        except Exception as e:  # noqa: BLE001 - re-raised by `stream`
+            segment.put_nowait(e)
+        finally:
+            segment.put_nowait(None)
 
     async def _send_audio(self, text: str) -> AsyncIterator[bytes]:
         """
-        Sends text to the TTS API and yields audio chunks.
+        Yields the audio chunks of a text, frame-aligned if the format is framed.
+        The audio of each text is framed on its own, since the provider returns
+        a complete audio stream per request.
 
         Args:
             text: The text to convert to speech.
@@ -105,17 +339,111 @@ class TextToSpeech:
         Yields:
             Chunks of audio bytes generated from the input text.
         """
-        async with self.client.audio.speech.with_streaming_response.create(
+        framer = create_framer(
+            response_format=self.response_format, chunk_size=self.chunk_size
+        )
+        if framer is None:
+            async for audio_chunk in self._fetch_audio(text):
+                yield audio_chunk
+            return
+        async for audio_chunk in self._fetch_audio(text):
+            for frame_chunk in framer.feed(audio_chunk):
+                yield frame_chunk
+        if last_chunk := framer.flush():
+            yield last_chunk
+
+    async def _fetch_audio(self, text: str) -> AsyncIterator[bytes]:
+        """
+        Yields the audio chunks of a text, from the cache if available, otherwise
+        from the TTS API. Cached audio is yielded in chunks of the same size as live
+        audio, and the audio of a completed synthesis is added to the cache, under
+        the model that synthesized it.
+
+        Args:
+            text: The text to convert to speech.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        if self.cache is None:
+            async for audio_chunk in self._request_audio(text):
+                yield audio_chunk
+            return
+
+        key = self.cache.key(
             model=self.model_name,
-            input=text,
             voice=self.voice,
             response_format=self.response_format,
             speed=self.speed,
-        ) as audio_stream:
-            async for audio_chunk in audio_stream.iter_bytes(
-                chunk_size=self.chunk_size
+            text=text,
+        )
+        if (audio := await self.cache.get(key)) is not None:
+            for start in range(0, len(audio), self.chunk_size):
+                yield audio[start : start + self.chunk_size]
+            return
+
+        origin = SynthesisOrigin()
+        synthesis_origin.set(origin)
+        audio_chunks = []
+        async for audio_chunk in self._request_audio(text):
+            audio_chunks.append(audio_chunk)
+            yield audio_chunk
+        if origin.model is not None and origin.model != self.model_name:
+            key = self.cache.key(
+                model=origin.model,
+                voice=self.voice,
+                response_format=self.response_format,
+                speed=self.speed,
+                text=text,
+            )
+        await self.cache.put(key, b"".join(audio_chunks))
+
+    async def _request_audio(self, text: str) -> AsyncIterator[bytes]:
+        """
+        Sends text to the text-to-speech provider and yields audio chunks. The time
+        to first byte of the provider is recorded as the `tts_ttfb` stage, and the
+        timings of the chunks in the session recording, if any.
+
+        Args:
+            text: The text to convert to speech.
+
+        Yields:
+            Chunks of audio bytes generated from the input text.
+        """
+        start = perf_counter()
+        first = True
+        chunks: list[tuple[float, int]] = []
+        try:
+            async for audio_chunk in self.synthesizer.synthesize(
+                text=text,
+                model_name=self.model_name,
+                voice=self.voice,
+                response_format=self.response_format,
+                speed=self.speed,
+                chunk_size=self.chunk_size,
             ):
+                if first:
+                    record_stage(
+                        stage="tts_ttfb", duration=perf_counter() - start
+                    )
+                    record_mark(event="tts_first_byte")
+                    first = False
+                chunks.append(
+                    (round(perf_counter() - start, 4), len(audio_chunk))
+                )
                 yield audio_chunk
+        except Exception:
+            UPSTREAM_ERRORS.labels("tts").inc()
+            raise
+        finally:
+            record_event(
+                RecordKind.TTS,
+                {
+                    "text": text,
+                    "format": self.response_format,
+                    "chunks": chunks,
+                },
+            )
 
     async def __aexit__(
         self,
@@ -124,6 +452,10 @@ class TextToSpeech:
         exc_tb: TracebackType | None,
     ) -> None:
         """
-        Exits the asynchronous context manager.
+        Exits the asynchronous context manager, cancelling any pending synthesis.
         """
-        pass
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.segmenter.reset()
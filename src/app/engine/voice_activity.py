@@ -0,0 +1,267 @@
+import numpy as np
+import numpy.typing as npt
+
+type Samples = npt.NDArray[np.int16]
+
+
+class AudioRingBuffer:
+    """
+    Preallocated ring buffer of 16-bit PCM samples.
+
+    Positions are absolute sample counts since the buffer was created, so a region
+    stays addressable until it is overwritten, without moving any data.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Initializes the AudioRingBuffer object.
+
+        Args:
+            capacity: Maximum number of samples held by the buffer.
+        """
+        self.capacity = capacity
+        self._data: Samples = np.zeros(capacity, dtype=np.int16)
+        self._written = 0
+
+    @property
+    def written(self) -> int:
+        """Total number of samples written to the buffer."""
+        return self._written
+
+    def write(self, samples: Samples) -> None:
+        """
+        Writes samples to the buffer, overwriting the oldest ones if needed.
+
+        Args:
+            samples: Samples to write.
+        """
+        samples = samples[-self.capacity :]
+        start = self._written % self.capacity
+        head = min(len(samples), self.capacity - start)
+        self._data[start : start + head] = samples[:head]
+        self._data[: len(samples) - head] = samples[head:]
+        self._written += len(samples)
+
+    def read(self, start: int, end: int) -> Samples:
+        """
+        Reads a copy of the samples between two absolute positions. The part of the
+        region that has already been overwritten is skipped.
+
+        Args:
+            start: Absolute position of the first sample.
+            end: Absolute position after the last sample.
+
+        Returns:
+            Copy of the samples.
+        """
+        start = max(start, end - self.capacity, 0)
+        first, last = start % self.capacity, end % self.capacity
+        if end - start == 0:
+            return np.zeros(0, dtype=np.int16)
+        if first < last:
+            return self._data[first:last].copy()
+        return np.concatenate((self._data[first:], self._data[:last]))
+
+
+class UtteranceSegmenter:
+    """
+    Energy-based voice activity detector that splits a continuous stream of 16-bit
+    little-endian mono PCM into utterances.
+
+    Speech starts after `speech_start_ms` of consecutive voiced frames and ends after
+    `end_silence_ms` of consecutive silent frames. The audio is kept in a
+    preallocated ring buffer, and each utterance includes `preroll_ms` of audio
+    before the detected start so that soft onsets are not clipped.
+
+    Optionally, a pause of `pause_ms` (shorter than `end_silence_ms`) within an
+    utterance is reported too, so that the audio so far can be processed before
+    the utterance ends. Any voiced frame after the pause reports the resumption
+    of speech and the utterance goes on, so that an utterance reported as paused
+    and then ended holds nothing but silence after the pause.
+
+    Attributes:
+        speech_starts: Number of utterances started so far.
+        pauses: Number of pauses detected so far.
+        resumes: Number of times speech resumed after a pause so far.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16_000,
+        frame_ms: int = 20,
+        threshold_db: float = -45.0,
+        speech_start_ms: int = 60,
+        end_silence_ms: int = 600,
+        preroll_ms: int = 300,
+        max_utterance_ms: int = 30_000,
+        pause_ms: int | None = None,
+    ) -> None:
+        """
+        Initializes the UtteranceSegmenter object.
+
+        Args:
+            sample_rate: Sample rate of the incoming audio.
+            frame_ms: Duration of the analysis frames.
+            threshold_db: Frame energy, in dBFS, above which a frame is voiced.
+            speech_start_ms: Duration of voiced audio that starts an utterance.
+            end_silence_ms: Duration of silence that ends an utterance.
+            preroll_ms: Duration of audio kept before the start of an utterance.
+            max_utterance_ms: Duration after which an utterance is ended anyway.
+            pause_ms: Duration of silence within an utterance reported as a
+                pause. Pauses are not reported if None.
+        """
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.speech_start_frames = max(1, speech_start_ms // frame_ms)
+        self.end_silence_frames = max(1, end_silence_ms // frame_ms)
+        self.preroll_size = sample_rate * preroll_ms // 1000
+        self.max_utterance_size = sample_rate * max_utterance_ms // 1000
+        self.pause_frames = (
+            max(1, pause_ms // frame_ms) if pause_ms is not None else None
+        )
+        self._ring = AudioRingBuffer(
+            capacity=self.max_utterance_size + self.preroll_size
+        )
+        self._pending = b""
+        self._voiced_frames = 0
+        self._silent_frames = 0
+        self._start: int | None = None
+        self._pause_end: int | None = None
+        self.speech_starts = 0
+        self.pauses = 0
+        self.resumes = 0
+
+    @property
+    def in_speech(self) -> bool:
+        """Whether an utterance is in progress."""
+        return self._start is not None
+
+    @property
+    def paused(self) -> bool:
+        """Whether the utterance in progress is paused."""
+        return self._pause_end is not None
+
+    def partial(self) -> Samples | None:
+        """
+        Returns the audio of the paused utterance, up to the pause.
+
+        Returns:
+            Samples of the utterance so far, or None if it is not paused.
+        """
+        if self._start is None or self._pause_end is None:
+            return None
+        return self._ring.read(start=self._start, end=self._pause_end)
+
+    def feed(self, data: bytes) -> list[Samples]:
+        """
+        Feeds audio of any length and returns the utterances it completes.
+
+        Args:
+            data: 16-bit little-endian mono PCM audio.
+
+        Returns:
+            Samples of every utterance that ended within the audio.
+        """
+        if self._pending:
+            data = self._pending + data
+        usable = len(data) - len(data) % (self.frame_size * 2)
+        self._pending = data[usable:]
+        if not usable:
+            return []
+
+        frames = np.frombuffer(data[:usable], dtype="<i2").reshape(
+            -1, self.frame_size
+        )
+        power = np.mean(np.square(frames, dtype=np.float64), axis=1)
+        energy_db = 10 * np.log10(power / 32768.0**2 + 1e-12)
+        voiced = energy_db > self.threshold_db
+
+        utterances: list[Samples] = []
+        for frame, is_voiced in zip(frames, voiced):
+            self._ring.write(frame)
+            utterance = self._update(is_voiced=bool(is_voiced))
+            if utterance is not None:
+                utterances.append(utterance)
+        return utterances
+
+    def flush(self) -> Samples | None:
+        """
+        Ends the utterance in progress, if any.
+
+        Returns:
+            Samples of the utterance in progress, or None.
+        """
+        if self._start is None:
+            return None
+        return self._end(self._ring.written)
+
+    def _update(self, is_voiced: bool) -> Samples | None:
+        """
+        Advances the detector by one frame.
+
+        Args:
+            is_voiced: Whether the frame is voiced.
+
+        Returns:
+            Samples of the utterance ended by the frame, or None.
+        """
+        position = self._ring.written
+        if self._start is None:
+            self._voiced_frames = self._voiced_frames + 1 if is_voiced else 0
+            if self._voiced_frames >= self.speech_start_frames:
+                speech = self._voiced_frames * self.frame_size
+                self._start = max(0, position - speech - self.preroll_size)
+                self._silent_frames = 0
+                self.speech_starts += 1
+            return None
+
+        self._silent_frames = 0 if is_voiced else self._silent_frames + 1
+        if self.pause_frames is not None:
+            self._track_pause(position=position, is_voiced=is_voiced)
+        if self._silent_frames >= self.end_silence_frames:
+            # Keep a single frame of the trailing silence
+            silence = (self._silent_frames - 1) * self.frame_size
+            return self._end(position - silence)
+        if position - self._start >= self.max_utterance_size:
+            return self._end(position)
+        return None
+
+    def _track_pause(self, position: int, is_voiced: bool) -> None:
+        """
+        Detects pauses within the utterance in progress, and the resumption of
+        speech after them.
+
+        Args:
+            position: Absolute position after the current frame.
+            is_voiced: Whether the current frame is voiced.
+        """
+        if self._pause_end is None:
+            if self._silent_frames == self.pause_frames:
+                # Keep a single frame of the silence, as at the end of utterances
+                silence = (self._silent_frames - 1) * self.frame_size
+                self._pause_end = position - silence
+                self.pauses += 1
+            return
+        # Even a short burst of speech makes the audio up to the pause stale
+        if is_voiced:
+            self._pause_end = None
+            self.resumes += 1
+
+    def _end(self, position: int) -> Samples:
+        """
+        Ends the utterance in progress.
+
+        Args:
+            position: Absolute position after the last sample of the utterance.
+
+        Returns:
+            Samples of the utterance.
+        """
+        assert self._start is not None
+        utterance = self._ring.read(start=self._start, end=position)
+        self._start = None
+        self._pause_end = None
+        self._voiced_frames = 0
+        self._silent_frames = 0
+        return utterance
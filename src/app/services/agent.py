@@ -1,11 +1,26 @@
+from collections.abc import AsyncIterator
 from dataclasses import dataclass
+from time import perf_counter
 from typing import Sequence
 
 import aiohttp
+from loguru import logger
 from pydantic_ai import Agent, Tool
-from pydantic_ai.models.groq import GroqModel
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    ToolCallPart,
+    ToolReturnPart,
+)
+from pydantic_ai.models import Model
 
 from app.config.settings import Settings
+from app.engine.hedging import HedgePolicy
+from app.engine.text_to_speech import TextToSpeech
+from app.telemetry.metrics import UPSTREAM_ERRORS
+from app.telemetry.recording import RecordKind, record_event
+from app.telemetry.tracing import record_mark, record_stage
 
 
 @dataclass
@@ -14,24 +29,142 @@ class Dependencies:
     session: aiohttp.ClientSession
 
 
-def create_groq_agent(
-    groq_model: GroqModel,
+@dataclass
+class AgentHedge:
+    """
+    Hedging of the agent's responses on their first token.
+
+    Attributes:
+        policy: Deadline, hedging and retries of the responses.
+        model: Model of the hedges, the agent's model if None.
+    """
+
+    policy: HedgePolicy
+    model: Model | None = None
+
+
+def create_agent(
+    model: Model,
     tools: Sequence[Tool[Dependencies]],
     system_prompt: str,
 ) -> Agent[Dependencies]:
     """
-    Creates a PydanticAI Agent that uses Groq models.
+    Creates a PydanticAI Agent.
 
     Args:
-        groq_model: Groq model for PydanticAI.
+        model: Model for PydanticAI (Groq in production).
+        tools: Tools available to the agent.
+        system_prompt: System prompt of the agent.
 
     Returns:
-        PydanticAI Agent that uses Groq models.
+        PydanticAI Agent.
     """
 
     return Agent(
-        model=groq_model,
+        model=model,
         deps_type=Dependencies,
         system_prompt=system_prompt,
         tools=tools,
     )
+
+
+async def stream_agent_response(
+    agent: Agent[Dependencies],
+    user_prompt: str,
+    message_history: list[ModelMessage],
+    deps: Dependencies,
+    tts_handler: TextToSpeech,
+    hedge: AgentHedge | None = None,
+) -> str:
+    """
+    Streams the agent's response into the text-to-speech handler.
+
+    Text deltas are pushed to the handler as soon as they arrive, so the LLM stream
+    is consumed independently of the audio delivery. The handler's text stream is
+    always ended, even if the generation fails. The time to first token and the
+    total generation time are recorded as the `llm_ttft` and `llm` stages.
+
+    With a hedge, a response whose first token is late, counting from its
+    admission by the scheduler, is raced against a duplicate, and a response
+    failing before its first token is retried. Only
+    the deltas of the winning response reach the handler.
+
+    The request, the deltas and the tool calls are recorded in the session
+    recording, if any.
+
+    Args:
+        agent: PydanticAI Agent used to generate the response.
+        user_prompt: User's message.
+        message_history: Previous messages of the conversation.
+        deps: Dependencies for the agent.
+        tts_handler: Text-to-Speech handler in pipelined mode.
+        hedge: Hedging of the response, if any.
+
+    Returns:
+        The full generated response.
+    """
+
+    async def stream_deltas(hedged: bool = False) -> AsyncIterator[str]:
+        async with agent.run_stream(
+            user_prompt=user_prompt,
+            message_history=message_history,
+            model=hedge.model if hedged and hedge is not None else None,
+            deps=deps,
+        ) as result:
+            async for message in result.stream_text(delta=True):
+                yield message
+            _record_tool_calls(result.new_messages())
+
+    generation = ""
+    start = perf_counter()
+    record_event(RecordKind.LLM_START, b"")
+    try:
+        deltas = (
+            stream_deltas()
+            if hedge is None
+            else hedge.policy.stream(stream_deltas)
+        )
+        async for message in deltas:
+            logger.debug("Delta: {m}", m=message)
+            if not generation:
+                record_stage(stage="llm_ttft", duration=perf_counter() - start)
+                record_mark(event="llm_first_token")
+            generation += message
+            record_event(RecordKind.LLM_DELTA, message)
+            tts_handler.push(text=message)
+    except Exception:
+        UPSTREAM_ERRORS.labels("llm").inc()
+        raise
+    finally:
+        tts_handler.end()
+    record_stage(stage="llm", duration=perf_counter() - start)
+    return generation
+
+
+def _record_tool_calls(messages: list[ModelMessage]) -> None:
+    """
+    Records the tool calls of a run, with their results, in the session
+    recording, if any.
+
+    Args:
+        messages: Messages of the run.
+    """
+    calls: dict[str | None, ToolCallPart] = {}
+    for message in messages:
+        if isinstance(message, ModelResponse):
+            for response_part in message.parts:
+                if isinstance(response_part, ToolCallPart):
+                    calls[response_part.tool_call_id] = response_part
+        elif isinstance(message, ModelRequest):
+            for part in message.parts:
+                if isinstance(part, ToolReturnPart) and (
+                    call := calls.get(part.tool_call_id)
+                ):
+                    record_event(
+                        RecordKind.TOOL_CALL,
+                        {
+                            "tool": call.tool_name,
+                            "args": call.args_as_dict(),
+                            "result": part.model_response_str(),
+                        },
+                    )
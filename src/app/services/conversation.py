@@ -0,0 +1,421 @@
+import asyncio
+import contextvars
+from collections import deque
+from typing import Any, NamedTuple
+
+import psycopg
+from loguru import logger
+from psycopg_pool import AsyncConnectionPool
+from pydantic import UUID4
+from pydantic_ai.messages import ModelMessage, ModelRequest, SystemPromptPart
+
+from app.database.actions import (
+    count_messages_before,
+    get_conversation_summary,
+    get_conversation_window,
+    get_message_id,
+    store_conversation_summary,
+)
+from app.database.writer import MessageWriter
+from app.services.session_store import SessionSnapshot, SessionStore
+from app.services.summarizer import Summarizer
+from app.services.utils import estimate_tokens, format_message_for_agent
+
+
+class HistoryEntry(NamedTuple):
+    """
+    Message of the in-memory history.
+
+    Attributes:
+        sender: Sender of the message. (e.g., "user" or "agent")
+        content: Content of the message.
+        message: Message formatted for the agent.
+        tokens: Estimated number of tokens of the message.
+    """
+
+    sender: str
+    content: str
+    message: ModelMessage
+    tokens: int
+
+
+class ConversationState:
+    """
+    In-memory conversation history owned by a websocket session.
+
+    The history is read once, when the session starts, and then kept in sync by
+    appending every new message while it is queued for persistence, so no turn has
+    to re-read or re-format the whole conversation. Only the most recent messages,
+    within a message and token budget, are kept. Token counts are estimated once
+    per message and stored with it, so the budget never re-tokenizes history.
+
+    With a summarizer, the last `keep_turns` turns are kept verbatim and older
+    turns are folded into a rolling summary, sent to the agent ahead of the
+    history. Folding runs in the background after the agent's answer, between
+    turns, once the older turns reach `summary_trigger_tokens`; until then they
+    are still sent verbatim. They are exempt from the budget, unless they
+    outgrow it twice over because summarizing keeps failing. The summary is
+    persisted alongside the messages, with the number of messages it covers, so
+    the prompt size stays flat however long the conversation and resuming it
+    only reads the messages after the summary.
+
+    With a session store, a compact snapshot of the session (history window,
+    summary and TTS settings) is saved in the background whenever it changes, so
+    that any worker can resume the session with a single read.
+
+    Attributes:
+        summary: Summary of the messages older than the history.
+        tts_settings: Text-to-speech settings of the session.
+        resumed: Whether an existing conversation was found when hydrating.
+    """
+
+    def __init__(
+        self,
+        conversation_id: UUID4,
+        message_writer: MessageWriter,
+        max_messages: int = 50,
+        max_tokens: int = 8000,
+        session_store: SessionStore | None = None,
+        summarizer: Summarizer | None = None,
+        keep_turns: int = 6,
+        summary_trigger_tokens: int = 800,
+    ) -> None:
+        """
+        Initializes the ConversationState object.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+            message_writer: Background writer that persists the messages.
+            max_messages: Maximum number of messages kept in the history.
+            max_tokens: Maximum number of estimated tokens kept in the history.
+            session_store: Store of session snapshots. Snapshots are not used if
+                None.
+            summarizer: Summarizer of older turns. Older turns are dropped, not
+                summarized, if None.
+            keep_turns: Number of recent turns kept verbatim when summarizing.
+            summary_trigger_tokens: Estimated tokens of older turns that trigger
+                a summarization.
+        """
+        self.conversation_id = conversation_id
+        self.message_writer = message_writer
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.session_store = session_store
+        self.summarizer = summarizer
+        self.keep_messages = 2 * keep_turns
+        self.summary_trigger_tokens = summary_trigger_tokens
+        self.summary = ""
+        self.tts_settings: dict[str, Any] = {}
+        self.resumed = False
+        self._summary_tokens = 0
+        # Older messages waiting to be folded into the summary, then recent ones
+        self._pending: deque[HistoryEntry] = deque()
+        self._messages: deque[HistoryEntry] = deque()
+        self._tokens = 0
+        # Position of the oldest message of the history in the conversation
+        self._position = 0
+        self._pool: AsyncConnectionPool | None = None
+        self._hydrated = False
+        self._dirty = False
+        self._save_task: asyncio.Task[None] | None = None
+        self._summary_task: asyncio.Task[None] | None = None
+
+    @property
+    def messages(self) -> list[ModelMessage]:
+        """Snapshot of the conversation history, ready for the agent."""
+        messages = [entry.message for entry in self._pending]
+        messages.extend(entry.message for entry in self._messages)
+        if self.summary:
+            messages.insert(
+                0,
+                ModelRequest(
+                    parts=[
+                        SystemPromptPart(
+                            content=(
+                                "Summary of the earlier conversation: "
+                                f"{self.summary}"
+                            )
+                        )
+                    ]
+                ),
+            )
+        return messages
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the history, including the summary."""
+        return self._tokens + self._summary_tokens
+
+    async def hydrate(self, pool: AsyncConnectionPool) -> None:
+        """
+        Loads the session snapshot or, without one, the summary and the most
+        recent persisted messages. Only the first call reads the store or the
+        database, holding a pooled connection only for the read.
+
+        Args:
+            pool: Connection pool to the database.
+        """
+        if self._hydrated:
+            return
+        self._hydrated = True
+        self._pool = pool
+        if self.session_store is not None and (
+            snapshot := await self.session_store.load(self.conversation_id)
+        ):
+            for sender, content, tokens in snapshot.messages:
+                self._append(sender=sender, content=content, tokens=tokens)
+            self._set_summary(snapshot.summary)
+            self._position = snapshot.position
+            self.tts_settings = snapshot.tts
+            self.resumed = True
+            logger.info(
+                "Resumed conversation {c} from its snapshot ({n} messages)",
+                c=self.conversation_id,
+                n=len(self._pending) + len(self._messages),
+            )
+            return
+
+        async with pool.connection() as conn:
+            summary = await get_conversation_summary(
+                conn=conn, conversation_id=self.conversation_id
+            )
+            # Read only the messages after those covered by the summary
+            covered = summary[2] if summary is not None else 0
+            after_id = 0
+            if covered > 0:
+                after_id = (
+                    await get_message_id(
+                        conn=conn,
+                        conversation_id=self.conversation_id,
+                        position=covered - 1,
+                    )
+                    or 0
+                )
+            conversation_history: list[dict[str, Any]] = []
+            if covered == 0 or after_id > 0:
+                conversation_history = await get_conversation_window(
+                    conn=conn,
+                    conversation_id=self.conversation_id,
+                    max_messages=self.max_messages,
+                    estimate_tokens=estimate_tokens,
+                    max_tokens=self.max_tokens,
+                    after_id=after_id,
+                )
+            self._position = covered
+            if conversation_history:
+                self._position = await count_messages_before(
+                    conn=conn,
+                    conversation_id=self.conversation_id,
+                    message_id=conversation_history[0]["id"],
+                )
+        for msg in conversation_history:
+            self._append(
+                sender=msg["sender"],
+                content=msg["content"],
+                tokens=msg["tokens"],
+            )
+        if summary is not None:
+            self._set_summary(summary=summary[0], tokens=summary[1])
+        self.resumed = bool(conversation_history) or summary is not None
+        logger.info(
+            "Hydrated conversation {c} with {n} messages",
+            c=self.conversation_id,
+            n=len(self._pending) + len(self._messages),
+        )
+
+    def add_message(self, sender: str, content: str) -> None:
+        """
+        Queues a message for persistence and appends it to the in-memory history.
+        After an answer of the agent, older turns are summarized if needed.
+
+        Args:
+            sender: Sender of the message. (e.g., "user" or "agent")
+            content: Content of the message.
+        """
+        tokens = estimate_tokens(content)
+        self.message_writer.enqueue(
+            conversation_id=self.conversation_id,
+            sender=sender,
+            content=content,
+            tokens=tokens,
+        )
+        self._append(sender=sender, content=content, tokens=tokens)
+        if sender == "agent":
+            self._maybe_summarize()
+        self.save_snapshot()
+
+    def snapshot(self) -> SessionSnapshot:
+        """
+        Captures the current state of the session.
+
+        Returns:
+            Snapshot of the session.
+        """
+        return SessionSnapshot(
+            conversation_id=self.conversation_id,
+            messages=[
+                (entry.sender, entry.content, entry.tokens)
+                for history in (self._pending, self._messages)
+                for entry in history
+            ],
+            summary=self.summary,
+            tts=dict(self.tts_settings),
+            position=self._position,
+        )
+
+    def save_snapshot(self) -> None:
+        """
+        Saves the snapshot of the session in the background. Changes made while a
+        save is in progress are saved once it completes.
+        """
+        if self.session_store is None:
+            return
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_snapshots())
+
+    async def close(self) -> None:
+        """Waits for the summary and the snapshot being saved, if any."""
+        for task in (self._summary_task, self._save_task):
+            if task is not None:
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _save_snapshots(self) -> None:
+        """Saves snapshots until no change is left unsaved."""
+        assert self.session_store is not None
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.session_store.save(self.snapshot())
+            except psycopg.Error as e:
+                logger.warning("Failed to save session snapshot: {e}", e=e)
+                return
+
+    def _maybe_summarize(self) -> None:
+        """
+        Starts folding the older turns into the summary in the background, if
+        they reach the trigger or the history is over its budget, and no
+        summarization is in progress.
+        """
+        if self.summarizer is None or (
+            self._summary_task is not None and not self._summary_task.done()
+        ):
+            return
+        if not self._pending or (
+            sum(entry.tokens for entry in self._pending)
+            < self.summary_trigger_tokens
+            and not self._over_budget(factor=1)
+        ):
+            return
+        # Run outside the trace of the current turn
+        self._summary_task = asyncio.create_task(
+            self._summarize(), context=contextvars.Context()
+        )
+
+    async def _summarize(self) -> None:
+        """Folds the older turns into the summary and persists it."""
+        assert self.summarizer is not None
+        folded = list(self._pending)
+        try:
+            summary = await self.summarizer.summarize(
+                summary=self.summary,
+                messages=[(entry.sender, entry.content) for entry in folded],
+            )
+        except Exception as e:  # noqa: BLE001 - summaries are best effort
+            logger.warning("Failed to summarize the conversation: {e}", e=e)
+            return
+        # Older turns may have been dropped by the budget in the meantime
+        for entry in folded:
+            if self._pending and self._pending[0] is entry:
+                self._pending.popleft()
+                self._tokens -= entry.tokens
+                self._position += 1
+        self._set_summary(summary)
+        logger.info(
+            "Folded {n} messages into the summary of conversation {c}",
+            n=len(folded),
+            c=self.conversation_id,
+        )
+        self.save_snapshot()
+        if self._pool is None:
+            return
+        try:
+            async with self._pool.connection() as conn:
+                await store_conversation_summary(
+                    conn=conn,
+                    conversation_id=self.conversation_id,
+                    summary=self.summary,
+                    tokens=self._summary_tokens,
+                    messages=self._position,
+                )
+        except psycopg.Error as e:
+            logger.warning("Failed to store the summary: {e}", e=e)
+
+    def _set_summary(self, summary: str, tokens: int | None = None) -> None:
+        """
+        Replaces the summary.
+
+        Args:
+            summary: Summary of the older messages.
+            tokens: Estimated tokens of the summary, estimated if None.
+        """
+        if tokens is None:
+            tokens = estimate_tokens(summary) if summary else 0
+        self.summary = summary
+        self._summary_tokens = tokens
+
+    def _append(self, sender: str, content: str, tokens: int) -> None:
+        """
+        Appends a message to the history. When summarizing, messages beyond the
+        recent turns move to the older turns waiting to be folded. The oldest
+        messages that no longer fit in the budget are dropped, except for the
+        older turns waiting to be folded, unless they outgrow the budget twice
+        over.
+
+        Args:
+            sender: Sender of the message. (e.g., "user" or "agent")
+            content: Content of the message.
+            tokens: Estimated number of tokens of the message.
+        """
+        message = format_message_for_agent(sender=sender, content=content)
+        if message is None:
+            return
+        self._messages.append(
+            HistoryEntry(
+                sender=sender, content=content, message=message, tokens=tokens
+            )
+        )
+        self._tokens += tokens
+        if self.summarizer is not None:
+            while len(self._messages) > self.keep_messages:
+                self._pending.append(self._messages.popleft())
+        while self._over_budget(factor=1):
+            if self._pending and self.summarizer is not None:
+                if not self._over_budget(factor=2):
+                    break
+                logger.warning(
+                    "Dropping a message of conversation {c} before it was "
+                    "summarized",
+                    c=self.conversation_id,
+                )
+            history = self._pending or self._messages
+            dropped = history.popleft()
+            self._tokens -= dropped.tokens
+            self._position += 1
+
+    def _over_budget(self, factor: int) -> bool:
+        """
+        Checks whether the history holds more than one message and exceeds a
+        multiple of its message or token budget.
+
+        Args:
+            factor: Multiple of the budget.
+
+        Returns:
+            True if the history is over the budget.
+        """
+        size = len(self._pending) + len(self._messages)
+        return size > 1 and (
+            size > factor * self.max_messages
+            or self._tokens > factor * self.max_tokens
+        )
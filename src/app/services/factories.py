@@ -1,26 +1,95 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from typing import Any
+
 import aiohttp
+import groq
+import httpx
+import openai
 from groq import AsyncGroq
+from loguru import logger
 from openai import AsyncOpenAI
-from pydantic_ai.models.groq import GroqModel
+from psycopg_pool import AsyncConnectionPool
+from pydantic_ai.models import Model
+from pydantic_ai.models.groq import GroqModel, GroqModelName
 
 from app.config.settings import Settings
+from app.engine.fakes import (
+    FakeSynthesizer,
+    FakeTranscriber,
+    create_fake_model,
+)
+from app.engine.hedging import HedgedSynthesizer, HedgedTranscriber, HedgePolicy
+from app.engine.preprocessing import AudioPreprocessor
+from app.engine.scheduler import (
+    ScheduledModel,
+    ScheduledSynthesizer,
+    ScheduledTranscriber,
+    UpstreamLimiter,
+    UpstreamScheduler,
+)
+from app.engine.speech_to_text import GroqTranscriber, Transcriber
+from app.engine.text_to_speech import OpenAISynthesizer, Synthesizer
+from app.services.agent import AgentHedge
+from app.services.session_store import (
+    InMemorySessionStore,
+    PostgresSessionStore,
+    SessionStore,
+)
 
 
-def create_aiohttp_session() -> aiohttp.ClientSession:
+def create_aiohttp_session(settings: Settings) -> aiohttp.ClientSession:
     """
-    Creates a client session for making HTTP requests.
+    Creates a client session for making HTTP requests, keeping connections
+    alive between requests.
+
+    Args:
+        settings: Application settings.
 
     Returns:
         Client session for making HTTP requests.
     """
-    return aiohttp.ClientSession()
+    upstream = settings.upstream
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=upstream.max_connections,
+            keepalive_timeout=upstream.keepalive_expiry_s,
+        )
+    )
+
+
+def _http_client_options(settings: Settings) -> dict[str, Any]:
+    """
+    Options of the HTTP clients of the Groq and OpenAI APIs: connection limits,
+    keep-alive and, if the `h2` package is installed, HTTP/2.
+
+    Args:
+        settings: Application settings.
+
+    Returns:
+        Keyword arguments for the HTTP clients.
+    """
+    upstream = settings.upstream
+    http2 = upstream.http2 and find_spec("h2") is not None
+    if upstream.http2 and not http2:
+        logger.warning("HTTP/2 is disabled: the `h2` package is not installed")
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=upstream.max_connections,
+            max_keepalive_connections=upstream.max_keepalive_connections,
+            keepalive_expiry=upstream.keepalive_expiry_s,
+        ),
+    }
 
 
 def create_groq_client(
     settings: Settings,
 ) -> AsyncGroq:
     """
-    Creates a client for interacting with Groq API.
+    Creates a client for interacting with Groq API. Calls are retried by their
+    hedge policy, not by the client.
 
     Args:
         settings: Application settings.
@@ -28,14 +97,21 @@ def create_groq_client(
     Returns:
         Client for interacting with Groq API
     """
-    return AsyncGroq(api_key=settings.engine.groq_api_key)
+    return AsyncGroq(
+        api_key=settings.engine.groq_api_key,
+        max_retries=0,
+        http_client=groq.DefaultAsyncHttpxClient(
+            **_http_client_options(settings)
+        ),
+    )
 
 
 def create_openai_client(
     settings: Settings,
 ) -> AsyncOpenAI:
     """
-    Creates a client for interacting with OpenAI API.
+    Creates a client for interacting with OpenAI API. Calls are retried by
+    their hedge policy, not by the client.
 
     Args:
         settings: Application settings.
@@ -43,22 +119,296 @@ def create_openai_client(
     Returns:
         Client for interacting with OpenAI API
     """
-    return AsyncOpenAI(api_key=settings.engine.openai_api_key)
+    return AsyncOpenAI(
+        api_key=settings.engine.openai_api_key,
+        max_retries=0,
+        http_client=openai.DefaultAsyncHttpxClient(
+            **_http_client_options(settings)
+        ),
+    )
 
 
 def create_groq_model(
     groq_client: AsyncGroq,
+    model_name: GroqModelName = "llama-3.3-70b-versatile",
 ) -> GroqModel:
     """
     Creates a Groq model for PydanticAI.
 
     Args:
         groq_client: Client for interacting with Groq API.
+        model_name: Name of the Groq model.
 
     Returns:
         Groq model for PydanticAI
     """
     return GroqModel(
-        model_name="llama-3.3-70b-versatile",
+        model_name=model_name,
         groq_client=groq_client,
     )
+
+
+def create_audio_preprocessor(settings: Settings) -> AudioPreprocessor | None:
+    """
+    Creates the preprocessor that reduces the size of audio before transcription,
+    with its pool of worker processes. No pool is spawned when the preprocessor
+    is not used.
+
+    Args:
+        settings: Application settings.
+
+    Returns:
+        Audio preprocessor, or None if preprocessing is disabled or the
+        speech-to-text provider is fake.
+    """
+    if not settings.stt.preprocess or settings.providers.stt == "fake":
+        return None
+    return AudioPreprocessor(
+        executor=ProcessPoolExecutor(
+            max_workers=settings.stt.preprocess_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        ),
+        sample_rate=settings.stt.sample_rate,
+        threshold_db=settings.stt.trim_threshold_db,
+        padding_ms=settings.stt.trim_padding_ms,
+        split_min_s=settings.stt.segment_min_s,
+        segment_s=settings.stt.segment_s,
+        overlap_ms=settings.stt.segment_overlap_ms,
+    )
+
+
+def create_scheduler(settings: Settings) -> UpstreamScheduler | None:
+    """
+    Creates the scheduler admitting the calls to the upstream providers.
+
+    Args:
+        settings: Application settings.
+
+    Returns:
+        Scheduler of upstream calls, or None if it is disabled.
+    """
+    config = settings.scheduler
+    if not config.enabled:
+        return None
+    return UpstreamScheduler(
+        stt=UpstreamLimiter(
+            provider="stt",
+            max_concurrency=config.stt_concurrency,
+            requests_per_minute=config.stt_requests_per_minute,
+            max_queue=config.max_queue,
+        ),
+        llm=UpstreamLimiter(
+            provider="llm",
+            max_concurrency=config.llm_concurrency,
+            requests_per_minute=config.llm_requests_per_minute,
+            tokens_per_minute=config.llm_tokens_per_minute,
+            max_queue=config.max_queue,
+        ),
+        tts=UpstreamLimiter(
+            provider="tts",
+            max_concurrency=config.tts_concurrency,
+            requests_per_minute=config.tts_requests_per_minute,
+            tokens_per_minute=config.tts_chars_per_minute,
+            max_queue=config.max_queue,
+        ),
+    )
+
+
+def create_hedge_policy(
+    settings: Settings, stage: str, deadline_s: float, timeout_s: float
+) -> HedgePolicy:
+    """
+    Creates the deadline, hedging and retry policy of an upstream stage.
+
+    Args:
+        settings: Application settings.
+        stage: Name of the stage.
+        deadline_s: Time, in seconds, to the first byte after which a call of
+            the stage is hedged.
+        timeout_s: Time, in seconds, to the first byte after which a call of
+            the stage is abandoned and retried.
+
+    Returns:
+        Hedge policy of the stage. Its calls are only retried, never hedged, if
+        hedging is disabled.
+    """
+    config = settings.hedging
+    return HedgePolicy(
+        stage=stage,
+        deadline_s=deadline_s if config.enabled else None,
+        timeout_s=timeout_s,
+        max_ratio=config.max_ratio,
+        burst=config.burst,
+        retries=config.retries,
+        backoff_base_s=config.backoff_base_s,
+        backoff_max_s=config.backoff_max_s,
+    )
+
+
+def create_transcriber(
+    settings: Settings,
+    groq_client: AsyncGroq,
+    preprocessor: AudioPreprocessor | None = None,
+    scheduler: UpstreamScheduler | None = None,
+) -> Transcriber:
+    """
+    Creates the speech-to-text provider selected in the settings, with its
+    calls hedged, on the secondary model if one is set, and retried. Every
+    attempt is admitted by the scheduler on its own, and its deadline starts
+    once it is admitted.
+
+    Args:
+        settings: Application settings.
+        groq_client: Client for interacting with Groq API.
+        preprocessor: Reduces the size of audio before upload.
+        scheduler: Scheduler admitting the calls to the provider, if any.
+
+    Returns:
+        Speech-to-text provider.
+    """
+    policy = create_hedge_policy(
+        settings=settings,
+        stage="stt",
+        deadline_s=settings.hedging.stt_deadline_s,
+        timeout_s=settings.hedging.stt_timeout_s,
+    )
+    if settings.providers.stt != "fake":
+        # Admits and hedges each request to the API, not each utterance
+        return GroqTranscriber(
+            api_client=groq_client,
+            preprocessor=preprocessor,
+            fanout=settings.stt.segment_fanout,
+            limiter=scheduler.stt if scheduler is not None else None,
+            policy=policy,
+            secondary_model=settings.hedging.stt_model,
+        )
+    transcriber: Transcriber = FakeTranscriber(config=settings.providers)
+    if scheduler is not None:
+        transcriber = ScheduledTranscriber(
+            transcriber=transcriber, limiter=scheduler.stt
+        )
+    return HedgedTranscriber(transcriber=transcriber, policy=policy)
+
+
+def create_synthesizer(
+    settings: Settings,
+    openai_client: AsyncOpenAI,
+    scheduler: UpstreamScheduler | None = None,
+) -> Synthesizer:
+    """
+    Creates the text-to-speech provider selected in the settings, with its
+    calls hedged on their first byte, and retried. Every attempt is admitted
+    by the scheduler on its own, and its deadline starts once it is admitted.
+
+    Args:
+        settings: Application settings.
+        openai_client: Client for interacting with OpenAI API.
+        scheduler: Scheduler admitting the calls to the provider, if any.
+
+    Returns:
+        Text-to-speech provider.
+    """
+    synthesizer: Synthesizer
+    if settings.providers.tts == "fake":
+        synthesizer = FakeSynthesizer(config=settings.providers)
+    else:
+        synthesizer = OpenAISynthesizer(client=openai_client)
+    if scheduler is not None:
+        synthesizer = ScheduledSynthesizer(
+            synthesizer=synthesizer, limiter=scheduler.tts
+        )
+    return HedgedSynthesizer(
+        synthesizer=synthesizer,
+        policy=create_hedge_policy(
+            settings=settings,
+            stage="tts",
+            deadline_s=settings.hedging.tts_deadline_s,
+            timeout_s=settings.hedging.tts_timeout_s,
+        ),
+        secondary_model=(
+            settings.hedging.tts_model
+            if settings.providers.tts != "fake"
+            else None
+        ),
+    )
+
+
+def create_model(
+    settings: Settings,
+    groq_client: AsyncGroq,
+    scheduler: UpstreamScheduler | None = None,
+) -> Model:
+    """
+    Creates the language model selected in the settings.
+
+    Args:
+        settings: Application settings.
+        groq_client: Client for interacting with Groq API.
+        scheduler: Scheduler admitting the calls to the provider, if any.
+
+    Returns:
+        Model for PydanticAI.
+    """
+    model: Model
+    if settings.providers.llm == "fake":
+        model = create_fake_model(config=settings.providers)
+    else:
+        model = create_groq_model(groq_client=groq_client)
+    if scheduler is None:
+        return model
+    return ScheduledModel(model=model, limiter=scheduler.llm)
+
+
+def create_agent_hedge(
+    settings: Settings,
+    groq_client: AsyncGroq,
+    scheduler: UpstreamScheduler | None = None,
+) -> AgentHedge:
+    """
+    Creates the hedging of the agent's responses, on their first token.
+
+    Args:
+        settings: Application settings.
+        groq_client: Client for interacting with Groq API.
+        scheduler: Scheduler admitting the calls to the provider, if any.
+
+    Returns:
+        Hedging of the agent's responses.
+    """
+    model: Model | None = None
+    if settings.hedging.llm_model and settings.providers.llm != "fake":
+        model = create_groq_model(
+            groq_client=groq_client, model_name=settings.hedging.llm_model
+        )
+        if scheduler is not None:
+            model = ScheduledModel(model=model, limiter=scheduler.llm)
+    return AgentHedge(
+        policy=create_hedge_policy(
+            settings=settings,
+            stage="llm",
+            deadline_s=settings.hedging.llm_deadline_s,
+            timeout_s=settings.hedging.llm_timeout_s,
+        ),
+        model=model,
+    )
+
+
+def create_session_store(
+    settings: Settings,
+    pool: AsyncConnectionPool,
+) -> SessionStore:
+    """
+    Creates the session store selected in the settings.
+
+    Args:
+        settings: Application settings.
+        pool: Connection pool to the database.
+
+    Returns:
+        Store of session snapshots.
+    """
+    if settings.session.store == "memory":
+        return InMemorySessionStore(
+            max_entries=settings.session.memory_max_entries
+        )
+    return PostgresSessionStore(pool=pool)
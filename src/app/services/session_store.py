@@ -0,0 +1,201 @@
+import json
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from psycopg_pool import AsyncConnectionPool
+from pydantic import UUID4
+
+from app.database.actions import get_session_snapshot, store_session_snapshot
+
+# Version of the serialized format, bumped on incompatible changes
+SNAPSHOT_VERSION = 3
+
+
+@dataclass
+class SessionSnapshot:
+    """
+    Compact state of a session, enough to resume it on any worker.
+
+    Attributes:
+        conversation_id: Unique identifier for the conversation.
+        messages: Window of recent messages, as (sender, content, tokens)
+            triples, oldest first.
+        summary: Summary of the messages older than the window.
+        tts: Text-to-speech settings of the session.
+        position: Position of the window in the conversation, i.e. number of
+            older messages, summarized or dropped.
+    """
+
+    conversation_id: UUID4
+    messages: list[tuple[str, str, int]] = field(default_factory=list)
+    summary: str = ""
+    tts: dict[str, Any] = field(default_factory=dict)
+    position: int = 0
+
+    def encode(self) -> bytes:
+        """
+        Serializes the snapshot as compressed JSON.
+
+        Returns:
+            Serialized snapshot.
+        """
+        payload = {
+            "v": SNAPSHOT_VERSION,
+            "m": self.messages,
+            "s": self.summary,
+            "t": self.tts,
+            "p": self.position,
+        }
+        return zlib.compress(
+            json.dumps(payload, separators=(",", ":")).encode()
+        )
+
+    @classmethod
+    def decode(
+        cls, conversation_id: UUID4, data: bytes
+    ) -> "SessionSnapshot | None":
+        """
+        Deserializes a snapshot.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+            data: Serialized snapshot.
+
+        Returns:
+            The snapshot, or None if it was serialized in another version.
+        """
+        payload = json.loads(zlib.decompress(data))
+        if payload.get("v") != SNAPSHOT_VERSION:
+            return None
+        return cls(
+            conversation_id=conversation_id,
+            messages=[
+                (sender, content, tokens)
+                for sender, content, tokens in payload["m"]
+            ],
+            summary=payload["s"],
+            tts=payload["t"],
+            position=payload["p"],
+        )
+
+
+class SessionStore(Protocol):
+    """Store of session snapshots."""
+
+    async def load(self, conversation_id: UUID4) -> SessionSnapshot | None:
+        """
+        Loads the snapshot of a session.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+
+        Returns:
+            The snapshot, or None if there is none.
+        """
+        ...
+
+    async def save(self, snapshot: SessionSnapshot) -> None:
+        """
+        Saves the snapshot of a session, replacing the previous one.
+
+        Args:
+            snapshot: Snapshot of the session.
+        """
+        ...
+
+
+class PostgresSessionStore:
+    """
+    Session store shared by every worker, in the `session_snapshots` table. Each
+    load or save is a single query on its own pooled connection.
+    """
+
+    def __init__(self, pool: AsyncConnectionPool) -> None:
+        """
+        Initializes the PostgresSessionStore object.
+
+        Args:
+            pool: Connection pool to the database.
+        """
+        self.pool = pool
+
+    async def load(self, conversation_id: UUID4) -> SessionSnapshot | None:
+        """
+        Loads the snapshot of a session.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+
+        Returns:
+            The snapshot, or None if there is none.
+        """
+        async with self.pool.connection() as conn:
+            data = await get_session_snapshot(
+                conn=conn, conversation_id=conversation_id
+            )
+        if data is None:
+            return None
+        return SessionSnapshot.decode(
+            conversation_id=conversation_id, data=data
+        )
+
+    async def save(self, snapshot: SessionSnapshot) -> None:
+        """
+        Saves the snapshot of a session, replacing the previous one.
+
+        Args:
+            snapshot: Snapshot of the session.
+        """
+        async with self.pool.connection() as conn:
+            await store_session_snapshot(
+                conn=conn,
+                conversation_id=snapshot.conversation_id,
+                snapshot=snapshot.encode(),
+            )
+
+
+class InMemorySessionStore:
+    """
+    Local stand-in for the shared session store, for a single worker. Keeps the
+    serialized snapshots of the `max_entries` most recently saved sessions.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        """
+        Initializes the InMemorySessionStore object.
+
+        Args:
+            max_entries: Maximum number of snapshots kept.
+        """
+        self.max_entries = max_entries
+        self._snapshots: OrderedDict[UUID4, bytes] = OrderedDict()
+
+    async def load(self, conversation_id: UUID4) -> SessionSnapshot | None:
+        """
+        Loads the snapshot of a session.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+
+        Returns:
+            The snapshot, or None if there is none.
+        """
+        if (data := self._snapshots.get(conversation_id)) is None:
+            return None
+        return SessionSnapshot.decode(
+            conversation_id=conversation_id, data=data
+        )
+
+    async def save(self, snapshot: SessionSnapshot) -> None:
+        """
+        Saves the snapshot of a session, replacing the previous one.
+
+        Args:
+            snapshot: Snapshot of the session.
+        """
+        self._snapshots[snapshot.conversation_id] = snapshot.encode()
+        self._snapshots.move_to_end(snapshot.conversation_id)
+        while len(self._snapshots) > self.max_entries:
+            self._snapshots.popitem(last=False)
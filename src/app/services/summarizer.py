@@ -0,0 +1,74 @@
+from time import perf_counter
+
+from pydantic_ai import Agent
+from pydantic_ai.models import Model
+
+from app.engine.priority import Priority, upstream_priority
+from app.telemetry.metrics import SUMMARIES
+from app.telemetry.tracing import record_stage
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a spoken conversation between a user "
+    "and an assistant. Given the current summary and the next messages, write "
+    "the updated summary. Keep the facts, names, preferences, decisions and "
+    "open questions the assistant needs to continue the conversation; drop "
+    "small talk. "
+    "Answer only with the summary, in at most {max_words} words."
+)
+
+
+class Summarizer:
+    """
+    Folds older messages of a conversation into a rolling summary, with a
+    dedicated agent that has no tools.
+    """
+
+    def __init__(self, model: Model, max_words: int = 200) -> None:
+        """
+        Initializes the Summarizer object.
+
+        Args:
+            model: Model for PydanticAI.
+            max_words: Maximum length of the summary, in words.
+        """
+        self.agent: Agent[None] = Agent(
+            model=model,
+            system_prompt=SUMMARY_PROMPT.format(max_words=max_words),
+        )
+
+    async def summarize(
+        self, summary: str, messages: list[tuple[str, str]]
+    ) -> str:
+        """
+        Folds messages into the summary, with background priority. The duration
+        is recorded as the `summarize` stage.
+
+        Args:
+            summary: Current summary, possibly empty.
+            messages: Messages to fold, as (sender, content) pairs, oldest
+                first.
+
+        Returns:
+            The updated summary.
+        """
+        transcript = "\n".join(
+            f"{sender}: {content}" for sender, content in messages
+        )
+        prompt = (
+            f"Current summary:\n{summary or '(empty)'}\n\n"
+            f"Next messages:\n{transcript}"
+        )
+        start = perf_counter()
+        token = upstream_priority.set(Priority.BACKGROUND)
+        try:
+            # Streamed, as some models (e.g., the fake one) only stream
+            async with self.agent.run_stream(user_prompt=prompt) as result:
+                updated = await result.get_data()
+        except Exception:
+            SUMMARIES.labels("failed").inc()
+            raise
+        finally:
+            upstream_priority.reset(token)
+        record_stage(stage="summarize", duration=perf_counter() - start)
+        SUMMARIES.labels("folded").inc()
+        return updated.strip()
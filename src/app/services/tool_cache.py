@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import json
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any
+
+from app.telemetry.metrics import TOOL_CACHE_REQUESTS
+
+
+@dataclass
+class ToolCacheStats:
+    """
+    Lookups in the tool cache of one tool.
+
+    Attributes:
+        hits: Calls answered from the cache.
+        misses: Calls that ran the tool.
+        coalesced: Calls that waited for an identical call already in flight.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+
+
+class ToolCache:
+    """
+    Cache of tool results shared by every session, with single-flight.
+
+    Results are keyed on the tool and its arguments and expire after the TTL of
+    the tool. Identical calls made while the tool is running wait for the same
+    result instead of calling it again, and the call keeps running if the turn
+    that started it is cancelled. Errors are not cached. At most `max_entries`
+    results are kept, evicting the least recently used.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """
+        Initializes the ToolCache object.
+
+        Args:
+            max_entries: Maximum number of cached results.
+        """
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Task[Any]] = {}
+        self.stats: dict[str, ToolCacheStats] = {}
+
+    def wrap[**P, R](
+        self,
+        function: Callable[P, Awaitable[R]],
+        ttl: float,
+        takes_ctx: bool = True,
+    ) -> Callable[P, Awaitable[R]]:
+        """
+        Wraps a tool function so that its results are cached. The wrapper keeps
+        the signature and docstring of the function, from which PydanticAI
+        builds the tool schema.
+
+        Args:
+            function: Tool function.
+            ttl: Time, in seconds, a result stays cached.
+            takes_ctx: Whether the first argument is the run context, which is
+                not part of the key.
+
+        Returns:
+            The wrapped tool function.
+        """
+        name = function.__name__
+
+        @functools.wraps(function)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            key_args = args[1:] if takes_ctx else args
+            key = json.dumps(
+                [name, key_args, kwargs], sort_keys=True, default=str
+            )
+            return await self.get_or_call(
+                tool=name,
+                key=key,
+                ttl=ttl,
+                call=lambda: function(*args, **kwargs),
+            )
+
+        return wrapper
+
+    async def get_or_call[R](
+        self,
+        tool: str,
+        key: str,
+        ttl: float,
+        call: Callable[[], Awaitable[R]],
+    ) -> R:
+        """
+        Returns the cached result of a key, or the result of `call`, which is
+        then cached.
+
+        Args:
+            tool: Name of the tool.
+            key: Key of the call.
+            ttl: Time, in seconds, a result stays cached.
+            call: Runs the tool.
+
+        Returns:
+            Result of the tool.
+        """
+        stats = self.stats.setdefault(tool, ToolCacheStats())
+        if (entry := self._entries.get(key)) is not None:
+            expires, result = entry
+            if expires > monotonic():
+                self._entries.move_to_end(key)
+                stats.hits += 1
+                TOOL_CACHE_REQUESTS.labels(tool, "hit").inc()
+                return result
+            del self._entries[key]
+
+        if (task := self._in_flight.get(key)) is not None:
+            stats.coalesced += 1
+            TOOL_CACHE_REQUESTS.labels(tool, "coalesced").inc()
+            return await asyncio.shield(task)
+
+        stats.misses += 1
+        TOOL_CACHE_REQUESTS.labels(tool, "miss").inc()
+        task = asyncio.create_task(self._run(key=key, ttl=ttl, call=call))
+        # The error is retrieved even if every caller was cancelled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _run[R](
+        self, key: str, ttl: float, call: Callable[[], Awaitable[R]]
+    ) -> R:
+        """
+        Runs a tool and caches its result.
+
+        Args:
+            key: Key of the call.
+            ttl: Time, in seconds, the result stays cached.
+            call: Runs the tool.
+
+        Returns:
+            Result of the tool.
+        """
+        try:
+            result = await call()
+        finally:
+            del self._in_flight[key]
+        self._entries[key] = (monotonic() + ttl, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
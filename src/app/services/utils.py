@@ -7,6 +7,37 @@ from pydantic_ai.messages import (
 )
 
 
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text, at roughly four characters per token.
+
+    Args:
+        text: Text to estimate.
+
+    Returns:
+        Estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+
+def format_message_for_agent(sender: str, content: str) -> ModelMessage | None:
+    """
+    Format a single stored message for the PydanticAI agent.
+
+    Args:
+        sender: Sender of the message. (e.g., "user" or "agent")
+        content: Content of the message.
+
+    Returns:
+        ModelMessage object, or None if the sender is unknown.
+    """
+    if sender == "user":
+        return ModelRequest(parts=[UserPromptPart(content=content)])
+    elif sender == "agent":
+        return ModelResponse(parts=[TextPart(content=content)])
+    return None
+
+
 def format_messages_for_agent(
     conversation_history: list[dict[str, str]],
 ) -> list[ModelMessage]:
@@ -21,14 +52,9 @@ def format_messages_for_agent(
     """
     messages: list[ModelMessage] = []
     for msg in conversation_history:
-        if msg["sender"] == "user":
-            messages.append(
-                ModelRequest(parts=[UserPromptPart(content=msg["content"])])
-            )
-        elif msg["sender"] == "agent":
-            messages.append(
-                ModelResponse(parts=[TextPart(content=msg["content"])])
-            )
-        else:
-            continue
+        message = format_message_for_agent(
+            sender=msg["sender"], content=msg["content"]
+        )
+        if message is not None:
+            messages.append(message)
     return messages
@@ -0,0 +1,142 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from time import perf_counter
+
+import aiohttp
+from groq import AsyncGroq
+from loguru import logger
+from openai import AsyncOpenAI
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from app.config.settings import Settings
+from app.telemetry.metrics import WARMUP_SECONDS
+
+WEATHERSTACK_URL = "http://api.weatherstack.com/"
+
+
+class Warmup:
+    """
+    Startup warmup of the shared resources, run in the background.
+
+    It fills the database connection pool up to its minimum size and opens
+    keep-alive connections to each upstream API used by the selected providers,
+    so the first turns served by a new worker do not pay for connection setup
+    and TLS handshakes. The worker is ready once the warmup completes. A failure
+    to warm up an upstream API is logged and does not delay readiness, but the
+    database pool is retried until it is filled.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        pool: AsyncConnectionPool,
+        aiohttp_session: aiohttp.ClientSession,
+        groq_client: AsyncGroq,
+        openai_client: AsyncOpenAI,
+    ) -> None:
+        """
+        Initializes the Warmup object.
+
+        Args:
+            settings: Application settings.
+            pool: Connection pool to the database.
+            aiohttp_session: Client session for making HTTP requests.
+            groq_client: Client for interacting with Groq API.
+            openai_client: Client for interacting with OpenAI API.
+        """
+        self.settings = settings
+        self.pool = pool
+        self.aiohttp_session = aiohttp_session
+        self.groq_client = groq_client
+        self.openai_client = openai_client
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the warmup has completed."""
+        return self._ready.is_set()
+
+    def start(self) -> None:
+        """Starts the warmup, or marks the worker as ready if it is disabled."""
+        if not self.settings.upstream.warmup:
+            self._ready.set()
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Cancels the warmup if it is still running."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        """Warms up every resource concurrently, then marks the worker ready."""
+        start = perf_counter()
+        providers = self.settings.providers
+        warmups: dict[str, Callable[[], Awaitable[object]]] = {}
+        if "groq" in (providers.stt, providers.llm):
+            warmups["groq"] = self.groq_client.models.list
+        if providers.llm == "groq":
+            warmups["weatherstack"] = self._open_weatherstack
+        if providers.tts == "openai":
+            warmups["openai"] = self.openai_client.models.list
+        await asyncio.gather(
+            self._fill_pool(),
+            *(
+                self._warm(resource=resource, request=request)
+                for resource, request in warmups.items()
+            ),
+        )
+        self._ready.set()
+        logger.info(
+            "Warmup completed in {t:.2f}s: ready", t=perf_counter() - start
+        )
+
+    async def _fill_pool(self) -> None:
+        """Waits for the database pool to open its minimum connections."""
+        start = perf_counter()
+        while True:
+            try:
+                await self.pool.wait(
+                    timeout=self.settings.upstream.warmup_timeout_s
+                )
+                break
+            except PoolTimeout as e:
+                logger.warning("Database pool not filled yet: {e}", e=e)
+                await asyncio.sleep(1.0)
+        WARMUP_SECONDS.labels("database").set(perf_counter() - start)
+
+    async def _warm(
+        self, resource: str, request: Callable[[], Awaitable[object]]
+    ) -> None:
+        """
+        Opens keep-alive connections to an upstream API with concurrent
+        requests.
+
+        Args:
+            resource: Name of the upstream API.
+            request: Cheap request to the upstream API.
+        """
+        start = perf_counter()
+        try:
+            async with asyncio.timeout(self.settings.upstream.warmup_timeout_s):
+                await asyncio.gather(
+                    *(
+                        request()
+                        for _ in range(
+                            self.settings.upstream.warmup_connections
+                        )
+                    )
+                )
+        except Exception as e:  # noqa: BLE001 - warmup is best effort
+            logger.warning("Failed to warm up {r}: {e}", r=resource, e=e)
+            return
+        WARMUP_SECONDS.labels(resource).set(perf_counter() - start)
+
+    async def _open_weatherstack(self) -> None:
+        """Opens a keep-alive connection to the Weatherstack API."""
+        async with self.aiohttp_session.head(WEATHERSTACK_URL) as response:
+            await response.read()
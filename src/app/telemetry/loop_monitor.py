@@ -0,0 +1,182 @@
+import asyncio
+import sys
+import threading
+import traceback
+from dataclasses import dataclass
+from time import monotonic
+
+from loguru import logger
+
+from app.config.loop_monitor import LoopMonitorConfig
+from app.telemetry.metrics import LOOP_LAG, LOOP_STALLS
+from app.telemetry.tracing import current_stage
+
+
+@dataclass
+class _Stall:
+    """
+    Event loop caught blocked by the watchdog.
+
+    Attributes:
+        heartbeat: Heartbeat of the loop before the stall.
+        stack: Stack of the loop thread during the stall.
+        task: Task running during the stall, if any.
+        stage: Pipeline stage running during the stall, if attributed.
+    """
+
+    heartbeat: float
+    stack: str
+    task: str | None
+    stage: str | None
+
+
+class LoopMonitor:
+    """
+    Monitor of the health of the event loop, which runs every session.
+
+    A task on the loop sleeps for `interval_s` in a loop, and observes how late
+    it wakes up in the `v2v_event_loop_lag_seconds` histogram: the time any
+    callback waits for the loop. A watchdog thread checks that the task keeps
+    running; when the loop is late by more than `slow_callback_s`, it captures
+    the stack of the loop thread, i.e. of the callback blocking it. Once the
+    loop runs again, the stall is logged with that stack and observed in the
+    `v2v_event_loop_stall_seconds` histogram.
+
+    In debug mode, stalls are also attributed to the pipeline stage running at
+    the time (see `current_stage`), and asyncio's debug mode logs every
+    callback slower than `slow_callback_s`.
+    """
+
+    def __init__(self, config: LoopMonitorConfig) -> None:
+        """
+        Initializes the LoopMonitor object.
+
+        Args:
+            config: Event loop monitor configuration.
+        """
+        self.config = config
+        self._heartbeat = monotonic()
+        self._stall: _Stall | None = None
+        self._stop = threading.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop, if enabled."""
+        if not self.config.enabled or self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if self.config.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.config.slow_callback_s
+        self._heartbeat = monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(
+            target=self._watch,
+            args=(loop, threading.get_ident()),
+            name="loop-watchdog",
+            daemon=True,
+        )
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        """Stops monitoring the event loop."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        """Samples the scheduling lag of the loop, and reports its stalls."""
+        interval = self.config.interval_s
+        while True:
+            heartbeat = self._heartbeat
+            await asyncio.sleep(interval)
+            self._heartbeat = monotonic()
+            lag = max(0.0, self._heartbeat - heartbeat - interval)
+            LOOP_LAG.observe(lag)
+            if lag >= self.config.slow_callback_s:
+                self._report(lag=lag, heartbeat=heartbeat)
+
+    def _report(self, lag: float, heartbeat: float) -> None:
+        """
+        Reports a stall of the loop, with the stack captured by the watchdog.
+
+        Args:
+            lag: Duration of the stall, in seconds.
+            heartbeat: Heartbeat of the loop before the stall.
+        """
+        stall, self._stall = self._stall, None
+        if stall is None or stall.heartbeat != heartbeat:
+            # Too short for the watchdog, or made of many shorter callbacks
+            stall = _Stall(
+                heartbeat=heartbeat,
+                stack="(not captured)",
+                task=None,
+                stage=None,
+            )
+        stage = stall.stage or "unknown"
+        LOOP_STALLS.labels(stage).observe(lag)
+        logger.bind(
+            lag=round(lag, 4), task=stall.task, stage=stall.stage
+        ).warning(
+            "Event loop blocked for {l:.3f}s (stage: {s}, task: {t}), "
+            "blocking callback:\n{stack}",
+            l=lag,
+            s=stage,
+            t=stall.task,
+            stack=stall.stack,
+        )
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, thread_id: int) -> None:
+        """
+        Checks that the loop keeps running, and captures the stack of the loop
+        thread when it is blocked. Runs in the watchdog thread.
+
+        Args:
+            loop: Monitored event loop.
+            thread_id: Identifier of the thread running the loop.
+        """
+        late = self.config.interval_s + self.config.slow_callback_s
+        while not self._stop.wait(self.config.slow_callback_s / 4):
+            heartbeat = self._heartbeat
+            if monotonic() - heartbeat < late or (
+                self._stall is not None and self._stall.heartbeat == heartbeat
+            ):
+                continue
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            stack = "".join(
+                traceback.format_stack(frame, limit=self.config.stack_limit)
+            )
+            task = asyncio.current_task(loop)
+            stage = None
+            if self.config.debug and task is not None:
+                stage = task.get_context().get(current_stage)
+            self._stall = _Stall(
+                heartbeat=heartbeat,
+                stack=stack,
+                task=None if task is None else describe_task(task),
+                stage=stage,
+            )
+
+
+def describe_task(task: asyncio.Task[object]) -> str:
+    """
+    Describes a task for the logs.
+
+    Args:
+        task: Task to describe.
+
+    Returns:
+        Name of the task and of its coroutine.
+    """
+    coro = task.get_coro()
+    name = getattr(coro, "__qualname__", type(coro).__name__)
+    return f"{task.get_name()} ({name})"
@@ -0,0 +1,218 @@
+from prometheus_client import Counter, Gauge, Histogram
+from psycopg_pool import AsyncConnectionPool
+
+# Buckets, in seconds, for stages that range from cache hits to slow upstreams
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    1.5,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+# Buckets, in seconds, for the scheduling lag of the event loop
+LOOP_LAG_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+STAGE_DURATION = Histogram(
+    "v2v_stage_duration_seconds",
+    "Duration of each stage of a turn.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_AUDIO = Histogram(
+    "v2v_time_to_first_audio_seconds",
+    "Time from the end of the user's utterance to the first audio sent back.",
+    buckets=LATENCY_BUCKETS,
+)
+TURN_DURATION = Histogram(
+    "v2v_turn_duration_seconds",
+    "Total duration of a turn.",
+    buckets=LATENCY_BUCKETS,
+)
+TURNS = Counter(
+    "v2v_turns_total",
+    "Number of turns, by outcome.",
+    ["outcome"],
+)
+AUDIO_BYTES_IN = Counter(
+    "v2v_audio_bytes_in_total",
+    "Audio bytes received from clients.",
+)
+AUDIO_BYTES_OUT = Counter(
+    "v2v_audio_bytes_out_total",
+    "Audio bytes sent to clients.",
+)
+OUTBOUND_FRAMES = Counter(
+    "v2v_outbound_frames_total",
+    "Audio frames sent to clients, after coalescing.",
+)
+SLOW_CONSUMERS = Counter(
+    "v2v_slow_consumers_total",
+    "Clients disconnected because they could not keep up with the audio.",
+)
+UPSTREAM_ERRORS = Counter(
+    "v2v_upstream_errors_total",
+    "Errors raised by upstream providers, by stage.",
+    ["stage"],
+)
+STT_UPLOAD_BYTES = Counter(
+    "v2v_stt_upload_bytes_total",
+    "Audio bytes received for transcription and uploaded after preprocessing.",
+    ["stage"],
+)
+STT_SEGMENTS = Counter(
+    "v2v_stt_segments_total",
+    "Audio segments transcribed, long utterances being split in several.",
+)
+TTS_CACHE_REQUESTS = Counter(
+    "v2v_tts_cache_requests_total",
+    "Lookups in the synthesized audio cache, by result.",
+    ["result"],
+)
+TOOL_CACHE_REQUESTS = Counter(
+    "v2v_tool_cache_requests_total",
+    "Lookups in the tool result cache, by tool and result.",
+    ["tool", "result"],
+)
+SPECULATIONS = Counter(
+    "v2v_speculations_total",
+    "Speculative responses, by result: started, committed when the utterance "
+    "ended without further speech, or discarded.",
+    ["result"],
+)
+SPECULATION_WASTED_TOKENS = Counter(
+    "v2v_speculation_wasted_tokens_total",
+    "Estimated tokens generated by discarded speculative responses.",
+)
+SUMMARIES = Counter(
+    "v2v_summaries_total",
+    "Background summarizations of older messages, by result.",
+    ["result"],
+)
+HISTORY_TOKENS = Histogram(
+    "v2v_history_tokens",
+    "Estimated tokens of the conversation history sent with each turn.",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+WARMUP_SECONDS = Gauge(
+    "v2v_warmup_seconds",
+    "Time taken to warm up each resource at startup.",
+    ["resource"],
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "v2v_upstream_queue_depth",
+    "Calls waiting to be admitted, by upstream provider.",
+    ["provider"],
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "v2v_upstream_in_flight",
+    "Calls in flight, by upstream provider.",
+    ["provider"],
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "v2v_upstream_queue_wait_seconds",
+    "Time calls wait to be admitted, by upstream provider and priority.",
+    ["provider", "priority"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_HEDGES = Counter(
+    "v2v_upstream_hedges_total",
+    "Hedged duplicates of slow upstream calls, by stage and result: started, "
+    "capped by the hedge budget, won or lost against the original call.",
+    ["stage", "result"],
+)
+UPSTREAM_RETRIES = Counter(
+    "v2v_upstream_retries_total",
+    "Retries of upstream calls after a transient error, by stage.",
+    ["stage"],
+)
+RECORDED_BYTES = Counter(
+    "v2v_recorded_bytes_total",
+    "Bytes of session recordings written.",
+)
+LOOP_LAG = Histogram(
+    "v2v_event_loop_lag_seconds",
+    "Delay of the event loop in running a callback scheduled on time, sampled "
+    "continuously.",
+    buckets=LOOP_LAG_BUCKETS,
+)
+LOOP_STALLS = Histogram(
+    "v2v_event_loop_stall_seconds",
+    "Duration of the stalls of the event loop longer than the slow callback "
+    "threshold, by pipeline stage (`unknown` outside debug mode).",
+    ["stage"],
+    buckets=LOOP_LAG_BUCKETS,
+)
+SESSIONS_REJECTED = Counter(
+    "v2v_sessions_rejected_total",
+    "New sessions rejected because the upstream queues are saturated.",
+)
+ACTIVE_SESSIONS = Gauge(
+    "v2v_active_sessions",
+    "Number of open websocket sessions.",
+)
+DB_POOL = Gauge(
+    "v2v_db_pool_connections",
+    "Database connection pool statistics.",
+    ["stat"],
+)
+MESSAGES_DROPPED = Counter(
+    "v2v_messages_dropped_total",
+    "Messages dropped without being stored, by reason: queue full, rejected by "
+    "the database, out of retries or shutdown.",
+    ["reason"],
+)
+DB_POOL_REQUESTS = Counter(
+    "v2v_db_pool_requests_total",
+    "Connection requests to the database pool, by result.",
+    ["result"],
+)
+DB_POOL_WAIT = Counter(
+    "v2v_db_pool_wait_seconds_total",
+    "Time spent waiting for a connection from the database pool.",
+)
+
+
+def update_pool_metrics(pool: AsyncConnectionPool) -> None:
+    """
+    Copies the current statistics of the database connection pool to the
+    `v2v_db_pool_connections` gauge, and adds the requests and waiting time since
+    the previous call to the pool counters.
+
+    Args:
+        pool: Connection pool to the database.
+    """
+    stats = pool.pop_stats()
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    DB_POOL.labels("size").set(size)
+    DB_POOL.labels("available").set(available)
+    DB_POOL.labels("in_use").set(size - available)
+    DB_POOL.labels("waiting").set(stats.get("requests_waiting", 0))
+    DB_POOL.labels("max").set(stats.get("pool_max", 0))
+    requests = stats.get("requests_num", 0)
+    errors = stats.get("requests_errors", 0)
+    DB_POOL_REQUESTS.labels("served").inc(requests - errors)
+    DB_POOL_REQUESTS.labels("queued").inc(stats.get("requests_queued", 0))
+    DB_POOL_REQUESTS.labels("failed").inc(errors)
+    DB_POOL_WAIT.inc(stats.get("requests_wait_ms", 0) / 1000)
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import mmap
+import struct
+from collections.abc import Iterator
+from contextlib import suppress
+from contextvars import ContextVar
+from enum import IntEnum
+from pathlib import Path
+from time import perf_counter, time
+from types import TracebackType
+from typing import Any, BinaryIO, NamedTuple, Self
+
+from loguru import logger
+from pydantic import UUID4
+
+from app.telemetry.metrics import RECORDED_BYTES
+
+MAGIC = b"V2VREC"
+FORMAT_VERSION = 1
+# Magic, format version and wall-clock start time of the session
+FILE_HEADER = struct.Struct("<6sHd")
+# Kind, time since the start of the session and payload size of a record
+RECORD_HEADER = struct.Struct("<BdI")
+# Turn number, sequence number and size of an outbound audio frame
+AUDIO_OUT = struct.Struct("<III")
+
+
+class RecordKind(IntEnum):
+    """
+    Kind of a record. Payloads are raw audio (`TURN`), UTF-8 text
+    (`TRANSCRIPT`, `LLM_DELTA`), packed integers (`AUDIO_OUT`) or compact JSON.
+    """
+
+    # Session metadata: conversation ID, ingestion mode and output settings
+    SESSION = 1
+    # Start of a turn, with the audio of the utterance
+    TURN = 2
+    # Transcript of the utterance
+    TRANSCRIPT = 3
+    # Start of the language model request
+    LLM_START = 4
+    # Text delta of the language model
+    LLM_DELTA = 5
+    # Tool call of the agent: tool name, arguments and result
+    TOOL_CALL = 6
+    # Text-to-speech request: text, time to first byte and chunk timings
+    TTS = 7
+    # Audio frame sent to the client
+    AUDIO_OUT = 8
+    # End of a turn, with its outcome and stage timings
+    TURN_END = 9
+
+
+class Record(NamedTuple):
+    """
+    Record of a session recording.
+
+    Attributes:
+        kind: Kind of the record.
+        timestamp: Time since the start of the session, in seconds.
+        payload: Payload of the record, a view on the recording.
+    """
+
+    kind: RecordKind
+    timestamp: float
+    payload: memoryview
+
+    def text(self) -> str:
+        """Payload decoded as UTF-8 text."""
+        return bytes(self.payload).decode()
+
+    def json(self) -> Any:
+        """Payload decoded as JSON."""
+        return json.loads(bytes(self.payload))
+
+
+class SessionRecorder:
+    """
+    Append-only recording of a session, for offline replay.
+
+    Records are encoded on the event loop into a buffer, which is appended to
+    the file in a worker thread once it holds `flush_bytes`, so recording never
+    blocks the loop on disk. Recording stops, with a warning, once the file
+    reaches `max_bytes`.
+
+    The file starts with a header (magic, format version and wall-clock start
+    time), followed by records: kind, time since the start of the session,
+    payload size and payload. See `SessionRecording` to read it.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        flush_bytes: int = 64 * 1024,
+    ) -> None:
+        """
+        Initializes the SessionRecorder object.
+
+        Args:
+            path: Path of the recording.
+            max_bytes: Maximum size of the recording.
+            flush_bytes: Size of the buffer appended to the file at once.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_bytes = flush_bytes
+        self.start = perf_counter()
+        self._buffer = bytearray(
+            FILE_HEADER.pack(MAGIC, FORMAT_VERSION, time())
+        )
+        self._size = len(self._buffer)
+        self._file: BinaryIO | None = None
+        self._flush_task: asyncio.Task[None] | None = None
+        self._stopped = False
+
+    def record(self, kind: RecordKind, payload: bytes | str | Any) -> None:
+        """
+        Appends a record, timestamped now.
+
+        Args:
+            kind: Kind of the record.
+            payload: Bytes, text encoded as UTF-8, or any other value encoded
+                as JSON.
+        """
+        if self._stopped:
+            return
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif not isinstance(payload, bytes | bytearray | memoryview):
+            payload = json.dumps(
+                payload, separators=(",", ":"), default=str
+            ).encode()
+        size = RECORD_HEADER.size + len(payload)
+        if self._size + size > self.max_bytes:
+            self._stopped = True
+            logger.warning("Recording {p} is full, stopping", p=self.path)
+            return
+        self._buffer += RECORD_HEADER.pack(
+            kind, perf_counter() - self.start, len(payload)
+        )
+        self._buffer += payload
+        self._size += size
+        RECORDED_BYTES.inc(size)
+        if len(self._buffer) >= self.flush_bytes and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def close(self) -> None:
+        """
+        Appends the buffered records and closes the file. Later records are
+        ignored.
+        """
+        self._stopped = True
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self._flush()
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+        logger.info(
+            "Recorded {n} bytes of session to {p}", n=self._size, p=self.path
+        )
+
+    async def _flush(self) -> None:
+        """Appends the buffered records to the file, until none is left."""
+        while self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            try:
+                await asyncio.to_thread(self._write, data)
+            except OSError as e:
+                logger.warning("Failed to write recording: {e}", e=e)
+                self._stopped = True
+                return
+
+    def _write(self, data: bytes) -> None:
+        """
+        Appends data to the file, opening it first if needed. Runs in a worker
+        thread.
+
+        Args:
+            data: Data to append.
+        """
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("ab")
+        self._file.write(data)
+        self._file.flush()
+
+
+class SessionRecording:
+    """
+    Reader of a session recording. The file is memory-mapped, so large
+    recordings are read lazily and payloads are views, not copies.
+
+    Usable as a context manager, which closes the mapping.
+
+    Attributes:
+        started_at: Wall-clock start time of the session, as a Unix timestamp.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Initializes the SessionRecording object.
+
+        Args:
+            path: Path of the recording.
+
+        Raises:
+            ValueError: If the file is not a recording of a supported version.
+        """
+        self.path = path
+        with path.open("rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if len(self._view) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a session recording")
+        magic, version, self.started_at = FILE_HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a session recording")
+
+    def __iter__(self) -> Iterator[Record]:
+        """
+        Iterates over the records, in order. A record truncated by a crash is
+        ignored.
+
+        Yields:
+            The records of the session.
+        """
+        offset = FILE_HEADER.size
+        end = len(self._view)
+        while offset + RECORD_HEADER.size <= end:
+            kind, timestamp, size = RECORD_HEADER.unpack_from(
+                self._view, offset
+            )
+            offset += RECORD_HEADER.size
+            if offset + size > end:
+                return
+            yield Record(
+                kind=RecordKind(kind),
+                timestamp=timestamp,
+                payload=self._view[offset : offset + size],
+            )
+            offset += size
+
+    def close(self) -> None:
+        """
+        Releases the mapping. It is closed once the payloads of the records
+        still referenced are released too.
+        """
+        self._view.release()
+        with suppress(BufferError):
+            self._map.close()
+
+    def __enter__(self) -> Self:
+        """
+        Enters the context manager.
+
+        Returns:
+            The SessionRecording instance.
+        """
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        """Exits the context manager, closing the mapping."""
+        self.close()
+
+
+def create_recorder(
+    directory: Path, conversation_id: UUID4, max_bytes: int
+) -> SessionRecorder:
+    """
+    Creates the recorder of a new session, in a file named after the
+    conversation and the start time.
+
+    Args:
+        directory: Directory of the recordings.
+        conversation_id: Unique identifier for the conversation.
+        max_bytes: Maximum size of the recording.
+
+    Returns:
+        Recorder of the session.
+    """
+    return SessionRecorder(
+        path=directory / f"{conversation_id}-{int(time() * 1000)}.v2vrec",
+        max_bytes=max_bytes,
+    )
+
+
+current_recorder: ContextVar[SessionRecorder | None] = ContextVar(
+    "current_recorder", default=None
+)
+"""Recorder of the session running in the current context, if recorded."""
+
+
+def record_event(kind: RecordKind, payload: bytes | str | Any) -> None:
+    """
+    Records an event of the current session, if it is recorded.
+
+    Args:
+        kind: Kind of the record.
+        payload: Payload of the record (see `SessionRecorder.record`).
+    """
+    if (recorder := current_recorder.get()) is not None:
+        recorder.record(kind=kind, payload=payload)
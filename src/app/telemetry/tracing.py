@@ -0,0 +1,146 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from loguru import logger
+from pydantic import UUID4
+
+from app.telemetry.metrics import (
+    STAGE_DURATION,
+    TIME_TO_FIRST_AUDIO,
+    TURN_DURATION,
+    TURNS,
+)
+
+
+class TurnTrace:
+    """
+    Timings of the stages of one turn.
+
+    Spans measure a stage and are observed in the `v2v_stage_duration_seconds`
+    histogram. Marks record the first time an event happens, relative to the start
+    of the turn. When the turn finishes, the turn metrics are observed and every
+    timing is logged as one structured record.
+    """
+
+    def __init__(self, conversation_id: UUID4) -> None:
+        """
+        Initializes the TurnTrace object, starting the turn clock.
+
+        Args:
+            conversation_id: Unique identifier for the conversation.
+        """
+        self.conversation_id = conversation_id
+        self.start = perf_counter()
+        self.spans: dict[str, float] = {}
+        self.marks: dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """
+        Measures a stage, which is the current stage meanwhile. Repeated spans
+        of a stage are added up.
+
+        Args:
+            stage: Name of the stage.
+        """
+        start = perf_counter()
+        token = current_stage.set(stage)
+        try:
+            yield
+        finally:
+            current_stage.reset(token)
+            self.add(stage=stage, duration=perf_counter() - start)
+
+    def add(self, stage: str, duration: float) -> None:
+        """
+        Records the duration of a stage measured elsewhere.
+
+        Args:
+            stage: Name of the stage.
+            duration: Duration of the stage, in seconds.
+        """
+        STAGE_DURATION.labels(stage).observe(duration)
+        self.spans[stage] = self.spans.get(stage, 0.0) + duration
+
+    def mark(self, event: str) -> None:
+        """
+        Records the time of an event, if it has not happened yet in this turn.
+
+        Args:
+            event: Name of the event.
+        """
+        if event not in self.marks:
+            self.marks[event] = perf_counter() - self.start
+
+    def rebase(self) -> None:
+        """
+        Restarts the turn clock now, keeping the stages recorded so far. Marks
+        already recorded become negative, relative to the new start. Used when a
+        speculative turn is committed at the end of the user's utterance.
+        """
+        now = perf_counter()
+        elapsed = now - self.start
+        self.start = now
+        self.marks = {k: v - elapsed for k, v in self.marks.items()}
+
+    def finish(self, outcome: str) -> None:
+        """
+        Observes the turn metrics and logs the timings of the turn.
+
+        Args:
+            outcome: Outcome of the turn (e.g., "completed", "interrupted").
+        """
+        duration = perf_counter() - self.start
+        TURNS.labels(outcome).inc()
+        TURN_DURATION.observe(duration)
+        if (first_audio := self.marks.get("first_audio")) is not None:
+            TIME_TO_FIRST_AUDIO.observe(first_audio)
+        logger.bind(
+            conversation_id=str(self.conversation_id),
+            outcome=outcome,
+            duration=round(duration, 4),
+            spans={k: round(v, 4) for k, v in self.spans.items()},
+            marks={k: round(v, 4) for k, v in self.marks.items()},
+        ).info("Turn {o} in {d:.3f}s", o=outcome, d=duration)
+
+
+current_trace: ContextVar[TurnTrace | None] = ContextVar(
+    "current_trace", default=None
+)
+"""Trace of the turn running in the current context, inherited by its tasks."""
+
+current_stage: ContextVar[str | None] = ContextVar(
+    "current_stage", default=None
+)
+"""
+Pipeline stage running in the current context, inherited by its tasks. Used by
+the event loop monitor to attribute stalls.
+"""
+
+
+def record_stage(stage: str, duration: float) -> None:
+    """
+    Records the duration of a stage in the trace of the current turn, or only in
+    the stage histogram when running outside a turn.
+
+    Args:
+        stage: Name of the stage.
+        duration: Duration of the stage, in seconds.
+    """
+    if (trace := current_trace.get()) is not None:
+        trace.add(stage=stage, duration=duration)
+    else:
+        STAGE_DURATION.labels(stage).observe(duration)
+
+
+def record_mark(event: str) -> None:
+    """
+    Records the time of an event in the trace of the current turn, if any.
+
+    Args:
+        event: Name of the event.
+    """
+    if (trace := current_trace.get()) is not None:
+        trace.mark(event)